@@ -1,2 +1,20 @@
 from .base import *
-from .simplifier import *
\ No newline at end of file
+from .uncertain import *
+from .simplifier import *
+from .polynomial import *
+from .evaluator import *
+from .tape import *
+from .streaming import *
+from .formulas import *
+from .serialization import *
+from .cache import *
+from .codegen import *
+from .cost import *
+from .differentiation import *
+from .parser import *
+from .service import *
+from .corpus import *
+from .memory import *
+from .parallel import *
+from .profiler import *
+from .budget import *
\ No newline at end of file
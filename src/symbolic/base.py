@@ -1,23 +1,24 @@
+from .uncertain import UncertainArray
 from math import log, e
+from copy import deepcopy
+from contextlib import contextmanager
+from contextvars import ContextVar
+import numpy as np
 
 
 class Base:
     """
     Base class for the Symbols and operations such that every operation can be easily defined for both of them.
     """
+    # every kind of node defines its own attributes, see Symbol, Constant, BaseOperator1 and BaseOperator2
+    __slots__ = ()
     # When the operation should be done, important for latexify because of brackets
     order_of_operation = 99999  # should be high, because no brackets around symbol or Constant
 
-    def __init__(self, name=None, value=None, error=None):
-        """
-            Initialize for the symbol
-            :param name: the name of the symbol, the way in which it should appear in expressions.
-            :param value: the value of the variable, can be anything from None to a number to a numpy matrix/array
-            :param error: error of the variable
-            """
-        self.name = name
-        self.value = value
-        self.error = error
+    def __init__(self, *arguments, **keywords):
+        # Base has no attributes to assign, operation nodes would otherwise carry unused name, value and error fields
+        raise TypeError("Base is the base class of the nodes of expressions, create a Symbol, Constant or operation, "
+                        "Base(name, value, error) is Symbol(name, value, error)")
 
     def calculate(self, parameters=None):
         """
@@ -45,16 +46,41 @@ class Base:
         else:
             return self.error
 
-    def calculate_all(self, parameters, error_parameters):
+    def calculate_all(self, parameters=None, error_parameters=None):
         """
-        Calculates the error of the symbol and the error on the symbol in a calculation
+        Calculates the value of the symbol and the error on the symbol in a calculation
         :param parameters: dict, if the name of the symbol is in the dict, it will take the value of the key in the
                             dict
         :param error_parameters: dict, if the name of the symbol is in the dict, it will take the value of the key in
                                         the dict
-        :return: the value of the symbol in a calculation
+        :return: (value, error) of the symbol in a calculation
+        """
+        return self.calculate(parameters), self.calculate_error(parameters, error_parameters)
+
+    def calculate_sensitivities(self, parameters=None, error_parameters=None, symbols=None):
         """
-        return self.calculate(parameters), self.calculate_error(error_parameters)
+        Calculates the value of the expression and its derivatives with respect to the symbols in a single calculation
+        :param parameters: dict, if the name of the symbol is in the dict, it will take the value of the key in the
+                            dict
+        :param error_parameters: dict, if the name of the symbol is in the dict, it will take the value of the key in
+                                        the dict
+        :param symbols: the symbols whose derivatives are calculated, by default all symbols on which the expression
+                        depends. The other symbols are treated as exact.
+        :return: (value, dict mapping the names of the symbols to the derivatives, dict mapping the names of the
+                 symbols to their errors)
+        """
+        uncertain_parameters = dict() if parameters is None else dict(parameters)
+        errors = dict()
+        if symbols is None:
+            symbols = self.get_dependent_symbols() or []
+        for symbol in symbols:
+            value = symbol.calculate(parameters)
+            if value is not None:
+                uncertain_parameters[symbol.name] = UncertainArray.from_symbol(symbol.name, value)
+            errors[symbol.name] = symbol.calculate_error(parameters, error_parameters)
+
+        value, sensitivities = UncertainArray.get_parts(self.calculate(uncertain_parameters))
+        return value, sensitivities, errors
 
     def latexify(self, use_value=True):
         """
@@ -68,37 +94,37 @@ class Base:
             return str(self.name)
 
     def __add__(self, other):
-        return Add(self, other)
+        return make_operation(Add, self, other)
 
     def __radd__(self, other):
-        return Add(other, self)
+        return make_operation(Add, other, self)
 
     def __sub__(self, other):
-        return Subtract(self, other)
+        return make_operation(Subtract, self, other)
 
     def __rsub__(self, other):
-        return Subtract(other, self)
+        return make_operation(Subtract, other, self)
 
     def __mul__(self, other):
-        return Multiply(self, other)
+        return make_operation(Multiply, self, other)
 
     def __rmul__(self, other):
-        return Multiply(other, self)
+        return make_operation(Multiply, other, self)
 
     def __truediv__(self, other):
-        return Divide(self, other)
+        return make_operation(Divide, self, other)
 
     def __rtruediv__(self, other):
-        return Divide(other, self)
+        return make_operation(Divide, other, self)
 
     def __pow__(self, power, modulo=None):
-        return Power(self, power)
+        return make_operation(Power, self, power)
 
     def __rpow__(self, other):
-        return Power(other, self)
+        return make_operation(Power, other, self)
 
     def __neg__(self):
-        return Multiply(-1, self)
+        return make_operation(Multiply, -1, self)
     
     def __equal__(self, other):
         if not isinstance(other, Symbol):
@@ -119,10 +145,72 @@ def is_numerical(variable):
         return False
 
 
+def get_value_key(value):
+    """
+    Gets a hashable key for the value or error of a symbol or constant
+    :param value: anything from None to a number to a numpy matrix/array
+    :return: (type, value) if the value is hashable, otherwise (type, id) of the value
+    """
+    try:
+        hash(value)
+        return type(value), value
+    except TypeError:
+        return type(value), id(value)
+
+
+def get_structural_key(expression):
+    """
+    Gets a hashable key for the structure of an expression: two expressions have the same key if and only if they
+    consist of the same operations on the same symbols and constants.
+    :param expression: Expression of type Base
+    :return: tuple
+    example: x + 2 * y -> (Add, None, (Symbol, x, ...), (Multiply, None, (Constant, None, ...), (Symbol, y, ...)))
+    """
+    if isinstance(expression, BaseOperator2):
+        return (expression.__class__, expression.name, get_structural_key(expression.x),
+                get_structural_key(expression.y))
+    elif isinstance(expression, BaseOperator1):
+        return expression.__class__, expression.name, get_structural_key(expression.x)
+    return expression.__class__, expression.name, get_value_key(expression.value), get_value_key(expression.error)
+
+
+def node_count(expression):
+    """
+    Counts the distinct nodes of the expression, subexpressions that are the same object are counted once
+    :param expression: Expression of type Base
+    :return: int
+    """
+    seen = set()
+    stack = [expression]
+    while len(stack) > 0:
+        node = stack.pop()
+        if id(node) in seen:
+            continue
+        seen.add(id(node))
+        if isinstance(node, BaseOperator2):
+            stack.extend([node.x, node.y])
+        elif isinstance(node, BaseOperator1):
+            stack.append(node.x)
+    return len(seen)
+
+
 class Symbol(Base):
     """
     Class for defining Symbolic variables for expressions
     """
+    __slots__ = ('name', 'value', 'error')
+
+    def __init__(self, name=None, value=None, error=None):
+        """
+            Initialize for the symbol
+            :param name: the name of the symbol, the way in which it should appear in expressions.
+            :param value: the value of the variable, can be anything from None to a number to a numpy matrix/array
+            :param error: error of the variable
+            """
+        self.name = name
+        self.value = value
+        self.error = error
+
     def get_dependent_symbols(self):
         """
         Returns the symbols on which the expression depends
@@ -138,8 +226,8 @@ class Symbol(Base):
         """
         assert isinstance(x, Symbol)
         if self.__equal__(x):
-            return Constant(1)
-        return Constant(0)
+            return intern_constant(1)
+        return intern_constant(0)
     
     def __equal__(self, other):
         if not isinstance(other, Symbol):
@@ -158,9 +246,45 @@ class Constant(Base):
     """
     Class for defining values for expressions
     """
+    __slots__ = ('name', 'value', 'error')
+    # constants created by intern_constant, by key of their value, and the ids of these constants
+    interned = dict()
+    interned_ids = set()
+    max_interned = 4096
 
     def __init__(self, value=None, error=None, name=None):
-        super(Constant, self).__init__(name=name, value=value, error=error)
+        self.name = name
+        self.value = value
+        self.error = error
+
+    def __setattr__(self, name, value):
+        if id(self) in Constant.interned_ids:
+            raise AttributeError("The constant %s is shared by intern_constant and can't be changed, create a new "
+                                 "Constant instead" % self.value)
+        super(Constant, self).__setattr__(name, value)
+
+    def is_interned(self):
+        """
+        Checks whether or not the constant is shared by intern_constant, such constants can't be changed
+        :return: Boolean
+        """
+        return id(self) in Constant.interned_ids
+
+    def __copy__(self):
+        if self.is_interned():
+            return self
+        return Constant(self.value, self.error, self.name)
+
+    def __deepcopy__(self, memo):
+        if self.is_interned():
+            return self
+        return Constant(deepcopy(self.value, memo), deepcopy(self.error, memo), self.name)
+
+    def __reduce__(self):
+        if self.is_interned():
+            # unpickled constants are shared again
+            return intern_constant, (self.value,)
+        return Constant, (self.value, self.error, self.name)
 
     def get_dependent_symbols(self):
         """
@@ -176,7 +300,7 @@ class Constant(Base):
         :return: derivative
         """
         assert isinstance(x, Symbol)
-        return Constant(0)
+        return intern_constant(0)
 
     def __str__(self):
         """
@@ -206,10 +330,257 @@ class Constant(Base):
         return False
 
 
+def get_intern_key(value):
+    """
+    Gets the key under which a constant with the given value is interned
+    :param value: the value of the constant
+    :return: (type, value) for ints and floats that can be interned, otherwise None
+    """
+    value_type = type(value)
+    if value_type is int or (value_type is float and value == value and value != 0):
+        # nan and the signed zeros of floats are not interned, they can't be told apart by their value
+        return value_type, value
+    return None
+
+
+def intern_constant(value):
+    """
+    Gets a Constant for the given value. Constants for ints and floats are shared, such that every occurrence of the
+    same number in expressions is the same object. Shared constants can't be changed.
+    :param value: the value of the constant, or an expression which is returned as it is
+    :return: Constant
+    """
+    if isinstance(value, Base):
+        return value
+    key = get_intern_key(value)
+    if key is None:
+        return Constant(value)
+    constant = Constant.interned.get(key)
+    if constant is None:
+        constant = Constant(value)
+        if len(Constant.interned) < Constant.max_interned:
+            Constant.interned[key] = constant
+            Constant.interned_ids.add(id(constant))
+    return constant
+
+
+def check_errors(errors):
+    """
+    Checks that every symbol has an error, the error of an expression needs the errors of all symbols it depends on
+    :param errors: dict mapping the names of symbols to their errors
+    """
+    missing = sorted(name for name, error in errors.items() if error is None)
+    if len(missing) > 0:
+        raise TypeError("The error of an expression needs the errors of all its symbols, %s has no error"
+                        % ", ".join(missing))
+
+
+def is_number(expression):
+    """
+    Checks whether the expression is an unnamed constant with a numerical value
+    :param expression: Expression of type Base
+    :return: Boolean
+    """
+    return isinstance(expression, Constant) and expression.name is None and is_numerical(expression.value)
+
+
+def is_zero(expression):
+    """
+    Checks whether the expression is the number 0
+    :param expression: Expression of type Base
+    :return: Boolean
+    """
+    return is_number(expression) and expression.value == 0
+
+
+def is_one(expression):
+    """
+    Checks whether the expression is the number 1
+    :param expression: Expression of type Base
+    :return: Boolean
+    """
+    return is_number(expression) and expression.value == 1
+
+
+def is_integer(value):
+    """
+    Checks whether a value is an integer, Booleans are not
+    :param value: number
+    :return: Boolean
+    """
+    return isinstance(value, (int, np.integer)) and not isinstance(value, (bool, np.bool_))
+
+
+def integer_log(x, base):
+    """
+    Calculates the logarithm of an integer, if it is an integer as well
+    :param x: positive integer
+    :param base: integer larger than 1
+    :return: integer k with base ** k == x, None if there is none
+    """
+    power, exponent = 1, 0
+    while power < x:
+        power *= base
+        exponent += 1
+    return exponent if power == x else None
+
+
+# the maximal number of bits of an integer power that is folded, larger powers are kept as an operation
+MAX_FOLDED_BITS = 1024
+
+
+def fold_numbers(operation, x, y):
+    """
+    Calculates an operation on two numbers, if the result is exact and defined. Operations on integers are only
+    folded if the result is an integer, fractions like 1 / 3, 3 ** -1 and log_2(3) are kept. Operations with floats are
+    folded to the float they are calculated to. Integer powers are only folded up to MAX_FOLDED_BITS bits.
+    :param operation: the class of the operation
+    :param x: number
+    :param y: number
+    :return: the result, None if the operation should not be folded
+    """
+    if isinstance(x, complex) or isinstance(y, complex):
+        return None
+    integers = is_integer(x) and is_integer(y)
+    if operation is Add:
+        return x + y
+    if operation is Subtract:
+        return x - y
+    if operation is Multiply:
+        return x * y
+    if operation is Divide:
+        if y == 0:
+            return None
+        if integers:
+            return x // y if x % y == 0 else None
+        return x / y
+    try:
+        if operation is Power:
+            if abs(y) > 1024 or (x == 0 and y < 0) or (x < 0 and y != int(y)) or (integers and y < 0):
+                return None
+            if integers and abs(x) > 1 and int(abs(x)).bit_length() * y > MAX_FOLDED_BITS:
+                return None
+            return x ** y
+        if operation is Log:
+            if x <= 0 or y <= 0 or y == 1:
+                return None
+            if integers:
+                return integer_log(x, y) if y > 1 else None
+            return log(x) / log(y)
+    except (ArithmeticError, ValueError):
+        return None
+    return None
+
+
+def fold_operation(operation, x, y):
+    """
+    Creates an operation, but folds numbers, leaves out identity elements and removes double negations
+    :param operation: the class of the operation
+    :param x: Expression of type Base, or a value (that is interpreted as Constant)
+    :param y: Expression of type Base, or a value (that is interpreted as Constant)
+    :return: expression
+    example: 2 * 3 -> 6, x * 1 -> x, x + 0 -> x, -1 * (-1 * x) -> x, 2 * (3 * x) -> 6 * x. 0 * x is kept, since x
+             can be an array or nan, it is only folded if the other operand doesn't depend on any symbol.
+    """
+    x, y = intern_constant(x), intern_constant(y)
+    if is_number(x) and is_number(y):
+        value = fold_numbers(operation, x.value, y.value)
+        if value is not None:
+            return intern_constant(value)
+
+    if operation is Add:
+        if is_zero(x):
+            return y
+        if is_zero(y):
+            return x
+    elif operation is Subtract:
+        if is_zero(y):
+            return x
+        if is_zero(x):
+            return fold_operation(Multiply, -1, y)
+    elif operation is Multiply:
+        if is_number(y) and not is_number(x):
+            x, y = y, x
+        if is_one(x):
+            return y
+        if is_zero(x) and y.get_dependent_symbols() is None:
+            return x
+        if is_number(x) and isinstance(y, Multiply) and y.name is None and is_number(y.x):
+            return fold_operation(Multiply, fold_operation(Multiply, x, y.x), y.y)
+    elif operation is Divide:
+        if is_one(y) or (is_zero(x) and y.get_dependent_symbols() is None):
+            return x
+    elif operation is Power:
+        if is_one(y):
+            return x
+        if is_zero(y) or is_one(x):
+            return intern_constant(1)
+    return operation(x, y)
+
+
+# whether the operators fold numbers and leave out identity elements in the current context, see constant_folding
+FOLD_CONSTANTS = ContextVar("fold_constants", default=False)
+
+
+def make_operation(operation, x, y):
+    """
+    Creates an operation for the operators of Base, which fold constants if that is enabled, see constant_folding
+    :param operation: the class of the operation
+    :param x: Expression of type Base, or a value (that is interpreted as Constant)
+    :param y: Expression of type Base, or a value (that is interpreted as Constant)
+    :return: expression
+    """
+    if FOLD_CONSTANTS.get():
+        return fold_operation(operation, x, y)
+    return operation(x, y)
+
+
+@contextmanager
+def constant_folding(enabled=True):
+    """
+    Context in which the operators of expressions fold numbers and leave out identity elements right away, such that
+    expressions built by user code and by derivatives stay small. See fold_operation. The setting only holds for the
+    current thread or asyncio task.
+    :param enabled: whether constants are folded in the context
+    example: with constant_folding():
+                 x * 1 + 2 * 3 -> x + 6
+    """
+    token = FOLD_CONSTANTS.set(enabled)
+    try:
+        yield
+    finally:
+        FOLD_CONSTANTS.reset(token)
+
+
+def fold(expression):
+    """
+    Folds the constants of an existing expression, see fold_operation
+    :param expression: Expression of type Base, is not changed
+    :return: expression
+    """
+    folded = dict()
+
+    def fold_node(node):
+        if id(node) in folded:
+            return folded[id(node)][1]
+        if isinstance(node, BaseOperator2) and node.name is None:
+            result = fold_operation(node.__class__, fold_node(node.x), fold_node(node.y))
+        else:
+            result = node
+        # the node is kept alive with its result, such that its id can't be reused
+        folded[id(node)] = (node, result)
+        return result
+
+    return fold_node(expression)
+
+
 class BaseOperator1(Base):
     """
-    The base class for operators with only 1 variable (i.e. cos(x))
+    The base class for operators with only 1 variable (i.e. cos(x)). Operations have no value or error of their own.
     """
+    __slots__ = ('name', 'x')
+    value = None
+    error = None
 
     def __init__(self, x, name=None):
         """
@@ -217,11 +588,8 @@ class BaseOperator1(Base):
         :param x: A variable of the Base class, or a value (that is interpreted as Constant)
         :param name: the name of the operation.
         """
-        super(BaseOperator1, self).__init__(name, None, None)
-        if isinstance(x, Base):
-            self.x = x
-        else:
-            self.x = Constant(x)
+        self.name = name
+        self.x = intern_constant(x)
 
     def calculate(self, parameters=None):
         """
@@ -234,27 +602,46 @@ class BaseOperator1(Base):
             return parameters[self.name]
         return self.x.calculate(parameters)
 
+    def apply(self, x):
+        """
+        Applies the operation on the calculated value of its operand
+        :param x: the value of x
+        :return: the value of the operation
+        """
+        return x
+
     def calculate_error(self, parameters=None, error_parameters=None):
         """
-        Calculates the value of the symbol and the error on the symbol in a calculation
+        Calculates the error on the operation in a calculation, see calculate_all
         :param parameters: dict, if the name of the symbol is in the dict, it will take the value of the key in the
                             dict
         :param error_parameters: dict, if the name of the symbol is in the dict, it will take the value of the key in
                                         the dict
-        :return: the error of the symbol in a calculation
+        :return: the error of the operation in a calculation
         """
+        return self.calculate_all(parameters, error_parameters)[1]
+
+    def calculate_all(self, parameters=None, error_parameters=None):
+        """
+        Calculates the value and the linear error of the operation in a single calculation: the symbols take uncertain
+        values that carry their derivatives through the operations, such that no derivative expressions are needed.
+        Every symbol on which the operation depends needs an error.
+        :param parameters: dict, if the name of the symbol is in the dict, it will take the value of the key in the
+                            dict
+        :param error_parameters: dict, if the name of the symbol is in the dict, it will take the value of the key in
+                                        the dict
+        :return: (value, error) of the operation in a calculation, the error is None if the operation doesn't depend
+                 on any symbol
+        """
+        value, sensitivities, errors = self.calculate_sensitivities(parameters, error_parameters)
         if error_parameters is not None and self.name in error_parameters:
-            return error_parameters[self.name]
-        else:
-            dependent_symbols = self.get_dependent_symbols()
-
-            if dependent_symbols is not None:
-                error = (sum([self.derivative(symbol).calculate(parameters) ** 2 *
-                              symbol.calculate_error(parameters, error_parameters) ** 2
-                              for symbol in dependent_symbols])) ** 0.5
-                return error
-            else:
-                return None
+            return value, error_parameters[self.name]
+        if value is None:
+            return None, None
+        if len(errors) == 0:
+            return value, None
+        check_errors(errors)
+        return value, UncertainArray(value, sensitivities).error(errors)
 
     def latexify(self, use_value=True):
         """
@@ -279,7 +666,7 @@ class BaseOperator1(Base):
         :param x: Symbol
         :return: derivative
         """
-        return Constant(0)
+        return intern_constant(0)
 
     def __str__(self):
         return self.latexify()
@@ -289,6 +676,7 @@ class BaseOperator2(BaseOperator1):
     """
     The base class for operators with 2 variables (i.e. x + y)
     """
+    __slots__ = ('y',)
     commutative = False
 
     def __init__(self, x, y, name=None):
@@ -298,11 +686,7 @@ class BaseOperator2(BaseOperator1):
         :param name: the name of the operation.
         """
         super(BaseOperator2, self).__init__(x, name)
-
-        if isinstance(y, Base):
-            self.y = y
-        else:
-            self.y = Constant(y)
+        self.y = intern_constant(y)
 
     def calculate(self, parameters=None):
         """
@@ -314,6 +698,15 @@ class BaseOperator2(BaseOperator1):
         x = super(BaseOperator2, self).calculate(parameters)
         return x, self.y.calculate(parameters)
 
+    def apply(self, x, y):
+        """
+        Applies the operation on the calculated values of its operands
+        :param x: the value of x
+        :param y: the value of y
+        :return: the value of the operation
+        """
+        return x, y
+
     def bracketify(self, other, use_value=True):
         """
         Latexifies the other (most of the time, the x and y of the operation) and puts brackets around it if necessary
@@ -349,6 +742,7 @@ class Add(BaseOperator2):
     """
     The addition operator for two elements from the Base class
     """
+    __slots__ = ()
     order_of_operation = 0
     commutative = True
 
@@ -361,11 +755,20 @@ class Add(BaseOperator2):
         """
         x, y = super(Add, self).calculate(parameters)
         if x is not None and y is not None:
-            value = x + y
+            value = self.apply(x, y)
         else:
             value = None
         return value
 
+    def apply(self, x, y):
+        """
+        Applies the operation on the calculated values of its operands
+        :param x: the value of x
+        :param y: the value of y
+        :return: x + y
+        """
+        return x + y
+
     def latexify(self, use_value=True):
         result = super(Add, self).latexify(use_value)
         if result is not None:
@@ -385,6 +788,7 @@ class Subtract(BaseOperator2):
     """
     The subtract operator for two elements from the Base class
     """
+    __slots__ = ()
     order_of_operation = 0
 
     def calculate(self, parameters=None):
@@ -396,11 +800,20 @@ class Subtract(BaseOperator2):
         """
         x, y = super(Subtract, self).calculate(parameters)
         if x is not None and y is not None:
-            value = x - y
+            value = self.apply(x, y)
         else:
             value = None
         return value
 
+    def apply(self, x, y):
+        """
+        Applies the operation on the calculated values of its operands
+        :param x: the value of x
+        :param y: the value of y
+        :return: x - y
+        """
+        return x - y
+
     def latexify(self, use_value=True):
         result = super(Subtract, self).latexify(use_value)
         if result is not None:
@@ -424,6 +837,7 @@ class Multiply(BaseOperator2):
     """
     The multiplication operator for two elements from the Base class
     """
+    __slots__ = ()
     order_of_operation = 1
     commutative = True
 
@@ -436,11 +850,20 @@ class Multiply(BaseOperator2):
         """
         x, y = super(Multiply, self).calculate(parameters)
         if x is not None and y is not None:
-            value = x * y
+            value = self.apply(x, y)
         else:
             value = None
         return value
 
+    def apply(self, x, y):
+        """
+        Applies the operation on the calculated values of its operands
+        :param x: the value of x
+        :param y: the value of y
+        :return: x * y
+        """
+        return x * y
+
     def latexify(self, use_value=True):
         result = super(Multiply, self).latexify(use_value)
         if result is not None:
@@ -460,6 +883,7 @@ class Divide(BaseOperator2):
     """
     The division operator for two elements from the Base class
     """
+    __slots__ = ()
     order_of_operation = 1
 
     def calculate(self, parameters=None):
@@ -471,11 +895,20 @@ class Divide(BaseOperator2):
         """
         x, y = super(Divide, self).calculate(parameters)
         if x is not None and y is not None:
-            value = x / y
+            value = self.apply(x, y)
         else:
             value = None
         return value
 
+    def apply(self, x, y):
+        """
+        Applies the operation on the calculated values of its operands
+        :param x: the value of x
+        :param y: the value of y
+        :return: x / y
+        """
+        return x / y
+
     def latexify(self, use_value=True):
         result = super(Divide, self).latexify(use_value)
         if result is not None:
@@ -496,6 +929,7 @@ class Power(BaseOperator2):
     """
     The power operator for two elements from the Base class
     """
+    __slots__ = ()
     order_of_operation = 2
 
     def calculate(self, parameters=None):
@@ -507,17 +941,29 @@ class Power(BaseOperator2):
         """
         x, y = super(Power, self).calculate(parameters)
         if x is not None and y is not None:
-            value = x ** y
+            value = self.apply(x, y)
         else:
             value = None
         return value
 
+    def apply(self, x, y):
+        """
+        Applies the operation on the calculated values of its operands
+        :param x: the value of x
+        :param y: the value of y
+        :return: x ** y
+        """
+        return x ** y
+
     def latexify(self, use_value=True):
         result = super(Power, self).latexify(use_value)
         if result is not None:
             return result
-        # you don't want brackets in the exponent
-        return self.bracketify(self.x, use_value) + r"^{" + self.y.latexify(use_value) + r"}"
+        # you don't want brackets in the exponent, the argument of a logarithm would take the exponent
+        base = self.bracketify(self.x, use_value)
+        if isinstance(self.x, Log) and not is_numerical(base):
+            base = r"\left( " + base + r" \right)"
+        return base + r"^{" + self.y.latexify(use_value) + r"}"
 
     def derivative(self, x):
         """
@@ -525,16 +971,25 @@ class Power(BaseOperator2):
         :param x: Symbol
         :return: derivative
         """
-        return self.x ** self.y * (self.y.derivative(x) * Log(self.x) + self.y / self.x * self.x.derivative(x))
+        exponent_derivative = self.y.derivative(x)
+        if FOLD_CONSTANTS.get() and is_zero(exponent_derivative):
+            # 0 * log(x) isn't folded, since it is nan for negative x, the term is left out instead
+            return self.x ** self.y * (self.y / self.x * self.x.derivative(x))
+        return self.x ** self.y * (exponent_derivative * Log(self.x) + self.y / self.x * self.x.derivative(x))
+
+
+# the named constant e, the default base of Log
+NATURAL_BASE = Constant(e, name="e")
 
 
 class Log(BaseOperator2):
     """
     The logarithm operator for two elements from the Base class
     """
+    __slots__ = ()
     order_of_operation = 2
 
-    def __init__(self, x, y=Constant(e, name="e"), name=None):
+    def __init__(self, x, y=NATURAL_BASE, name=None):
         super(Log, self).__init__(x, y, name)
 
     def calculate(self, parameters=None):
@@ -546,17 +1001,33 @@ class Log(BaseOperator2):
         """
         x, y = super(Log, self).calculate(parameters)
         if x is not None and y is not None:
-            value = log(x) / log(y)
+            value = self.apply(x, y)
         else:
             value = None
         return value
 
+    def apply(self, x, y):
+        """
+        Applies the operation on the calculated values of its operands
+        :param x: the value of x
+        :param y: the value of y
+        :return: log_y(x)
+        """
+        if is_numerical(x) and is_numerical(y) and np.ndim(x) == 0 and np.ndim(y) == 0:
+            return log(x) / log(y)
+        return UncertainArray.log(x) / UncertainArray.log(y)
+
     def latexify(self, use_value=True):
         result = super(Log, self).latexify(use_value)
         if result is not None:
             return result
-        # you don't want brackets in the exponent
-        return r"\log_{" + self.y.latexify(use_value) + r"}" + self.bracketify(self.x, use_value)
+        # you don't want brackets in the exponent. Powers and logarithms are bracketed as well, such that log(x^2)
+        # and log(x)^2 are written differently
+        argument = self.x.latexify(use_value)
+        if self.x.order_of_operation <= self.order_of_operation and not is_numerical(argument) \
+                and not argument.startswith(r"\left("):
+            argument = r"\left( " + argument + r" \right)"
+        return r"\log_{" + self.y.latexify(use_value) + r"}" + argument
 
     def derivative(self, x):
         """
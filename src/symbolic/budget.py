@@ -0,0 +1,124 @@
+from .base import *
+import numpy as np
+
+
+class ErrorBudget:
+    """
+    The contribution of every symbol to the error of an expression. Symbols whose contribution is negligible can be
+    pruned, later propagations through the budget, see calculate_all and calculate_error, then treat them as exact,
+    such that their derivatives are never calculated. The expression itself is not changed, its own calculate_error
+    still propagates the errors of all symbols.
+    """
+
+    def __init__(self, expression, parameters=None, error_parameters=None, threshold=0.0):
+        """
+        Calculates the contributions of the symbols
+        :param expression: Expression of type Base
+        :param parameters: dict, if the name of the symbol is in the dict, it will take the value of the key in the
+                            dict
+        :param error_parameters: dict, if the name of the symbol is in the dict, it will take the value of the key in
+                                        the dict
+        :param threshold: symbols that contribute less than this fraction of the squared error are pruned, see prune
+        """
+        if not isinstance(expression, Base):
+            raise TypeError("An error budget needs an expression of type Base, not %s" % type(expression).__name__)
+        self.expression = expression
+        self.symbols = sorted(expression.get_dependent_symbols() or [], key=lambda symbol: symbol.name)
+        self.kept = list(self.symbols)
+        self.value, sensitivities, errors = expression.calculate_sensitivities(parameters, error_parameters)
+        # as in calculate_error, every symbol needs an error, otherwise the fractions would leave it out
+        check_errors(errors)
+        # the contribution of a symbol is its term in the squared error
+        self.contributions = {name: (sensitivity * errors[name]) ** 2 for name, sensitivity in sensitivities.items()}
+        self.variance = sum(self.contributions.values()) if len(self.contributions) > 0 else None
+        self.error = None if self.variance is None else self.variance ** 0.5
+        if threshold > 0:
+            self.prune(threshold)
+
+    def get_fractions(self):
+        """
+        Gets the fraction of the squared error that every symbol contributes
+        :return: dict mapping the names of the symbols to their fraction, for arrays the fraction in every element
+        """
+        if self.variance is None:
+            return dict()
+        total = np.where(self.variance == 0, 1, self.variance)
+        return {name: contribution / total for name, contribution in self.contributions.items()}
+
+    def prune(self, threshold):
+        """
+        Prunes the symbols that contribute less than a fraction of the squared error, in every element for arrays
+        :param threshold: the fraction
+        :return: list of the names of the symbols that are pruned
+        """
+        fractions = self.get_fractions()
+        kept = {name for name, fraction in fractions.items() if np.max(fraction) >= threshold}
+        pruned = [symbol.name for symbol in self.kept if symbol.name not in kept]
+        self.kept = [symbol for symbol in self.kept if symbol.name in kept]
+        return pruned
+
+    def get_pruned_error(self):
+        """
+        Gets the part of the error that the pruned symbols contributed, which is left out of later propagations
+        :return: the error, 0 if no symbol was pruned
+        """
+        kept = {symbol.name for symbol in self.kept}
+        return sum([contribution for name, contribution in self.contributions.items() if name not in kept]) ** 0.5
+
+    def calculate_all(self, parameters=None, error_parameters=None):
+        """
+        Calculates the value and the error of the expression, in which only the symbols that are not pruned have an
+        error
+        :param parameters: dict, if the name of the symbol is in the dict, it will take the value of the key in the
+                            dict
+        :param error_parameters: dict, if the name of the symbol is in the dict, it will take the value of the key in
+                                        the dict
+        :return: (value, error)
+        """
+        value, sensitivities, errors = self.expression.calculate_sensitivities(parameters, error_parameters,
+                                                                               self.kept)
+        check_errors(errors)
+        if value is None:
+            return None, None
+        return value, UncertainArray(value, sensitivities).error(errors)
+
+    def calculate_error(self, parameters=None, error_parameters=None):
+        """
+        Calculates the error of the expression, in which only the symbols that are not pruned have an error
+        :param parameters: dict, if the name of the symbol is in the dict, it will take the value of the key in the
+                            dict
+        :param error_parameters: dict, if the name of the symbol is in the dict, it will take the value of the key in
+                                        the dict
+        :return: the error
+        """
+        return self.calculate_all(parameters, error_parameters)[1]
+
+    def report(self):
+        """
+        Renders the contributions of the symbols, largest first
+        :return: str
+        """
+        kept = {symbol.name for symbol in self.kept}
+        fractions = self.get_fractions()
+        names = sorted(self.contributions, key=lambda name: -np.max(fractions[name]))
+        lines = ["%-20s %14s %10s" % ("symbol", "contribution", "fraction")]
+        for name in names:
+            lines.append("%-20s %14.6g %9.2f%%%s" % (name, np.max(self.contributions[name] ** 0.5),
+                                                     np.max(fractions[name]) * 100,
+                                                     "" if name in kept else " (pruned)"))
+        if self.error is not None:
+            lines.append("%-20s %14.6g" % ("total", np.max(self.error)))
+        return "\n".join(lines)
+
+
+def error_contributions(expression, parameters=None, error_parameters=None):
+    """
+    Calculates the contribution of every symbol to the squared error of an expression, the contributions add up to the
+    squared error. Every symbol needs an error.
+    :param expression: Expression of type Base
+    :param parameters: dict, if the name of the symbol is in the dict, it will take the value of the key in the dict
+    :param error_parameters: dict, if the name of the symbol is in the dict, it will take the value of the key in the
+                                    dict
+    :return: dict mapping the names of the symbols to their contributions
+    """
+    return ErrorBudget(expression, parameters, error_parameters).contributions
@@ -0,0 +1,216 @@
+from .simplifier import *
+from .serialization import dumps, loads, VERSION
+import hashlib
+import os
+import struct
+import tempfile
+
+# version of the keys of the cache, changing it invalidates all entries
+CACHE_VERSION = 1
+EXTENSION = ".symb"
+
+
+class DiskCache:
+    """
+    Cache of simplified expressions and derivatives on disk, which can be shared between processes. Entries are
+    addressed by a hash of the expression and of the operation, they are written atomically, and the least recently
+    used entries are removed once the cache becomes larger than its maximal size.
+    """
+
+    def __init__(self, directory, max_size=2 ** 28):
+        """
+        Initializes the cache
+        :param directory: the directory in which the entries are stored, it is created if it doesn't exist
+        :param max_size: the maximal total size of the entries in bytes, None for no limit
+        """
+        self.directory = directory
+        self.max_size = max_size
+        # running total of the size of the entries, such that put doesn't have to scan the directory, see evict
+        self.known_size = None
+        os.makedirs(directory, exist_ok=True)
+
+    def get_key(self, expression, operation, *configuration):
+        """
+        Gets the key of an entry, which only depends on the structure of the expression and on the operation
+        :param expression: Expression of type Base
+        :param operation: the name of the operation
+        :param configuration: strings that configure the operation
+        :return: hexadecimal sha256 hash
+        """
+        digest = hashlib.sha256()
+        header = "%d %d %s %s" % (CACHE_VERSION, VERSION, operation, " ".join(configuration))
+        digest.update(header.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(dumps(expression))
+        return digest.hexdigest()
+
+    def get_path(self, key):
+        """
+        Gets the path of the file of an entry
+        :param key: the key of the entry
+        :return: path
+        """
+        return os.path.join(self.directory, key[:2], key + EXTENSION)
+
+    def get(self, key):
+        """
+        Gets an entry from the cache
+        :param key: the key of the entry
+        :return: the expressions in the entry, None if it is not in the cache
+        """
+        path = self.get_path(key)
+        try:
+            with open(path, "rb") as file:
+                data = file.read()
+            os.utime(path)
+        except OSError:
+            return None
+        try:
+            return loads(data)
+        except (ValueError, KeyError, IndexError, struct.error):
+            # entries that can't be read are removed, they are calculated again
+            self.remove(path)
+            return None
+
+    def put(self, key, expressions):
+        """
+        Stores an entry in the cache. The file is written under a temporary name first, such that other processes
+        never read a partially written entry. The cache is only scanned for eviction once the running total of its
+        size is larger than its maximal size.
+        :param key: the key of the entry
+        :param expressions: Expression of type Base, or a list of expressions
+        """
+        path = self.get_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = dumps(expressions)
+        descriptor, temporary_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(descriptor, "wb") as file:
+                file.write(data)
+            try:
+                replaced_size = os.stat(path).st_size
+            except OSError:
+                replaced_size = 0
+            os.replace(temporary_path, path)
+        except BaseException:
+            self.remove(temporary_path)
+            raise
+        if self.max_size is None:
+            return
+        if self.known_size is None:
+            self.known_size = self.size()
+        else:
+            self.known_size += len(data) - replaced_size
+        if self.known_size > self.max_size:
+            self.evict()
+
+    def remove(self, path):
+        """
+        Removes a file, if it still exists
+        :param path: the path of the file
+        """
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def get_entries(self):
+        """
+        Gets all entries in the cache
+        :return: list of (time of last use, size, path)
+        """
+        entries = []
+        for subdirectory in os.scandir(self.directory):
+            if not subdirectory.is_dir():
+                continue
+            for entry in os.scandir(subdirectory.path):
+                if entry.name.endswith(EXTENSION):
+                    try:
+                        status = entry.stat()
+                    except OSError:
+                        continue
+                    entries.append((status.st_mtime, status.st_size, entry.path))
+        return entries
+
+    def size(self):
+        """
+        Gets the total size of the entries in the cache
+        :return: the size in bytes
+        """
+        return sum([size for _, size, _ in self.get_entries()])
+
+    def evict(self):
+        """
+        Removes the least recently used entries until the cache is not larger than its maximal size. The directory is
+        scanned, which also corrects the running total for entries that other processes added or removed.
+        """
+        if self.max_size is None:
+            return
+        entries = sorted(self.get_entries())
+        size = sum([entry_size for _, entry_size, _ in entries])
+        for _, entry_size, path in entries:
+            if size <= self.max_size:
+                break
+            self.remove(path)
+            size -= entry_size
+        self.known_size = size
+
+    def clear(self):
+        """
+        Removes all entries from the cache
+        """
+        for _, _, path in self.get_entries():
+            self.remove(path)
+        self.known_size = 0
+
+    def simplify(self, expression, not_use_algorithms=None, objective="readable"):
+        """
+        Simplifies an expression, see simplify, the result is taken from the cache if it is in there
+        :param expression: Expression of type Base
+        :param not_use_algorithms: Algorithms you shouldn't use for simplification
+        :param objective: "readable" or "eval_cost", see simplify
+        :return: simplified expression
+        """
+        if objective not in OBJECTIVES:
+            raise ValueError("Unknown objective %r, the objective is one of %s" % (objective, ", ".join(OBJECTIVES)))
+        names = sorted(algorithm.__name__ for algorithm in not_use_algorithms or [])
+        key = self.get_key(expression, "simplify", objective, *names)
+        result = self.get(key)
+        if result is None:
+            result = simplify(expression, not_use_algorithms, objective)
+            self.put(key, result)
+        return result
+
+    def derivatives(self, expression, symbols=None, simplified=False):
+        """
+        Gets the derivatives of an expression with respect to the given symbols, the results are taken from the cache
+        if they are in there
+        :param expression: Expression of type Base
+        :param symbols: list of symbols, if None all symbols on which the expression depends
+        :param simplified: If True, the derivatives are simplified
+        :return: dict mapping the names of the symbols to the derivatives
+        """
+        if symbols is None:
+            symbols = sorted(expression.get_dependent_symbols() or [], key=lambda symbol: symbol.name)
+        derivatives = dict()
+        for symbol in symbols:
+            key = self.get_key(expression, "derivative", symbol.name, str(bool(simplified)))
+            result = self.get(key)
+            if result is None:
+                result = expression.derivative(symbol)
+                if simplified:
+                    result = simplify(result)
+                self.put(key, result)
+            derivatives[symbol.name] = result
+        return derivatives
+
+    def derivative(self, expression, symbol, simplified=False):
+        """
+        Gets the derivative of an expression with respect to a symbol, the result is taken from the cache if it is in
+        there
+        :param expression: Expression of type Base
+        :param symbol: Symbol
+        :param simplified: If True, the derivative is simplified
+        :return: derivative
+        """
+        return self.derivatives(expression, [symbol], simplified)[symbol.name]
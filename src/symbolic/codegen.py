@@ -0,0 +1,345 @@
+from .tape import *
+import ctypes
+import hashlib
+import os
+import shutil
+import stat
+import subprocess
+import tempfile
+import numpy as np
+
+# directory in which compiled kernels are kept between processes, private to the user
+KERNEL_DIRECTORY = os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"),
+                                "symbolic", "kernels")
+COMPILER_FLAGS = ["-O2", "-shared", "-fPIC"]
+DOUBLE_POINTER = ctypes.POINTER(ctypes.c_double)
+# the kernels keep the position of every element in an array of this size, numpy arrays have at most 64 dimensions
+MAX_DIMENSIONS = 64
+
+C_OPERATIONS = {ADD: "{0} + {1}", SUBTRACT: "{0} - {1}", MULTIPLY: "{0} * {1}", DIVIDE: "{0} / {1}",
+                POWER: "pow({0}, {1})", LOG: "log({0}) / log({1})"}
+
+
+def get_c_literal(value):
+    """
+    Gets the C literal of a double
+    :param value: float
+    :return: str
+    """
+    if value != value:
+        return "NAN"
+    if value in (float("inf"), float("-inf")):
+        return "INFINITY" if value > 0 else "(-INFINITY)"
+    return repr(float(value))
+
+
+def get_reachable(tape, output):
+    """
+    Gets the instructions on which an output depends
+    :param tape: Tape
+    :param output: the index of the instruction of the output
+    :return: set of instruction indices
+    """
+    codes, operands = tape.codes.tolist(), tape.operands.tolist()
+    reachable, stack = set(), [output]
+    while len(stack) > 0:
+        index = stack.pop()
+        if index not in reachable:
+            reachable.add(index)
+            if codes[index] >= ADD:
+                stack.extend(operands[index])
+    return reachable
+
+
+def generate_c(tape):
+    """
+    Generates the C code of the kernels of a tape: symbolic_values calculates the outputs and symbolic_errors calculates
+    the outputs and their errors, both in a single loop over all elements. The inputs are read with their own strides,
+    such that broadcast inputs are never copied to the shape of the results.
+    :param tape: Tape
+    :return: str, C code
+    """
+    codes, operands = tape.codes.tolist(), tape.operands.tolist()
+    forward = []
+    for index, (code, (a, b)) in enumerate(zip(codes, operands)):
+        if code == SYMBOL:
+            forward.append("double t%d = inputs[%d][offsets[%d]];" % (index, a, a))
+        elif code == CONSTANT:
+            forward.append("const double t%d = %s;" % (index, get_c_literal(tape.constants[a])))
+        else:
+            forward.append("double t%d = %s;" % (index, C_OPERATIONS[code].format("t%d" % a, "t%d" % b)))
+    values = ["values[%d][i] = t%d;" % (position, output) for position, output in enumerate(tape.outputs.tolist())]
+
+    active = [False] * len(codes)
+    for index, (code, (a, b)) in enumerate(zip(codes, operands)):
+        active[index] = code == SYMBOL or (code >= ADD and (active[a] or active[b]))
+    symbols = [index for index, (code, (a, _)) in enumerate(zip(codes, operands))
+               if code == SYMBOL and tape.is_symbol[a]]
+
+    # the offsets of the errors of the symbols follow those of the values
+    count = max(1, len(tape.names))
+    errors = ["double e%d = errors[%d][offsets[%d]];" % (index, operands[index][0], count + operands[index][0])
+              for index in symbols]
+    for position, output in enumerate(tape.outputs.tolist()):
+        reachable = get_reachable(tape, output)
+        adjoints = [index for index in sorted(reachable) if active[index]]
+        errors.append("{")
+        if len(adjoints) > 0:
+            errors.append("    double %s;" % ", ".join("g%d = 0.0" % index for index in adjoints))
+            errors.append("    g%d = 1.0;" % output)
+        for index in sorted(reachable, reverse=True):
+            code = codes[index]
+            if code < ADD or not active[index]:
+                continue
+            a, b = operands[index]
+            g, x, y, value = "g%d" % index, "t%d" % a, "t%d" % b, "t%d" % index
+            if code == ADD:
+                contributions = "+= %s" % g, "+= %s" % g
+            elif code == SUBTRACT:
+                contributions = "+= %s" % g, "-= %s" % g
+            elif code == MULTIPLY:
+                contributions = "+= %s * %s" % (g, y), "+= %s * %s" % (g, x)
+            elif code == DIVIDE:
+                contributions = "+= %s / %s" % (g, y), "-= %s * %s / %s" % (g, value, y)
+            elif code == POWER:
+                contributions = ("+= %s * %s * pow(%s, %s - 1.0)" % (g, y, x, y),
+                                 "+= %s * %s * log(%s)" % (g, value, x))
+            else:
+                contributions = ("+= %s / (%s * log(%s))" % (g, x, y),
+                                 "-= %s * %s / (%s * log(%s))" % (g, value, y, y))
+            for operand, contribution in zip((a, b), contributions):
+                if active[operand]:
+                    errors.append("    g%d %s;" % (operand, contribution))
+        terms = ["(g%d * e%d) * (g%d * e%d)" % (index, index, index, index)
+                 for index in symbols if index in reachable]
+        errors.append("    output_errors[%d][i] = sqrt(%s);" % (position, " + ".join(terms) or "0.0"))
+        errors.append("}")
+
+    def loop(body, inputs):
+        return "\n".join(["    long position[%d] = {0};" % MAX_DIMENSIONS,
+                          "    long offsets[%d] = {0};" % inputs,
+                          "    for (long i = 0; i < n; i++) {"] +
+                         ["        " + line for line in body] +
+                         ["        advance(ndim, shape, position, %d, strides, offsets);" % inputs,
+                          "    }"])
+
+    return "\n".join([
+        "#include <math.h>",
+        "",
+        "/* moves the offsets in the inputs to the next element of the results, in C order */",
+        "static void advance(int ndim, const long *shape, long *position, int count, const long *strides,",
+        "                    long *offsets) {",
+        "    for (int d = ndim - 1; d >= 0; d--) {",
+        "        for (int k = 0; k < count; k++) offsets[k] += strides[k * ndim + d];",
+        "        if (++position[d] < shape[d]) return;",
+        "        for (int k = 0; k < count; k++) offsets[k] -= shape[d] * strides[k * ndim + d];",
+        "        position[d] = 0;",
+        "    }",
+        "}",
+        "",
+        "void symbolic_values(long n, int ndim, const long *shape, const double **inputs, const long *strides,",
+        "                     double **values) {",
+        loop(forward + values, count),
+        "}",
+        "",
+        "void symbolic_errors(long n, int ndim, const long *shape, const double **inputs, const double **errors,",
+        "                     const long *strides, double **values, double **output_errors) {",
+        loop(forward + values + errors, 2 * count),
+        "}",
+        ""])
+
+
+def is_private(path):
+    """
+    Checks whether only the current user can change a file or directory, such that nobody else can replace the
+    kernels that are loaded from it
+    :param path: path of the file or directory
+    :return: True if it is not a symbolic link, it belongs to the current user and the group and others can't write it
+    """
+    status = os.lstat(path)
+    if stat.S_ISLNK(status.st_mode):
+        return False
+    if hasattr(os, "getuid") and status.st_uid != os.getuid():
+        return False
+    return not status.st_mode & (stat.S_IWGRP | stat.S_IWOTH)
+
+
+def compile_c(source, directory=KERNEL_DIRECTORY, compiler=None):
+    """
+    Compiles C code to a shared library. Libraries are kept in the directory by the hash of their code, such that every
+    kernel is compiled only once. The directory is created only readable by the current user, and libraries are only
+    loaded from it if nobody else can change it or them.
+    :param source: str, C code
+    :param directory: directory of the libraries
+    :param compiler: the C compiler, by default the one in the CC environment variable, or cc
+    :return: path of the library, None if there is no compiler or the compilation failed
+    """
+    compiler = shutil.which(compiler or os.environ.get("CC", "cc"))
+    if compiler is None:
+        return None
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    if not is_private(directory):
+        raise PermissionError("The kernel directory %s has to belong to the current user and must not be writable by "
+                              "others" % directory)
+    key = hashlib.sha256(" ".join(COMPILER_FLAGS + [source]).encode("utf-8")).hexdigest()
+    path = os.path.join(directory, "kernel_%s.so" % key)
+    if os.path.lexists(path) and is_private(path):
+        return path
+
+    # libraries that others can change are compiled again and replaced
+    with tempfile.TemporaryDirectory(dir=directory) as build_directory:
+        source_path = os.path.join(build_directory, "kernel.c")
+        library_path = os.path.join(build_directory, "kernel.so")
+        with open(source_path, "w") as file:
+            file.write(source)
+        try:
+            subprocess.run([compiler] + COMPILER_FLAGS + ["-o", library_path, source_path, "-lm"], check=True,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        except (OSError, subprocess.CalledProcessError):
+            return None
+        os.chmod(library_path, stat.S_IRWXU)
+        # other processes only ever see a complete library
+        os.replace(library_path, path)
+    return path
+
+
+class CompiledExpression:
+    """
+    Expressions compiled to a native kernel that calculates their values, and optionally errors, in one fused loop over
+    numpy arrays. If no C compiler is available, the tape of the expressions is used instead. Compiled expressions are
+    a separate API, Base.calculate and Tape never compile expressions themselves.
+    """
+
+    def __init__(self, expressions, directory=KERNEL_DIRECTORY, compiler=None):
+        """
+        Generates and compiles the kernel
+        :param expressions: Expression of type Base, or a list of expressions
+        :param directory: directory in which compiled kernels are kept, it has to be private to the current user
+        :param compiler: the C compiler, by default the one in the CC environment variable, or cc
+        """
+        self.tape = Tape(expressions)
+        self.source = generate_c(self.tape)
+        # like on the tape, outputs that don't depend on any symbol have no error
+        symbols = {index for index, (code, (a, _)) in enumerate(zip(self.tape.codes.tolist(),
+                                                                     self.tape.operands.tolist()))
+                   if code == SYMBOL and self.tape.is_symbol[a]}
+        self.has_error = [len(symbols & get_reachable(self.tape, output)) > 0 for output in self.tape.outputs.tolist()]
+        self.library = None
+        path = compile_c(self.source, directory, compiler)
+        if path is not None:
+            self.library = ctypes.CDLL(path)
+            self.library.symbolic_values.restype = None
+            self.library.symbolic_errors.restype = None
+        self.compiled = self.library is not None
+
+    def get_inputs(self, values, shape):
+        """
+        Prepares arrays to be read by the kernel. The arrays are not copied to the shape of the results, broadcast
+        dimensions get a stride of zero.
+        :param values: list of arrays
+        :param shape: the shape of the results
+        :return: (list of arrays, array of pointers, list with the strides of every array in elements)
+        """
+        arrays, strides = [], []
+        for value in values:
+            value = np.asarray(value, dtype=np.float64)
+            if any(stride % value.itemsize != 0 for stride in value.strides):
+                value = np.ascontiguousarray(value)
+            value = np.broadcast_to(value, shape)
+            arrays.append(value)
+            strides.extend(stride // value.itemsize for stride in value.strides)
+        pointers = (DOUBLE_POINTER * max(1, len(arrays)))(*[array.ctypes.data_as(DOUBLE_POINTER) for array in arrays])
+        return arrays, pointers, strides
+
+    def get_outputs(self, shape):
+        """
+        Creates the arrays in which the kernel writes its results
+        :param shape: the shape of the results
+        :return: (list of arrays, array of pointers)
+        """
+        arrays = [np.empty(shape) for _ in self.tape.outputs]
+        pointers = (DOUBLE_POINTER * len(arrays))(*[array.ctypes.data_as(DOUBLE_POINTER) for array in arrays])
+        return arrays, pointers
+
+    def get_results(self, arrays):
+        """
+        Gets the results in the same form as the tape
+        :param arrays: list of result arrays, or None for outputs without a result
+        :return: the result, or a list of results
+        """
+        return self.tape.get_output([array if array is None or array.ndim > 0 else array[()] for array in arrays])
+
+    def get_shape(self, shape, strides):
+        """
+        Gets the arguments of the kernel that describe the iteration over the results
+        :param shape: the shape of the results
+        :param strides: list with the strides of every input in elements
+        :return: (number of elements, number of dimensions, shape as C array, strides as C array)
+        """
+        return (ctypes.c_long(int(np.prod(shape))), ctypes.c_int(len(shape)),
+                (ctypes.c_long * max(1, len(shape)))(*shape), (ctypes.c_long * max(1, len(strides)))(*strides))
+
+    def calculate(self, parameters=None):
+        """
+        Calculates the value of the expressions
+        :param parameters: dict, if the name of the symbol is in the dict, it will take the value of the key in the
+                            dict
+        :return: the value of the expression, or a list of values if a list of expressions was compiled
+        """
+        if not self.compiled:
+            return self.tape.calculate(parameters)
+        values = self.tape.get_parameter_values(parameters)
+        if any(value is None for value in values):
+            return None
+        shape = np.broadcast_shapes(*[value.shape for value in values])
+        inputs, input_pointers, strides = self.get_inputs(values, shape)
+        outputs, output_pointers = self.get_outputs(shape)
+        n, ndim, c_shape, c_strides = self.get_shape(shape, strides)
+        self.library.symbolic_values(n, ndim, c_shape, input_pointers, c_strides, output_pointers)
+        return self.get_results(outputs)
+
+    def calculate_all(self, parameters=None, error_parameters=None):
+        """
+        Calculates the value and the error of the expressions in one pass
+        :param parameters: dict, if the name of the symbol is in the dict, it will take the value of the key in the
+                            dict
+        :param error_parameters: dict, if the name of the symbol is in the dict, it will take the value of the key in
+                                        the dict
+        :return: (value, error), or (list of values, list of errors) if a list of expressions was compiled. The error
+                 of an output that doesn't depend on any symbol is None.
+        """
+        if not self.compiled:
+            return self.tape.calculate_all(parameters, error_parameters)
+        values = self.tape.get_parameter_values(parameters)
+        if any(value is None for value in values):
+            return None, None
+        symbol_errors = []
+        for name, error, is_symbol in zip(self.tape.names, self.tape.errors, self.tape.is_symbol):
+            if error_parameters is not None and name in error_parameters:
+                error = error_parameters[name]
+            symbol_errors.append(error if is_symbol else 0.0)
+        # as in Tape.calculate_all, every symbol needs an error
+        check_errors({name: error for name, error in zip(self.tape.names, symbol_errors)})
+        shape = np.broadcast_shapes(*[value.shape for value in values])
+        shape = np.broadcast_shapes(shape, *[np.shape(error) for error in symbol_errors])
+
+        inputs, input_pointers, strides = self.get_inputs(values, shape)
+        errors, error_pointers, error_strides = self.get_inputs(symbol_errors, shape)
+        outputs, output_pointers = self.get_outputs(shape)
+        output_errors, output_error_pointers = self.get_outputs(shape)
+        n, ndim, c_shape, c_strides = self.get_shape(shape, strides + error_strides)
+        self.library.symbolic_errors(n, ndim, c_shape, input_pointers, error_pointers, c_strides, output_pointers,
+                                     output_error_pointers)
+        output_errors = [error if has_error else None for error, has_error in zip(output_errors, self.has_error)]
+        return self.get_results(outputs), self.get_results(output_errors)
+
+    def calculate_error(self, parameters=None, error_parameters=None):
+        """
+        Calculates the error of the expressions given the errors of the symbols
+        :param parameters: dict, if the name of the symbol is in the dict, it will take the value of the key in the
+                            dict
+        :param error_parameters: dict, if the name of the symbol is in the dict, it will take the value of the key in
+                                        the dict
+        :return: the error of the expression, or a list of errors if a list of expressions was compiled
+        """
+        return self.calculate_all(parameters, error_parameters)[1]
@@ -0,0 +1,179 @@
+from .simplifier import *
+from .tape import Tape
+import json
+import random
+import time
+
+# operations that are replayed on the corpus, they get the expression and the symbol to differentiate with respect to
+OPERATIONS = {
+    "simplify": lambda expression, symbol: simplify(expression),
+    "factorize": lambda expression, symbol: factorize(expression),
+    "derivative": lambda expression, symbol: expression.derivative(symbol),
+}
+OPERATORS = [Add, Subtract, Multiply, Divide, Power, Log]
+
+
+def random_expression(generator, symbols, size, max_depth):
+    """
+    Creates a random expression. Exponents are small integers or halves and the bases of logarithms are constants
+    larger than 1, such that the expression is defined for positive values of the symbols.
+    :param generator: random.Random
+    :param symbols: list of Symbols
+    :param size: the number of random operations in the expression, not counting those that keep it defined
+    :param max_depth: the maximal depth of the operations
+    :return: Expression of type Base
+    """
+    if size <= 0 or max_depth <= 0:
+        if generator.random() < 0.7:
+            return generator.choice(symbols)
+        return intern_constant(generator.randint(1, 5))
+
+    operator = generator.choice(OPERATORS)
+    if operator is Power:
+        exponent = generator.choice([-2, -1, 2, 3, 0.5])
+        return Power(random_expression(generator, symbols, size - 1, max_depth - 1), exponent)
+    if operator is Log:
+        base = generator.choice([None, 2, 10])
+        # the argument is squared and shifted, such that it is positive
+        argument = random_expression(generator, symbols, size - 1, max_depth - 1) ** 2 + 1
+        return Log(argument) if base is None else Log(argument, base)
+
+    left = generator.randint(0, size - 1)
+    x = random_expression(generator, symbols, left, max_depth - 1)
+    y = random_expression(generator, symbols, size - 1 - left, max_depth - 1)
+    if operator is Divide:
+        # the denominator is kept away from zero
+        y = y ** 2 + 1
+    return operator(x, y)
+
+
+def generate_corpus(count, seed=0, size=10, max_depth=6, symbol_count=3):
+    """
+    Generates a reproducible corpus of random expressions, which use every operation
+    :param count: the number of expressions
+    :param seed: the seed of the random generator
+    :param size: the number of operations in every expression
+    :param max_depth: the maximal depth of the operations
+    :param symbol_count: the number of distinct symbols, which are called x0, x1, ...
+    :return: list of expressions
+    """
+    generator = random.Random(seed)
+    symbols = [Symbol("x%d" % index) for index in range(symbol_count)]
+    return [random_expression(generator, symbols, size, max_depth) for _ in range(count)]
+
+
+def get_reference(operation, tape, symbol, parameters):
+    """
+    Calculates the value that the result of an operation should have, independently of the operation
+    :param operation: the name of the operation
+    :param tape: Tape of the original expression
+    :param symbol: the symbol of derivatives
+    :param parameters: dict with the values of the symbols
+    :return: the value
+    """
+    if operation == "derivative":
+        return tape.gradient(parameters).get(symbol.name, 0.0)
+    return tape.calculate(parameters)
+
+
+def is_close(value, reference, tolerance):
+    """
+    Checks whether a value is close to its reference, relative to the size of the reference
+    :param value: number
+    :param reference: number
+    :param tolerance: the relative tolerance
+    :return: Boolean
+    """
+    return abs(value - reference) <= tolerance * max(1.0, abs(reference))
+
+
+def replay(expressions, operations=None, seed=0, points=5, tolerance=1e-6):
+    """
+    Applies the operations to every expression, and checks numerically at random points that the results still match
+    the original expressions. The runtime and node counts of every case are recorded.
+    :param expressions: list of expressions
+    :param operations: list of names of operations in OPERATIONS, by default all of them
+    :param seed: the seed of the random points
+    :param points: the number of random points per case
+    :param tolerance: the relative tolerance of the comparison
+    :return: list of dicts with the case, operation, expression, passed, time, nodes and result_nodes of every case
+    """
+    generator = random.Random(seed)
+    records = []
+    for case, expression in enumerate(expressions):
+        symbols = sorted(expression.get_dependent_symbols() or [], key=lambda symbol: symbol.name)
+        symbol = symbols[0] if len(symbols) > 0 else Symbol("x0")
+        tape = Tape(expression)
+        samples = [{s.name: generator.uniform(0.5, 2.0) for s in symbols} for _ in range(points)]
+        for operation in operations or list(OPERATIONS):
+            start = time.perf_counter()
+            try:
+                result = OPERATIONS[operation](expression, symbol)
+                error = None
+            except Exception as exception:
+                result, error = None, "%s: %s" % (type(exception).__name__, exception)
+            elapsed = time.perf_counter() - start
+
+            passed = error is None
+            if passed:
+                for parameters in samples:
+                    reference = get_reference(operation, tape, symbol, parameters)
+                    if reference is None or reference != reference or abs(reference) == float("inf"):
+                        continue
+                    try:
+                        value = result.calculate(parameters)
+                    except (ArithmeticError, ValueError) as exception:
+                        value, error = None, "%s: %s" % (type(exception).__name__, exception)
+                    if value is None or not is_close(value, reference, tolerance):
+                        passed = False
+                        break
+            records.append({"case": case, "operation": operation, "expression": str(expression), "passed": passed,
+                            "error": error, "time": elapsed, "nodes": node_count(expression),
+                            "result_nodes": None if result is None else node_count(result)})
+    return records
+
+
+def save_baseline(records, path):
+    """
+    Writes the records of a replay to a baseline file
+    :param records: list of records, see replay
+    :param path: path of the JSON file
+    """
+    with open(path, "w") as file:
+        json.dump(records, file, indent=1)
+
+
+def load_baseline(path):
+    """
+    Reads the records of a replay from a baseline file
+    :param path: path of the JSON file
+    :return: list of records
+    """
+    with open(path) as file:
+        return json.load(file)
+
+
+def compare_baseline(records, baseline, slowdown=2.0, minimal_time=1e-3):
+    """
+    Finds the cases that became wrong or slow compared to a baseline. Cases are matched on their number, operation
+    and expression, such that a corpus that was generated differently is not compared with the baseline.
+    :param records: list of records of the current replay
+    :param baseline: list of records of the baseline replay
+    :param slowdown: cases that take more than this factor longer than in the baseline are slow
+    :param minimal_time: cases faster than this number of seconds are never slow, their timings are too noisy
+    :return: list of (record, baseline record, reason), reason is "failed", "slower" or "larger"
+    """
+    baseline = {(record["case"], record["operation"], record["expression"]): record for record in baseline}
+    regressions = []
+    for record in records:
+        old = baseline.get((record["case"], record["operation"], record["expression"]))
+        if old is None:
+            continue
+        if old["passed"] and not record["passed"]:
+            regressions.append((record, old, "failed"))
+        elif record["time"] > max(minimal_time, slowdown * old["time"]):
+            regressions.append((record, old, "slower"))
+        elif old["result_nodes"] is not None and record["result_nodes"] is not None and \
+                record["result_nodes"] > old["result_nodes"]:
+            regressions.append((record, old, "larger"))
+    return regressions
@@ -0,0 +1,171 @@
+from .base import *
+from .polynomial import polynomial_parts, get_signed_terms, get_signed_factors, power_to_multiplications
+from copy import copy
+
+# relative cost of calculating every operation once, measured in additions
+OPERATION_COSTS = {Add: 1, Subtract: 1, Multiply: 1, Divide: 4, Power: 20, Log: 25}
+# integer powers up to this exponent are written as chains of multiplications
+MAX_MULTIPLICATION_EXPONENT = 64
+
+
+def evaluation_cost(expression, costs=None):
+    """
+    Estimates the cost of calculating the expression. Structurally identical subexpressions are counted only once,
+    since tapes calculate them only once.
+    :param expression: Expression of type Base
+    :param costs: dict mapping operation classes to their cost, by default OPERATION_COSTS
+    :return: the total cost of the operations in the expression, symbols and constants are free
+    """
+    if costs is None:
+        costs = OPERATION_COSTS
+    keys, indices = dict(), dict()
+    total = [0]
+
+    def add(node):
+        if id(node) in indices:
+            return indices[id(node)]
+        if isinstance(node, BaseOperator1):
+            operands = (add(node.x), add(node.y)) if isinstance(node, BaseOperator2) else (add(node.x),)
+            key = node.__class__, node.name, operands
+        else:
+            key = get_structural_key(node)
+        if key not in keys:
+            keys[key] = len(keys)
+            if isinstance(node, BaseOperator1):
+                total[0] += costs.get(node.__class__, 1)
+        indices[id(node)] = keys[key]
+        return keys[key]
+
+    add(expression)
+    return total[0]
+
+
+def is_integer_constant(expression):
+    """
+    Checks whether the expression is a constant with an integer value
+    :param expression: Expression of type Base
+    :return: Boolean
+    """
+    return isinstance(expression, Constant) and expression.name is None and isinstance(expression.value, int) and \
+        not isinstance(expression.value, bool)
+
+
+def optimize_terms(expression, symbols, costs):
+    """
+    Rewrites a chain of additions and subtractions: the polynomial terms are collected in Horner form, and terms with
+    the same divisor are added before dividing
+    :param expression: Add or Subtract
+    :param symbols: dict in which the Symbols that are encountered are stored by name
+    :param costs: dict mapping operation classes to their cost
+    :return: expression
+    example: x ** 2 + x + a / d - b / d -> x * (x + 1) + (a - b) / d
+    """
+    polynomial = None
+    terms, divisors = [], dict()
+    for sign, term in get_signed_terms(expression):
+        _, term_polynomial = polynomial_parts(term, symbols)
+        if term_polynomial is not None:
+            term_polynomial = term_polynomial * sign
+            polynomial = term_polynomial if polynomial is None else polynomial + term_polynomial
+        elif isinstance(term, Divide):
+            key = get_structural_key(term.y)
+            if key not in divisors:
+                divisors[key] = (term.y, [])
+                terms.append(key)
+            divisors[key][1].append((sign, optimize_evaluation(term.x, symbols, costs)))
+        else:
+            terms.append((sign, optimize_evaluation(term, symbols, costs)))
+
+    output_expression = None
+    if polynomial is not None and len(polynomial.terms) > 0:
+        output_expression = polynomial.to_horner(symbols)
+    for term in terms:
+        if term in divisors:
+            divisor, numerators = divisors[term]
+            numerator = None
+            for sign, term_numerator in numerators:
+                if numerator is None:
+                    numerator = term_numerator if sign == 1 else - term_numerator
+                else:
+                    numerator = numerator + term_numerator if sign == 1 else numerator - term_numerator
+            sign, term = 1, numerator / optimize_evaluation(divisor, symbols, costs)
+        else:
+            sign, term = term
+        if output_expression is None:
+            output_expression = term if sign == 1 else - term
+        else:
+            output_expression = output_expression + term if sign == 1 else output_expression - term
+    return intern_constant(0) if output_expression is None else output_expression
+
+
+def optimize_factors(expression, symbols, costs):
+    """
+    Rewrites a chain of multiplications and divisions, such that there is at most one division
+    :param expression: Multiply or Divide
+    :param symbols: dict in which the Symbols that are encountered are stored by name
+    :param costs: dict mapping operation classes to their cost
+    :return: expression
+    example: a / b * c / d -> (a * c) / (b * d)
+    """
+    numerator, denominator = None, None
+    for sign, factor in get_signed_factors(expression):
+        factor = optimize_evaluation(factor, symbols, costs)
+        if sign == 1:
+            numerator = factor if numerator is None else numerator * factor
+        else:
+            denominator = factor if denominator is None else denominator * factor
+    if denominator is None:
+        return numerator
+    if numerator is None:
+        return 1 / denominator
+    return numerator / denominator
+
+
+def optimize_evaluation(expression, symbols=None, costs=None):
+    """
+    Rewrites the expression to a form that is cheap to calculate: polynomials are written in Horner form, integer
+    powers become chains of multiplications and divisions are pulled together. For polynomials, the cheapest of the
+    Horner form and the rewritten expression is used.
+    :param expression: Expression of type Base, is not changed
+    :param symbols: dict in which the Symbols that are encountered are stored by name
+    :param costs: dict mapping operation classes to their cost, by default OPERATION_COSTS
+    :return: expression
+    """
+    if symbols is None:
+        symbols = dict()
+    if not isinstance(expression, BaseOperator1) or expression.name is not None:
+        return expression
+
+    _, polynomial = polynomial_parts(expression, symbols)
+    if isinstance(expression, (Add, Subtract)):
+        output_expression = optimize_terms(expression, symbols, costs)
+    elif isinstance(expression, (Multiply, Divide)):
+        output_expression = optimize_factors(expression, symbols, costs)
+    elif isinstance(expression, Power) and is_integer_constant(expression.y) and \
+            abs(expression.y.value) <= MAX_MULTIPLICATION_EXPONENT:
+        output_expression = power_to_multiplications(optimize_evaluation(expression.x, symbols, costs),
+                                                     expression.y.value)
+    else:
+        output_expression = copy(expression)
+        output_expression.x = optimize_evaluation(expression.x, symbols, costs)
+        if isinstance(expression, BaseOperator2):
+            output_expression.y = optimize_evaluation(expression.y, symbols, costs)
+
+    if polynomial is not None:
+        horner = polynomial.to_horner(symbols)
+        if evaluation_cost(horner, costs) < evaluation_cost(output_expression, costs):
+            return horner
+    return output_expression
+
+
+def minimize_evaluation_cost(expression, simplified, costs=None):
+    """
+    Chooses the form of the expression that is the cheapest to calculate
+    :param expression: Expression of type Base
+    :param simplified: the simplified form of the expression
+    :param costs: dict mapping operation classes to their cost, by default OPERATION_COSTS
+    :return: expression
+    """
+    candidates = [simplified, optimize_evaluation(simplified, costs=costs),
+                  optimize_evaluation(expression, costs=costs), expression]
+    return min(candidates, key=lambda candidate: evaluation_cost(candidate, costs))
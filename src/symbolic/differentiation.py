@@ -0,0 +1,339 @@
+from .base import *
+from .simplifier import simplify
+from .tape import *
+from copy import copy
+from math import factorial
+import numpy as np
+
+
+def pruned_add(x, y):
+    """
+    Adds two expressions, leaving out zeros and folding numbers
+    :param x: Expression of type Base
+    :param y: Expression of type Base
+    :return: x + y
+    """
+    if is_zero(x):
+        return y
+    if is_zero(y):
+        return x
+    if is_number(x) and is_number(y):
+        return intern_constant(x.value + y.value)
+    return x + y
+
+
+def pruned_subtract(x, y):
+    """
+    Subtracts two expressions, leaving out zeros and folding numbers
+    :param x: Expression of type Base
+    :param y: Expression of type Base
+    :return: x - y
+    """
+    if is_zero(y):
+        return x
+    if is_number(x) and is_number(y):
+        return intern_constant(x.value - y.value)
+    if is_zero(x):
+        return - y
+    return x - y
+
+
+def pruned_multiply(x, y):
+    """
+    Multiplies two expressions, leaving out ones and folding numbers
+    :param x: Expression of type Base
+    :param y: Expression of type Base
+    :return: x * y
+    """
+    if is_zero(x) or is_zero(y):
+        return intern_constant(0)
+    if is_one(x):
+        return y
+    if is_one(y):
+        return x
+    if is_number(x) and is_number(y):
+        return intern_constant(x.value * y.value)
+    return x * y
+
+
+def pruned_divide(x, y):
+    """
+    Divides two expressions, leaving out divisions of zero and by one
+    :param x: Expression of type Base
+    :param y: Expression of type Base
+    :return: x / y
+    """
+    if is_zero(x):
+        return intern_constant(0)
+    if is_one(y):
+        return x
+    return x / y
+
+
+def differentiate(expression, x, derivatives):
+    """
+    Differentiates the expression with respect to x. Every subexpression is differentiated only once, even if it occurs
+    several times, and the operands of the expression are shared with its derivative instead of copied. Terms that
+    are zero are left out.
+    :param expression: Expression of type Base
+    :param x: Symbol
+    :param derivatives: dict mapping the ids of the subexpressions that were differentiated to their derivatives
+    :return: derivative
+    """
+    if id(expression) in derivatives:
+        return derivatives[id(expression)][1]
+
+    if isinstance(expression, (Symbol, Constant)) or not isinstance(expression, BaseOperator2):
+        result = expression.derivative(x)
+    else:
+        u, v = expression.x, expression.y
+        du, dv = differentiate(u, x, derivatives), differentiate(v, x, derivatives)
+        if is_zero(du) and is_zero(dv):
+            result = intern_constant(0)
+        elif isinstance(expression, Add):
+            result = pruned_add(du, dv)
+        elif isinstance(expression, Subtract):
+            result = pruned_subtract(du, dv)
+        elif isinstance(expression, Multiply):
+            result = pruned_add(pruned_multiply(du, v), pruned_multiply(u, dv))
+        elif isinstance(expression, Divide):
+            if is_zero(dv):
+                result = pruned_divide(du, v)
+            else:
+                result = pruned_divide(pruned_subtract(pruned_multiply(du, v), pruned_multiply(u, dv)), v ** 2)
+        elif isinstance(expression, Power):
+            if is_zero(dv):
+                # the logarithm of the base is left out, which keeps the derivative defined for negative bases
+                result = pruned_multiply(pruned_multiply(v, u ** pruned_subtract(v, intern_constant(1))), du)
+            else:
+                result = pruned_multiply(expression, pruned_add(pruned_multiply(dv, Log(u)),
+                                                                pruned_multiply(pruned_divide(v, u), du)))
+        elif isinstance(expression, Log):
+            if is_zero(dv):
+                result = pruned_divide(du, pruned_multiply(u, Log(v)))
+            else:
+                result = pruned_divide(pruned_subtract(pruned_divide(du, u),
+                                                       pruned_multiply(expression, pruned_divide(dv, v))), Log(v))
+        else:
+            result = expression.derivative(x)
+
+    # the expression is kept alive with its derivative, such that its id can't be reused
+    derivatives[id(expression)] = (expression, result)
+    return result
+
+
+def share_subexpressions(expression, shared=None):
+    """
+    Makes structurally identical subexpressions the same object
+    :param expression: Expression of type Base, is not changed
+    :param shared: dict mapping structural keys to the shared expressions, can be reused between calls
+    :return: expression in which every distinct subexpression occurs once
+    """
+    if shared is None:
+        shared = dict()
+    indices = dict()
+
+    def share(original):
+        if id(original) in indices:
+            return indices[id(original)]
+        node = original
+        if isinstance(node, BaseOperator1):
+            new_x = share(node.x)
+            new_y = share(node.y) if isinstance(node, BaseOperator2) else None
+            key = node.__class__, node.name, id(new_x), id(new_y)
+            if key not in shared:
+                if new_x is not node.x or (new_y is not None and new_y is not node.y):
+                    node = copy(node)
+                    node.x = new_x
+                    if new_y is not None:
+                        node.y = new_y
+                shared[key] = node
+        else:
+            key = get_structural_key(node)
+            shared.setdefault(key, node)
+        indices[id(original)] = shared[key]
+        return shared[key]
+
+    return share(expression)
+
+
+def mixed_derivative(expression, symbols, simplify_orders=False):
+    """
+    Differentiates the expression with respect to the given symbols, one after the other. Identical subexpressions are
+    shared after every order, which keeps the growth of the derivatives in check.
+    :param expression: Expression of type Base
+    :param symbols: list of Symbols
+    :param simplify_orders: If True, the derivative is simplified after every order as well, the simplified form is
+                            only kept if it has fewer nodes
+    :return: derivative
+    example: mixed_derivative(f, [x, y]) is the derivative of f with respect to x and y
+    """
+    shared = dict()
+    expression = share_subexpressions(expression, shared)
+    for symbol in symbols:
+        expression = share_subexpressions(differentiate(expression, symbol, dict()), shared)
+        if simplify_orders:
+            simplified = share_subexpressions(simplify(expression), shared)
+            if node_count(simplified) < node_count(expression):
+                expression = simplified
+    return expression
+
+
+def derivative(expression, x, order=1, simplify_orders=False):
+    """
+    Differentiates the expression order times with respect to x, see mixed_derivative
+    :param expression: Expression of type Base
+    :param x: Symbol
+    :param order: the order of the derivative
+    :param simplify_orders: If True, the derivative is simplified after every order when that makes it smaller
+    :return: derivative
+    """
+    return mixed_derivative(expression, [x] * order, simplify_orders)
+
+
+def hessian(expression, symbols=None, simplify_orders=False):
+    """
+    Calculates all second order derivatives of the expression, the first order derivatives are shared between them
+    :param expression: Expression of type Base
+    :param symbols: list of Symbols, if None all symbols on which the expression depends
+    :param simplify_orders: If True, the derivatives are simplified after every order when that makes them smaller
+    :return: dict mapping pairs of names of symbols to the derivatives, both orders of every pair are in there
+    """
+    if symbols is None:
+        symbols = sorted(expression.get_dependent_symbols() or [], key=lambda symbol: symbol.name)
+    output = dict()
+    for index, symbol in enumerate(symbols):
+        first = mixed_derivative(expression, [symbol], simplify_orders)
+        for other in symbols[index:]:
+            second = mixed_derivative(first, [other], simplify_orders)
+            output[symbol.name, other.name] = second
+            output[other.name, symbol.name] = second
+    return output
+
+
+def taylor_multiply(a, b):
+    """
+    Multiplies two truncated Taylor series
+    :param a: list of coefficients
+    :param b: list of coefficients
+    :return: list of coefficients of a * b
+    """
+    return [sum([a[i] * b[k - i] for i in range(k + 1)]) for k in range(len(a))]
+
+
+def taylor_divide(a, b):
+    """
+    Divides two truncated Taylor series
+    :param a: list of coefficients
+    :param b: list of coefficients
+    :return: list of coefficients of a / b
+    """
+    c = []
+    for k in range(len(a)):
+        c.append((a[k] - sum([b[i] * c[k - i] for i in range(1, k + 1)])) / b[0])
+    return c
+
+
+def taylor_log(a):
+    """
+    Takes the natural logarithm of a truncated Taylor series
+    :param a: list of coefficients
+    :return: list of coefficients of log(a)
+    """
+    c = [np.log(a[0])]
+    for k in range(1, len(a)):
+        c.append((a[k] - sum([i * c[i] * a[k - i] for i in range(1, k)]) / k) / a[0])
+    return c
+
+
+def taylor_exp(a):
+    """
+    Takes the exponential of a truncated Taylor series
+    :param a: list of coefficients
+    :return: list of coefficients of exp(a)
+    """
+    c = [np.exp(a[0])]
+    for k in range(1, len(a)):
+        c.append(sum([i * a[i] * c[k - i] for i in range(1, k + 1)]) / k)
+    return c
+
+
+def taylor_integer_power(a, n):
+    """
+    Raises a truncated Taylor series to a non-negative integer power by repeated squaring
+    :param a: list of coefficients
+    :param n: int
+    :return: list of coefficients of a ** n
+    """
+    c = [np.float64(1)] + [np.float64(0)] * (len(a) - 1)
+    while n > 0:
+        if n % 2 == 1:
+            c = taylor_multiply(c, a)
+        n //= 2
+        if n > 0:
+            a = taylor_multiply(a, a)
+    return c
+
+
+def taylor_power(a, b):
+    """
+    Raises a truncated Taylor series to the power of another one
+    :param a: list of coefficients
+    :param b: list of coefficients
+    :return: list of coefficients of a ** b
+    """
+    if all(np.all(coefficient == 0) for coefficient in b[1:]):
+        # constant exponent, this also works for negative bases
+        r = b[0]
+        if np.ndim(r) == 0 and np.isfinite(r) and r >= 0 and r == int(r) and np.any(np.asarray(a[0]) == 0):
+            # the recurrence divides by the base, integer powers of a zero base are multiplied out instead
+            return taylor_integer_power(a, int(r))
+        c = [a[0] ** r]
+        for k in range(1, len(a)):
+            c.append(sum([((r + 1) * i - k) * a[i] * c[k - i] for i in range(1, k + 1)]) / (k * a[0]))
+        return c
+    return taylor_exp(taylor_multiply(b, taylor_log(a)))
+
+
+def taylor_derivatives(expression, x, order, parameters=None):
+    """
+    Calculates the values of the derivatives of the expression with respect to x up to the given order, by propagating
+    truncated Taylor series through the tape of the expression. No derivative expressions are created.
+    :param expression: Expression of type Base, or a Tape made from one
+    :param x: Symbol or the name of a symbol
+    :param order: the highest order of the derivatives
+    :param parameters: dict, if the name of the symbol is in the dict, it will take the value of the key in the dict
+    :return: list with the value of the expression and of its derivatives of order 1 up to order, None if a parameter
+             without a value is needed
+    """
+    tape = expression if isinstance(expression, Tape) else Tape(expression)
+    name = x.name if isinstance(x, Base) else x
+    values = tape.get_parameter_values(parameters)
+    if any(value is None for value in values):
+        return None
+
+    zero = np.float64(0)
+    series = []
+    for code, (a, b) in zip(tape.codes.tolist(), tape.operands.tolist()):
+        if code == SYMBOL:
+            coefficients = [values[a]] + [zero] * order
+            if tape.names[a] == name and tape.is_symbol[a] and order > 0:
+                coefficients[1] = np.float64(1)
+        elif code == CONSTANT:
+            coefficients = [tape.constants[a]] + [zero] * order
+        elif code == ADD:
+            coefficients = [u + v for u, v in zip(series[a], series[b])]
+        elif code == SUBTRACT:
+            coefficients = [u - v for u, v in zip(series[a], series[b])]
+        elif code == MULTIPLY:
+            coefficients = taylor_multiply(series[a], series[b])
+        elif code == DIVIDE:
+            coefficients = taylor_divide(series[a], series[b])
+        elif code == POWER:
+            coefficients = taylor_power(series[a], series[b])
+        else:
+            coefficients = taylor_divide(taylor_log(series[a]), taylor_log(series[b]))
+        series.append(coefficients)
+
+    output = series[tape.outputs[0]]
+    return [coefficient * factorial(k) for k, coefficient in enumerate(output)]
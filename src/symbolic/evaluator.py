@@ -0,0 +1,181 @@
+from .base import *
+
+
+class IncrementalEvaluator:
+    """
+    Evaluates an expression and remembers the value of every node in it, such that after updating some parameters
+    only the nodes that depend on them are calculated again. Identical subexpressions are calculated only once. If
+    errors are propagated, the derivatives needed for the error are part of the same nodes and are kept up to date in
+    the same way.
+    """
+
+    def __init__(self, expression, parameters=None, error_parameters=None, gradient=False):
+        """
+        Initializes the evaluator and calculates the value of every node
+        :param expression: Expression of type Base
+        :param parameters: dict, if the name of the symbol is in the dict, it will take the value of the key in the
+                            dict
+        :param error_parameters: dict, if the name of the symbol is in the dict, it will take the value of the key in
+                                        the dict. If given, the error of the expression is kept up to date as well.
+        :param gradient: If True, the derivatives with respect to all symbols are kept up to date, even if no
+                         error_parameters are given
+        """
+        self.expression = expression
+        self.parameters = dict() if parameters is None else dict(parameters)
+        self.error_parameters = dict() if error_parameters is None else dict(error_parameters)
+
+        # nodes are stored in topological order: the operands of a node always come before the node itself
+        self.nodes = []
+        self.operands = []
+        self.parents = []
+        self.values = []
+        self.names = dict()
+        self.keys = dict()
+        self.affected = dict()
+        self.root = self.add_node(expression, dict())
+
+        self.symbols = []
+        self.derivatives = []
+        self.derivative_expressions = []
+        if gradient or error_parameters is not None:
+            self.add_derivatives()
+
+    def add_node(self, expression, indices):
+        """
+        Adds the expression and all of its subexpressions to the nodes, if they are not in there yet
+        :param expression: Expression of type Base
+        :param indices: dict mapping the id of every expression added in this call to its node
+        :return: the index of the node of the expression
+        """
+        if id(expression) in indices:
+            return indices[id(expression)]
+
+        if isinstance(expression, BaseOperator2):
+            operands = [self.add_node(expression.x, indices), self.add_node(expression.y, indices)]
+            key = expression.__class__, expression.name, tuple(operands)
+        elif isinstance(expression, BaseOperator1):
+            operands = [self.add_node(expression.x, indices)]
+            key = expression.__class__, expression.name, tuple(operands)
+        else:
+            operands = []
+            key = get_structural_key(expression)
+
+        if key not in self.keys:
+            index = len(self.nodes)
+            self.keys[key] = index
+            self.nodes.append(expression)
+            self.operands.append(operands)
+            self.parents.append([])
+            for operand in operands:
+                self.parents[operand].append(index)
+            if expression.name is not None:
+                self.names.setdefault(expression.name, []).append(index)
+            self.values.append(self.calculate_node(index))
+            self.affected = dict()
+
+        indices[id(expression)] = self.keys[key]
+        return self.keys[key]
+
+    def add_derivatives(self):
+        """
+        Adds the derivatives of the expression with respect to all symbols on which it depends to the nodes. Symbols
+        are identified by their name, different Symbol objects with the same name are the same symbol.
+        """
+        if len(self.symbols) > 0:
+            return
+        dependent_symbols = self.expression.get_dependent_symbols()
+        if dependent_symbols is None:
+            return
+        names = set()
+        for symbol in dependent_symbols:
+            if symbol.name in names:
+                continue
+            names.add(symbol.name)
+            derivative = self.expression.derivative(symbol)
+            self.symbols.append(symbol)
+            self.derivative_expressions.append(derivative)
+            self.derivatives.append(self.add_node(derivative, dict()))
+
+    def calculate_node(self, index):
+        """
+        Calculates the value of a node from the values of its operands
+        :param index: the index of the node
+        :return: the value of the node
+        """
+        node = self.nodes[index]
+        if len(self.operands[index]) == 0:
+            return node.calculate(self.parameters)
+        if node.name is not None and node.name in self.parameters:
+            return self.parameters[node.name]
+
+        values = [self.values[operand] for operand in self.operands[index]]
+        if any(value is None for value in values):
+            return None
+        return node.apply(*values)
+
+    def get_affected_nodes(self, names):
+        """
+        Gets all nodes that depend on the given names, in topological order
+        :param names: the names of the parameters that changed
+        :return: list of node indices
+        """
+        names = frozenset(names)
+        if names not in self.affected:
+            affected = set()
+            stack = [index for name in names for index in self.names.get(name, [])]
+            while len(stack) > 0:
+                index = stack.pop()
+                if index not in affected:
+                    affected.add(index)
+                    stack.extend(self.parents[index])
+            self.affected[names] = sorted(affected)
+        return self.affected[names]
+
+    def update(self, parameters=None, error_parameters=None):
+        """
+        Updates the given parameters and calculates the nodes that depend on them again
+        :param parameters: dict with the new values of the symbols
+        :param error_parameters: dict with the new errors of the symbols
+        :return: the new value of the expression
+        """
+        if parameters is not None:
+            self.parameters.update(parameters)
+            for index in self.get_affected_nodes(parameters.keys()):
+                self.values[index] = self.calculate_node(index)
+        if error_parameters is not None:
+            self.add_derivatives()
+            self.error_parameters.update(error_parameters)
+        return self.calculate()
+
+    def calculate(self):
+        """
+        Gets the value of the expression for the current parameters
+        :return: the value of the expression
+        """
+        return self.values[self.root]
+
+    def gradient(self):
+        """
+        Gets the derivatives of the expression for the current parameters
+        :return: dict mapping the name of every symbol on which the expression depends to the value of the derivative
+        """
+        self.add_derivatives()
+        return {symbol.name: self.values[derivative] for symbol, derivative in zip(self.symbols, self.derivatives)}
+
+    def calculate_error(self):
+        """
+        Gets the error of the expression for the current parameters and error parameters, calculated in the same way
+        as the calculate_error of the expression: every name of a symbol contributes one term
+        :return: the error of the expression
+        """
+        if not isinstance(self.expression, BaseOperator1):
+            return self.expression.calculate_error(self.parameters, self.error_parameters)
+        if self.expression.name in self.error_parameters:
+            return self.error_parameters[self.expression.name]
+
+        self.add_derivatives()
+        if len(self.symbols) == 0:
+            return None
+        return (sum([self.values[derivative] ** 2 *
+                     symbol.calculate_error(self.parameters, self.error_parameters) ** 2
+                     for symbol, derivative in zip(self.symbols, self.derivatives)])) ** 0.5
@@ -0,0 +1,77 @@
+from .tape import *
+
+
+class FormulaSet:
+    """
+    Set of named expressions that are calculated together. Subexpressions that occur in several expressions are
+    calculated only once for all of them, and so are the derivatives that are needed for their errors.
+    """
+
+    def __init__(self, formulas):
+        """
+        Initializes the set
+        :param formulas: dict mapping names to expressions of type Base
+        """
+        self.formulas = dict(formulas)
+        self.names = list(self.formulas)
+        self.tape = Tape([self.formulas[name] for name in self.names])
+
+    def __len__(self):
+        return len(self.names)
+
+    def __getitem__(self, name):
+        return self.formulas[name]
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def get_results(self, values):
+        """
+        Maps the results of the tape to the names of the formulas
+        :param values: list with one result for every formula
+        :return: dict mapping the names of the formulas to the results
+        """
+        if values is None:
+            return None
+        return dict(zip(self.names, values))
+
+    def calculate(self, parameters=None):
+        """
+        Calculates the value of every formula
+        :param parameters: dict, if the name of the symbol is in the dict, it will take the value of the key in the
+                            dict
+        :return: dict mapping the names of the formulas to their values
+        """
+        return self.get_results(self.tape.calculate(parameters))
+
+    def calculate_error(self, parameters=None, error_parameters=None):
+        """
+        Calculates the error of every formula given the errors of the symbols
+        :param parameters: dict, if the name of the symbol is in the dict, it will take the value of the key in the
+                            dict
+        :param error_parameters: dict, if the name of the symbol is in the dict, it will take the value of the key in
+                                        the dict
+        :return: dict mapping the names of the formulas to their errors
+        """
+        return self.calculate_all(parameters, error_parameters)[1]
+
+    def calculate_all(self, parameters=None, error_parameters=None):
+        """
+        Calculates the value and the error of every formula in one pass
+        :param parameters: dict, if the name of the symbol is in the dict, it will take the value of the key in the
+                            dict
+        :param error_parameters: dict, if the name of the symbol is in the dict, it will take the value of the key in
+                                        the dict
+        :return: (dict mapping the names of the formulas to their values, dict mapping them to their errors)
+        """
+        values, errors = self.tape.calculate_all(parameters, error_parameters)
+        return self.get_results(values), self.get_results(errors)
+
+    def gradient(self, parameters=None):
+        """
+        Calculates the derivatives of every formula with respect to the symbols it depends on
+        :param parameters: dict, if the name of the symbol is in the dict, it will take the value of the key in the
+                            dict
+        :return: dict mapping the names of the formulas to dicts mapping the names of the symbols to the derivatives
+        """
+        return self.get_results(self.tape.gradient(parameters))
@@ -0,0 +1,160 @@
+from .corpus import *
+import gc
+import os
+import tracemalloc
+
+# entry points whose memory is measured, they get the expression, a symbol and the values and errors of the symbols
+ENTRY_POINTS = {
+    "simplify": lambda expression, symbol, parameters, errors: simplify(expression),
+    "derivative": lambda expression, symbol, parameters, errors: expression.derivative(symbol),
+    "calculate_error": lambda expression, symbol, parameters, errors: expression.calculate_error(parameters, errors),
+    "latexify": lambda expression, symbol, parameters, errors: expression.latexify(),
+}
+# the algorithms of simplify, the polynomial pass is applied before the others
+for algorithm in [polynomial_simplification] + LOCAL_ALGORITHMS + ROOT_ALGORITHMS:
+    ENTRY_POINTS[algorithm.__name__] = lambda expression, symbol, parameters, errors, algorithm=algorithm: \
+        algorithm(expression)
+SCALES = [4, 8, 16]
+# metrics that are compared with the baseline
+METRICS = ["peak", "retained", "nodes", "live_nodes"]
+
+
+def count_nodes():
+    """
+    Counts the nodes of expressions that are alive
+    :return: int
+    """
+    return sum([1 for node in gc.get_objects() if isinstance(node, Base)])
+
+
+def measure(function, *arguments):
+    """
+    Measures the memory used by a call
+    :param function: the function to call
+    :param arguments: the arguments of the call
+    :return: dict with the peak number of bytes allocated during the call (peak), the number of bytes still allocated
+             once the result is freed (retained), the number of distinct nodes in the result (nodes) and the number of
+             new nodes that are alive after the call, including those of the result (live_nodes)
+    """
+    gc.collect()
+    nodes_before = count_nodes()
+    tracing = tracemalloc.is_tracing()
+    if tracing and hasattr(tracemalloc, "reset_peak"):
+        tracemalloc.reset_peak()
+    elif not tracing:
+        tracemalloc.start()
+    try:
+        start = tracemalloc.get_traced_memory()[0]
+        result = function(*arguments)
+        peak = tracemalloc.get_traced_memory()[1] - start
+        gc.collect()
+        live_nodes = count_nodes() - nodes_before
+        nodes = node_count(result) if isinstance(result, Base) else 0
+        del result
+        gc.collect()
+        retained = tracemalloc.get_traced_memory()[0] - start
+    finally:
+        if not tracing:
+            tracemalloc.stop()
+    return {"peak": peak, "retained": max(0, retained), "nodes": nodes, "live_nodes": live_nodes}
+
+
+def run_memory_suite(scales=None, cases=3, seed=0, entry_points=None):
+    """
+    Measures the memory of the entry points on random expressions of increasing size, see generate_corpus
+    :param scales: list of sizes of the expressions, by default SCALES
+    :param cases: the number of expressions of every size
+    :param seed: the seed of the expressions
+    :param entry_points: list of names of entry points in ENTRY_POINTS, by default all of them
+    :return: list of dicts with the entry_point, scale, case, whether the entry point passed, its error and the metrics
+             of measure, which are None if it failed
+    """
+    records = []
+    for scale in scales or SCALES:
+        corpus = generate_corpus(cases, seed=seed + scale, size=scale, max_depth=scale)
+        for case, expression in enumerate(corpus):
+            symbols = sorted(expression.get_dependent_symbols() or [], key=lambda symbol: symbol.name)
+            symbol = symbols[0] if len(symbols) > 0 else Symbol("x0")
+            parameters = {s.name: 1.5 for s in symbols}
+            errors = {s.name: 0.1 for s in symbols}
+            for name in entry_points or list(ENTRY_POINTS):
+                record = {"entry_point": name, "scale": scale, "case": case, "passed": True, "error": None}
+                try:
+                    record.update(measure(ENTRY_POINTS[name], expression, symbol, parameters, errors))
+                except (ArithmeticError, ValueError, TypeError) as exception:
+                    # failures are recorded as well, such that a case that starts failing is a regression
+                    record.update({metric: None for metric in METRICS})
+                    record.update(passed=False, error="%s: %s" % (type(exception).__name__, exception))
+                records.append(record)
+    return records
+
+
+def compare_memory(records, baseline, tolerance=1.25, minimal_bytes=4096):
+    """
+    Finds the measurements that grew compared to a baseline, and the cases of the baseline that failed or were not
+    measured in the current run
+    :param records: list of records of the current run
+    :param baseline: list of records of the baseline run
+    :param tolerance: metrics can grow by this factor before they regress
+    :param minimal_bytes: byte counts below this number never regress, they are too noisy
+    :return: list of (record, baseline record, metric), metric is "failed" if the case failed, or "missing" with the
+             record None if the case is not in the current run
+    """
+    current = {(record["entry_point"], record["scale"], record["case"]): record for record in records}
+    regressions = []
+    for old in baseline:
+        record = current.get((old["entry_point"], old["scale"], old["case"]))
+        # baselines from before failures were recorded only have passed cases
+        if not old.get("passed", True):
+            continue
+        if record is None:
+            regressions.append((None, old, "missing"))
+            continue
+        if not record.get("passed", True):
+            regressions.append((record, old, "failed"))
+            continue
+        for metric in METRICS:
+            limit = old[metric] * tolerance
+            if metric in ("peak", "retained"):
+                limit = max(limit, minimal_bytes)
+            if record[metric] > limit:
+                regressions.append((record, old, metric))
+    return regressions
+
+
+def check_memory_baseline(path, scales=None, cases=3, seed=0, tolerance=1.25):
+    """
+    Runs the memory suite and compares it with the baseline in a file, the baseline is created if the file doesn't
+    exist yet
+    :param path: path of the JSON file of the baseline
+    :param scales: list of sizes of the expressions, by default SCALES
+    :param cases: the number of expressions of every size
+    :param seed: the seed of the expressions
+    :param tolerance: metrics can grow by this factor before they regress
+    :return: the records of the run
+    """
+    records = run_memory_suite(scales, cases, seed)
+    if not os.path.exists(path):
+        save_baseline(records, path)
+        return records
+    regressions = compare_memory(records, load_baseline(path), tolerance)
+    if len(regressions) > 0:
+        raise AssertionError("Memory regressions:\n" + "\n".join(
+            "%s at scale %d, case %d: %s" % (old["entry_point"], old["scale"], old["case"], describe_regression(
+                record, old, metric)) for record, old, metric in regressions))
+    return records
+
+
+def describe_regression(record, old, metric):
+    """
+    Describes a regression found by compare_memory
+    :param record: the record of the current run, None if the case is missing
+    :param old: the record of the baseline
+    :param metric: the metric that regressed, "failed" or "missing"
+    :return: str
+    """
+    if metric == "missing":
+        return "not measured"
+    if metric == "failed":
+        return "failed with %s" % record["error"]
+    return "%s grew from %d to %d" % (metric, old[metric], record[metric])
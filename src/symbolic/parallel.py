@@ -0,0 +1,267 @@
+from .tape import *
+from .serialization import dumps, loads
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import os
+import numpy as np
+
+# tapes that a worker process has built, by the serialized expressions they were built from, the least recently used
+# tapes are dropped once there are more than MAX_WORKER_TAPES
+WORKER_TAPES = OrderedDict()
+MAX_WORKER_TAPES = 32
+
+
+class SharedArray:
+    """
+    A numpy array of float64 in a shared memory block, which worker processes attach to by name instead of receiving a
+    pickled copy
+    """
+
+    def __init__(self, shape, name=None):
+        """
+        Creates a new shared memory block, or attaches to an existing one
+        :param shape: the shape of the array
+        :param name: the name of an existing block, None to create a new one
+        """
+        self.shape = tuple(shape)
+        size = max(1, int(np.prod(self.shape)) * 8)
+        self.memory = shared_memory.SharedMemory(name=name, create=name is None, size=size)
+        self.array = np.ndarray(self.shape, dtype=np.float64, buffer=self.memory.buf)
+
+    @staticmethod
+    def from_array(array):
+        """
+        Copies an array into a new shared memory block
+        :param array: numpy array
+        :return: SharedArray
+        """
+        shared = SharedArray(np.shape(array))
+        shared.array[...] = array
+        return shared
+
+    def get_descriptor(self):
+        """
+        Gets what a worker needs to attach to the array
+        :return: (name, shape)
+        """
+        return self.memory.name, self.shape
+
+    def close(self):
+        """
+        Detaches from the shared memory block
+        """
+        self.array = None
+        self.memory.close()
+
+    def unlink(self):
+        """
+        Detaches from the shared memory block and frees it
+        """
+        self.close()
+        self.memory.unlink()
+
+
+def get_tape(data):
+    """
+    Gets the tape of serialized expressions in a worker process, the tapes of the expressions that were used most
+    recently are kept, see MAX_WORKER_TAPES
+    :param data: the expressions in the binary format
+    :return: Tape
+    """
+    tape = WORKER_TAPES.get(data)
+    if tape is None:
+        tape = Tape(loads(data))
+        WORKER_TAPES[data] = tape
+        while len(WORKER_TAPES) > MAX_WORKER_TAPES:
+            WORKER_TAPES.popitem(last=False)
+    else:
+        WORKER_TAPES.move_to_end(data)
+    return tape
+
+
+def get_slice_values(inputs, start, stop, attached):
+    """
+    Gets the values of the parameters for a slice of rows in a worker process
+    :param inputs: dict mapping names to ("shared", descriptor) for arrays in shared memory, which are sliced, or to
+                   ("value", value) for values that broadcast
+    :param start: first row of the slice
+    :param stop: end of the slice
+    :param attached: list to which the attached SharedArrays are added, they have to be closed afterwards
+    :return: dict mapping names to values
+    """
+    values = dict()
+    for name, (kind, payload) in inputs.items():
+        if kind == "shared":
+            shared = SharedArray(payload[1], payload[0])
+            attached.append(shared)
+            values[name] = shared.array[start:stop]
+        else:
+            values[name] = payload
+    return values
+
+
+def calculate_slice(data, inputs, error_inputs, outputs, error_outputs, start, stop):
+    """
+    Calculates a slice of rows in a worker process and writes the results in place in shared memory
+    :param data: the expressions in the binary format
+    :param inputs: the parameters, see get_slice_values
+    :param error_inputs: the errors of the parameters, see get_slice_values, None to calculate only values
+    :param outputs: list of descriptors of the shared arrays of the values of the expressions
+    :param error_outputs: list of descriptors of the shared arrays of the errors of the expressions
+    :param start: first row of the slice
+    :param stop: end of the slice
+    :return: list of Booleans, whether the error of every expression could be calculated
+    """
+    tape = get_tape(data)
+    attached = []
+    try:
+        parameters = get_slice_values(inputs, start, stop, attached)
+        if error_inputs is None:
+            values, errors = tape.calculate(parameters), None
+        else:
+            values, errors = tape.calculate_all(parameters, get_slice_values(error_inputs, start, stop, attached))
+        if values is None:
+            raise ValueError("A symbol has no value")
+        if tape.single_output:
+            values, errors = [values], [errors]
+        has_error = []
+        for position, value in enumerate(values):
+            output = SharedArray(outputs[position][1], outputs[position][0])
+            attached.append(output)
+            output.array[start:stop] = value
+            if error_inputs is not None:
+                has_error.append(errors[position] is not None)
+                if errors[position] is not None:
+                    error_output = SharedArray(error_outputs[position][1], error_outputs[position][0])
+                    attached.append(error_output)
+                    error_output.array[start:stop] = errors[position]
+        return has_error
+    finally:
+        for shared in attached:
+            shared.close()
+
+
+def share_inputs(parameters, shape, shared):
+    """
+    Puts the parameters that have a row for every row of the results in shared memory
+    :param parameters: dict mapping names to values
+    :param shape: the shape of the results
+    :param shared: list to which the created SharedArrays are added, they have to be freed afterwards
+    :return: dict of inputs, see get_slice_values
+    """
+    inputs = dict()
+    for name, value in parameters.items():
+        if isinstance(value, SharedArray):
+            # shared arrays without a row for every row of the results broadcast like any other value
+            if get_rows(value.array, shape, 0, 1) is not value.array:
+                inputs[name] = "shared", value.get_descriptor()
+            else:
+                inputs[name] = "value", np.array(value.array)
+        elif get_rows(value, shape, 0, 1) is not value:
+            array = SharedArray.from_array(value)
+            shared.append(array)
+            inputs[name] = "shared", array.get_descriptor()
+        else:
+            inputs[name] = "value", value
+    return inputs
+
+
+def get_shared_outputs(out, tape, shape):
+    """
+    Gets the SharedArrays in which the results of the expressions are written
+    :param out: SharedArray, or a list with a SharedArray for every expression
+    :param tape: Tape of the expressions
+    :param shape: the shape of the results
+    :return: list of SharedArrays
+    """
+    outputs = [out] if tape.single_output and isinstance(out, SharedArray) else list(out)
+    if len(outputs) != len(tape.outputs) or not all(isinstance(output, SharedArray) for output in outputs):
+        raise TypeError("The results have to be written in a SharedArray for every expression")
+    for output in outputs:
+        if output.shape != tuple(shape):
+            raise ValueError("The results have shape %s, not %s" % (tuple(shape), output.shape))
+    return outputs
+
+
+def calculate_processes(expressions, parameters=None, error_parameters=None, processes=None, executor=None, out=None,
+                        error_out=None):
+    """
+    Calculates expressions over large arrays in a pool of processes. The arrays and the results are kept in shared
+    memory, every process only receives the serialized expressions and the bounds of its slice of rows, and writes
+    its results in place.
+    :param expressions: Expression of type Base, or a list of expressions
+    :param parameters: dict mapping the names of symbols to their values, arrays can also be SharedArrays, which are
+                       not copied. Their rows are split over the processes if they have a row for every row of the
+                       results, otherwise they broadcast.
+    :param error_parameters: dict mapping the names of symbols to their errors, if None only the values are calculated
+    :param processes: the number of processes, by default the number of CPUs
+    :param executor: concurrent.futures.ProcessPoolExecutor to use, by default a new one is created for the call
+    :param out: SharedArray, or a list with a SharedArray for every expression, in which the values are written
+                instead of being copied out of shared memory. The caller owns them and has to unlink them.
+    :param error_out: SharedArray, or a list of them, in which the errors are written, see out
+    :return: the values, or (values, errors) if error_parameters are given. For a list of expressions, the values and
+             errors are lists. If out or error_out is given, the values or errors are those SharedArrays, errors that
+             can't be calculated are None.
+    """
+    tape = Tape(expressions)
+    parameters = dict() if parameters is None else parameters
+    arrays = {name: value.array if isinstance(value, SharedArray) else value for name, value in parameters.items()}
+    error_arrays = {name: error.array if isinstance(error, SharedArray) else np.asarray(error, dtype=np.float64)
+                    for name, error in (error_parameters or dict()).items() if name in tape.names}
+    values = tape.get_parameter_values(arrays)
+    if any(value is None for value in values):
+        return None if error_parameters is None else (None, None)
+    shape = np.broadcast_shapes(*[value.shape for value in values], *[error.shape for error in error_arrays.values()])
+    if len(shape) == 0:
+        # a single number is not worth a process
+        if out is not None or error_out is not None:
+            raise ValueError("Results that are a single number are not calculated in shared memory")
+        return tape.calculate(arrays) if error_parameters is None else tape.calculate_all(arrays, error_arrays)
+
+    # arrays that are already in shared memory are not copied
+    used = {name: parameters[name] if isinstance(parameters[name], SharedArray) else value
+            for name, value in zip(tape.names, values) if name in arrays}
+    used_errors = {name: error_parameters[name] if isinstance(error_parameters[name], SharedArray) else error
+                   for name, error in error_arrays.items()}
+    processes = processes or os.cpu_count() or 1
+
+    shared = []
+    try:
+        inputs = share_inputs(used, shape, shared)
+        error_inputs = None if error_parameters is None else share_inputs(used_errors, shape, shared)
+        if out is None:
+            outputs = [SharedArray(shape) for _ in tape.outputs]
+            shared.extend(outputs)
+        else:
+            outputs = get_shared_outputs(out, tape, shape)
+        if error_parameters is None:
+            error_outputs = []
+        elif error_out is None:
+            error_outputs = [SharedArray(shape) for _ in tape.outputs]
+            shared.extend(error_outputs)
+        else:
+            error_outputs = get_shared_outputs(error_out, tape, shape)
+
+        data = dumps(expressions)
+        slices = split_rows(shape[0], processes)
+        arguments = (data, inputs, error_inputs, [output.get_descriptor() for output in outputs],
+                     [output.get_descriptor() for output in error_outputs])
+        pool = executor or ProcessPoolExecutor(min(processes, len(slices)))
+        try:
+            futures = [pool.submit(calculate_slice, *arguments, start, stop) for start, stop in slices]
+            has_error = [future.result() for future in futures]
+        finally:
+            if executor is None:
+                pool.shutdown()
+
+        results = outputs if out is not None else [output.array.copy() for output in outputs]
+        if error_parameters is None:
+            return tape.get_output(results)
+        errors = [(output if error_out is not None else output.array.copy())
+                  if all(error[position] for error in has_error) else None
+                  for position, output in enumerate(error_outputs)]
+        return tape.get_output(results), tape.get_output(errors)
+    finally:
+        for array in shared:
+            array.unlink()
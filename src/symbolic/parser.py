@@ -0,0 +1,274 @@
+from .base import *
+import re
+
+TOKEN = re.compile(r"""
+    (?P<space>\s+)
+    |(?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+    |(?P<name>[A-Za-z_][A-Za-z0-9_]*)
+    |(?P<operator>\*\*|[-+*/^(),])
+    """, re.VERBOSE)
+# in LaTeX, names can have subscripts, brackets can be sized and there are spacing commands which are skipped
+LATEX_TOKEN = re.compile(r"""
+    (?P<space>\s+|\\[,;:!\ ]|\\left\b|\\right\b)
+    |(?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+    |(?P<command>\\[A-Za-z]+)
+    |(?P<name>[A-Za-z][A-Za-z0-9]*(?:_(?:\{[^{}]*\}|[A-Za-z0-9]+))*)
+    |(?P<operator>[-+*/^(){}_])
+    """, re.VERBOSE)
+LATEX_MULTIPLICATIONS = {r"\cdot", r"\times"}
+LATEX_LOGARITHMS = {r"\log", r"\ln"}
+FUNCTIONS = {"log", "ln"}
+
+
+def tokenize(text, latex=False):
+    """
+    Splits a formula in tokens
+    :param text: the formula
+    :param latex: If True, the formula is LaTeX
+    :return: list of (kind, text, position), ending with an ("end", "", length of the text) token
+    """
+    pattern = LATEX_TOKEN if latex else TOKEN
+    tokens = []
+    position = 0
+    while position < len(text):
+        match = pattern.match(text, position)
+        if match is None:
+            raise ValueError("Unexpected character %r at position %d in %r" % (text[position], position, text))
+        kind = match.lastgroup
+        if kind != "space":
+            tokens.append((kind, match.group(), position))
+        position = match.end()
+    tokens.append(("end", "", len(text)))
+    return tokens
+
+
+class Parser:
+    """
+    Parses formulas in plain infix text (x * (y + 2) ** 2 / log(x, 10)) or in the LaTeX that latexify produces
+    (x \\cdot \\left( y + 2 \\right)^{2}, \\frac{..}{..}, \\log_{10}x) into expressions. The symbols are taken from a
+    table that is shared by all formulas parsed by the same parser, and identical subexpressions become the same
+    object. Parsing takes linear time in the length of the formula.
+    """
+
+    def __init__(self, symbols=None, latex=False):
+        """
+        Initializes the parser
+        :param symbols: dict mapping names to Symbols or named Constants, names that are not in there become new
+                        Symbols which are added to it
+        :param latex: If True, formulas are parsed as LaTeX
+        """
+        self.symbols = dict() if symbols is None else symbols
+        self.latex = latex
+        self.nodes = dict()
+        self.tokens = []
+        self.index = 0
+        self.text = ""
+
+    def parse(self, text):
+        """
+        Parses a formula
+        :param text: the formula
+        :return: Expression of type Base
+        """
+        self.text = text
+        self.tokens = tokenize(text, self.latex)
+        self.index = 0
+        expression = self.parse_expression()
+        self.expect("end")
+        return expression
+
+    def peek(self):
+        return self.tokens[self.index]
+
+    def next(self):
+        token = self.tokens[self.index]
+        self.index += 1
+        return token
+
+    def accept(self, *texts):
+        """
+        Skips the next token if it is one of the given texts
+        :param texts: the texts of the tokens
+        :return: the text of the token, None if it is not one of the texts
+        """
+        token = self.peek()
+        if token[0] != "end" and token[1] in texts:
+            self.index += 1
+            return token[1]
+        return None
+
+    def expect(self, text):
+        """
+        Skips the next token, which must have the given text
+        :param text: the text of the token, or "end" for the end of the formula
+        """
+        kind, token_text, _ = self.next()
+        if (kind if text == "end" else token_text) != text:
+            self.error(self.index - 1, "expected %r" % text)
+
+    def error(self, index, message="unexpected token"):
+        kind, text, position = self.tokens[index]
+        raise ValueError("%s at position %d in %r: %s" % ("Unexpected end" if kind == "end" else "Unexpected %r" % text,
+                                                          position, self.text, message))
+
+    def make(self, operation, x, y):
+        """
+        Creates an operation, or gets the identical one that was created before
+        :param operation: the class of the operation
+        :param x: Expression of type Base
+        :param y: Expression of type Base
+        :return: the operation
+        """
+        key = operation, id(x), id(y)
+        node = self.nodes.get(key)
+        if node is None:
+            node = operation(x, y)
+            # the operands are kept alive by the node, so their ids are not reused
+            self.nodes[key] = node
+        return node
+
+    def parse_expression(self):
+        expression = self.parse_term()
+        operator = self.accept("+", "-")
+        while operator is not None:
+            expression = self.make(Add if operator == "+" else Subtract, expression, self.parse_term())
+            operator = self.accept("+", "-")
+        return expression
+
+    def parse_term(self):
+        expression = self.parse_unary()
+        while True:
+            if self.accept("*") is not None or (self.latex and self.accept(*LATEX_MULTIPLICATIONS) is not None):
+                expression = self.make(Multiply, expression, self.parse_unary())
+            elif self.accept("/") is not None:
+                expression = self.make(Divide, expression, self.parse_unary())
+            else:
+                return expression
+
+    def parse_unary(self):
+        operator = self.accept("-", "+")
+        if operator is None:
+            return self.parse_power()
+        expression = self.parse_unary()
+        if operator == "+":
+            return expression
+        if isinstance(expression, Constant) and expression.name is None and is_numerical(expression.value):
+            return intern_constant(- expression.value)
+        return self.make(Multiply, intern_constant(-1), expression)
+
+    def parse_power(self):
+        expression = self.parse_primary()
+        if self.latex:
+            # latexify writes (x^{y})^{z} as x^{y}^{z}
+            while self.accept("^") is not None:
+                expression = self.make(Power, expression, self.parse_group())
+            return expression
+        if self.accept("**", "^") is not None:
+            expression = self.make(Power, expression, self.parse_unary())
+        return expression
+
+    def parse_group(self):
+        """
+        Parses the argument of a LaTeX command: an expression in braces, or a single number or name
+        :return: Expression of type Base
+        """
+        if self.accept("{") is not None:
+            expression = self.parse_expression()
+            self.expect("}")
+            return expression
+        kind = self.peek()[0]
+        if kind not in ("number", "name"):
+            self.error(self.index, "expected an argument")
+        return self.parse_primary()
+
+    def parse_primary(self):
+        kind, text, _ = self.next()
+        if kind == "number":
+            return intern_constant(float(text) if any(character in text for character in ".eE") else int(text))
+        if kind == "name":
+            if not self.latex and text in FUNCTIONS and self.accept("(") is not None:
+                return self.parse_function()
+            return self.get_symbol(text)
+        if text == "(" or (self.latex and text == "{"):
+            expression = self.parse_expression()
+            self.expect(")" if text == "(" else "}")
+            return expression
+        if self.latex and text == r"\frac":
+            numerator = self.parse_group()
+            return self.make(Divide, numerator, self.parse_group())
+        if self.latex and text in LATEX_LOGARITHMS:
+            base = self.parse_group() if text == r"\log" and self.accept("_") is not None else None
+            # the argument of a logarithm is a single factor, latexify puts brackets around anything larger
+            argument = self.parse_primary()
+            return self.make(Log, argument, self.get_base(base))
+        self.error(self.index - 1)
+
+    def parse_function(self):
+        """
+        Parses the arguments of log(x) or log(x, base) in plain text, after the opening bracket
+        :return: Log
+        """
+        argument = self.parse_expression()
+        base = self.parse_expression() if self.accept(",") is not None else None
+        self.expect(")")
+        return self.make(Log, argument, self.get_base(base))
+
+    def get_base(self, base):
+        """
+        Gets the base of a logarithm, e is the named constant e that is also the default base of Log
+        :param base: Expression of type Base, None for a natural logarithm
+        :return: Expression of type Base
+        """
+        if base is None or (isinstance(base, Constant) and base.name is None and base.value == e):
+            return NATURAL_BASE
+        return base
+
+    def get_symbol(self, name):
+        """
+        Gets the symbol with the given name from the symbol table, it is created if it is not in there. Unless the
+        table has a symbol e, e is the named constant e.
+        :param name: the name of the symbol
+        :return: Symbol or named Constant
+        """
+        symbol = self.symbols.get(name)
+        if symbol is None and name == NATURAL_BASE.name:
+            return NATURAL_BASE
+        if symbol is None:
+            symbol = Symbol(name)
+            self.symbols[name] = symbol
+        return symbol
+
+
+def parse(text, symbols=None, latex=False):
+    """
+    Parses a formula into an expression, see Parser
+    :param text: the formula
+    :param symbols: dict mapping names to Symbols or named Constants, new Symbols are added to it
+    :param latex: If True, the formula is parsed as LaTeX
+    :return: Expression of type Base
+    example: parse("x * (y + 2)") -> x * (y + 2)
+    """
+    return Parser(symbols, latex).parse(text)
+
+
+def parse_latex(text, symbols=None):
+    """
+    Parses a LaTeX formula, as produced by latexify, into an expression
+    :param text: the formula
+    :param symbols: dict mapping names to Symbols or named Constants, new Symbols are added to it
+    :return: Expression of type Base
+    example: parse_latex(r"\\frac{x}{y + 2}") -> x / (y + 2)
+    """
+    return Parser(symbols, latex=True).parse(text)
+
+
+def parse_many(texts, symbols=None, latex=False):
+    """
+    Parses many formulas with one parser: they share their symbols and their identical subexpressions
+    :param texts: iterable of formulas
+    :param symbols: dict mapping names to Symbols or named Constants, new Symbols are added to it
+    :param latex: If True, the formulas are parsed as LaTeX
+    :return: list of expressions
+    """
+    parser = Parser(symbols, latex)
+    return [parser.parse(text) for text in texts]
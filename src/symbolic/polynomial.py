@@ -0,0 +1,458 @@
+from .base import *
+from math import gcd
+
+
+def multiply_monomials(monomial1, monomial2):
+    """
+    Multiplies two monomials
+    :param monomial1: tuple of (name, exponent) pairs, sorted by name
+    :param monomial2: tuple of (name, exponent) pairs, sorted by name
+    :return: the product of the monomials, as a tuple of (name, exponent) pairs sorted by name
+    example: ((x, 1), (y, 2)) * ((y, 1), (z, 1)) = ((x, 1), (y, 3), (z, 1))
+    """
+    if not monomial1:
+        return monomial2
+    if not monomial2:
+        return monomial1
+    exponents = dict(monomial1)
+    for name, exponent in monomial2:
+        exponents[name] = exponents.get(name, 0) + exponent
+    return tuple(sorted(exponents.items()))
+
+
+def power_to_multiplications(x, exponent):
+    """
+    Writes an integer power as a chain of multiplications by repeated squaring, the squares are shared subexpressions
+    :param x: Expression of type Base
+    :param exponent: int
+    :return: expression
+    example: x ** 5 -> (x * x) * (x * x) * x, with x * x a single object
+    """
+    if exponent == 0:
+        return intern_constant(1)
+    if exponent < 0:
+        return 1 / power_to_multiplications(x, - exponent)
+    output_expression = None
+    square = x
+    while exponent > 0:
+        if exponent % 2 == 1:
+            output_expression = square if output_expression is None else output_expression * square
+        exponent //= 2
+        if exponent > 0:
+            square = square * square
+    return output_expression
+
+
+class Polynomial:
+    """
+    Sparse polynomial over Symbols: a dictionary mapping monomials to their coefficient. A monomial is a tuple of
+    (name, exponent) pairs sorted by the name of the symbol, the empty tuple is the constant monomial.
+    """
+
+    def __init__(self, terms=None):
+        """
+        Initializes the polynomial
+        :param terms: dict mapping monomials to coefficients, terms with a zero coefficient are dropped
+        """
+        self.terms = dict()
+        if terms is not None:
+            for monomial, coefficient in terms.items():
+                if coefficient != 0:
+                    self.terms[monomial] = coefficient
+
+    @classmethod
+    def constant(cls, value):
+        """
+        Creates a constant polynomial
+        :param value: number
+        :return: Polynomial
+        """
+        return cls({(): value})
+
+    @classmethod
+    def variable(cls, name):
+        """
+        Creates the polynomial consisting of one symbol
+        :param name: the name of the symbol
+        :return: Polynomial
+        """
+        return cls({((name, 1),): 1})
+
+    def is_constant(self):
+        """
+        Checks whether or not the polynomial is a constant
+        :return: Boolean
+        """
+        return len(self.terms) == 0 or (len(self.terms) == 1 and () in self.terms)
+
+    def constant_value(self):
+        """
+        Gets the coefficient of the constant monomial
+        :return: number
+        """
+        return self.terms.get((), 0)
+
+    def degree(self):
+        """
+        Gets the total degree of the polynomial
+        :return: int, 0 for constant polynomials
+        """
+        return max([sum(exponent for _, exponent in monomial) for monomial in self.terms], default=0)
+
+    def __add__(self, other):
+        if not isinstance(other, Polynomial):
+            other = Polynomial.constant(other)
+        terms = dict(self.terms)
+        for monomial, coefficient in other.terms.items():
+            terms[monomial] = terms.get(monomial, 0) + coefficient
+        return Polynomial(terms)
+
+    def __radd__(self, other):
+        return self + other
+
+    def __neg__(self):
+        return self * -1
+
+    def __sub__(self, other):
+        if not isinstance(other, Polynomial):
+            other = Polynomial.constant(other)
+        return self + (- other)
+
+    def __rsub__(self, other):
+        return (- self) + other
+
+    def __mul__(self, other):
+        if not isinstance(other, Polynomial):
+            return Polynomial({monomial: coefficient * other for monomial, coefficient in self.terms.items()})
+        terms = dict()
+        for monomial1, coefficient1 in self.terms.items():
+            for monomial2, coefficient2 in other.terms.items():
+                monomial = multiply_monomials(monomial1, monomial2)
+                terms[monomial] = terms.get(monomial, 0) + coefficient1 * coefficient2
+        return Polynomial(terms)
+
+    def __rmul__(self, other):
+        return self * other
+
+    def __pow__(self, power, modulo=None):
+        """
+        Expands the polynomial to a non-negative integer power using repeated squaring
+        :param power: int, non-negative
+        :return: Polynomial
+        """
+        assert isinstance(power, int) and power >= 0
+        result = Polynomial.constant(1)
+        base = self
+        while power > 0:
+            if power % 2 == 1:
+                result = result * base
+            power //= 2
+            if power > 0:
+                base = base * base
+        return result
+
+    def __eq__(self, other):
+        if not isinstance(other, Polynomial):
+            other = Polynomial.constant(other)
+        return self.terms == other.terms
+
+    def content(self):
+        """
+        Gets the greatest common divisor of all terms of the polynomial
+        :return: (monomial, coefficient) where monomial has the lowest exponent of every symbol appearing in all terms
+                 and coefficient is the gcd of the coefficients if they are all integers, otherwise 1
+        example: 4 * x^2 * y + 6 * x * y^3 -> (((x, 1), (y, 1)), 2)
+        """
+        if len(self.terms) == 0:
+            return (), 1
+        monomials = list(self.terms)
+        exponents = dict(monomials[0])
+        for monomial in monomials[1:]:
+            other_exponents = dict(monomial)
+            exponents = {name: min(exponent, other_exponents[name]) for name, exponent in exponents.items()
+                         if name in other_exponents}
+
+        coefficient = 0
+        for value in self.terms.values():
+            if not isinstance(value, int) or isinstance(value, bool):
+                coefficient = 1
+                break
+            coefficient = gcd(coefficient, value)
+        return tuple(sorted(exponents.items())), max(coefficient, 1)
+
+    def divide_monomial(self, monomial, coefficient=1):
+        """
+        Divides every term by the given monomial, the monomial should divide every term (see content)
+        :param monomial: tuple of (name, exponent) pairs
+        :param coefficient: number by which the coefficients are divided
+        :return: Polynomial
+        """
+        inverse = tuple((name, - exponent) for name, exponent in monomial)
+        terms = dict()
+        for term_monomial, term_coefficient in self.terms.items():
+            new_monomial = tuple((name, exponent) for name, exponent in multiply_monomials(term_monomial, inverse)
+                                 if exponent != 0)
+            if coefficient != 1:
+                term_coefficient = term_coefficient // coefficient if isinstance(term_coefficient, int) \
+                    else term_coefficient / coefficient
+            terms[new_monomial] = term_coefficient
+        return Polynomial(terms)
+
+    def monomial_to_expression(self, monomial, symbols):
+        """
+        Turns a monomial into an expression
+        :param monomial: tuple of (name, exponent) pairs
+        :param symbols: dict mapping the names to the Symbols, the order of the dict is the order of the factors
+        :return: expression, None for the constant monomial
+        """
+        exponents = dict(monomial)
+        output_expression = None
+        for name in symbols:
+            if name not in exponents:
+                continue
+            factor = symbols[name] if exponents[name] == 1 else symbols[name] ** exponents[name]
+            output_expression = factor if output_expression is None else output_expression * factor
+        return output_expression
+
+    def sum_to_expression(self, symbols):
+        """
+        Turns the polynomial into a sum of terms, without factorizing
+        :param symbols: dict mapping the names to the Symbols
+        :return: expression
+        """
+        output_expression = None
+        for monomial, coefficient in self.terms.items():
+            monomial_expression = self.monomial_to_expression(monomial, symbols)
+            if monomial_expression is None:
+                term = Constant(coefficient)
+            elif coefficient == 1:
+                term = monomial_expression
+            else:
+                term = coefficient * monomial_expression
+            output_expression = term if output_expression is None else output_expression + term
+
+        if output_expression is None:
+            return Constant(0)
+        return output_expression
+
+    def to_expression(self, symbols, factor_content=True):
+        """
+        Turns the polynomial into an expression, the content of the polynomial (the greatest common divisor of the
+        integer coefficients and the common monomial) is factored out. Common factors that are polynomials themselves
+        are not found, there is no greatest common divisor of multivariate polynomials.
+        :param symbols: dict mapping the names to the Symbols, the order of the dict is the order of the factors
+        :param factor_content: If False, the polynomial is written as a sum of terms, see sum_to_expression
+        :return: expression
+        example: x^2 * y + 3 * x -> x * (x * y + 3), 6 * x + 9 -> 3 * (2 * x + 3)
+        """
+        if len(self.terms) <= 1 or not factor_content:
+            return self.sum_to_expression(symbols)
+        monomial, coefficient = self.content()
+        if not monomial and coefficient == 1:
+            return self.sum_to_expression(symbols)
+        factor = self.monomial_to_expression(monomial, symbols)
+        if coefficient != 1:
+            factor = intern_constant(coefficient) if factor is None else coefficient * factor
+        return factor * self.divide_monomial(monomial, coefficient).sum_to_expression(symbols)
+
+    def to_horner(self, symbols):
+        """
+        Turns the polynomial into an expression in Horner form, which needs the fewest operations to calculate. The
+        symbol that occurs in the most terms is taken out first, its coefficients are written in Horner form as well.
+        :param symbols: dict mapping the names to the Symbols
+        :return: expression
+        example: x^3 + 2 * x^2 * y + x -> x * (1 + x * (x + 2 * y))
+        """
+        if self.is_constant():
+            return intern_constant(self.constant_value())
+        counts = dict()
+        for monomial in self.terms:
+            for name, _ in monomial:
+                counts[name] = counts.get(name, 0) + 1
+        variable = max([name for name in symbols if name in counts], key=lambda name: counts[name])
+
+        coefficients = dict()
+        for monomial, coefficient in self.terms.items():
+            exponents = dict(monomial)
+            rest = tuple((name, exponent) for name, exponent in monomial if name != variable)
+            coefficients.setdefault(exponents.get(variable, 0), dict())[rest] = coefficient
+        exponents = sorted(coefficients)
+
+        output_expression = Polynomial(coefficients[exponents[-1]]).to_horner(symbols)
+        for position in range(len(exponents) - 2, -1, -1):
+            shift = power_to_multiplications(symbols[variable], exponents[position + 1] - exponents[position])
+            if isinstance(output_expression, Constant) and output_expression.value == 1:
+                output_expression = shift
+            else:
+                output_expression = shift * output_expression
+            output_expression = Polynomial(coefficients[exponents[position]]).to_horner(symbols) + output_expression
+        if exponents[0] > 0:
+            shift = power_to_multiplications(symbols[variable], exponents[0])
+            if isinstance(output_expression, Constant) and output_expression.value == 1:
+                return shift
+            output_expression = shift * output_expression
+        return output_expression
+
+    def __str__(self):
+        return str(self.sum_to_expression({name: Symbol(name) for monomial in self.terms for name, _ in monomial}))
+
+
+def get_signed_terms(expression, sign=1):
+    """
+    Gets the terms of an addition and subtraction with their sign
+    :param expression: expression from which to extract the terms
+    :param sign: 1 or -1, the sign of the expression itself
+    :return: list of (sign, term)
+    example: x - (y + z) -> [(1, x), (-1, y), (-1, z)]
+    """
+    if isinstance(expression, Add):
+        return get_signed_terms(expression.x, sign) + get_signed_terms(expression.y, sign)
+    elif isinstance(expression, Subtract):
+        return get_signed_terms(expression.x, sign) + get_signed_terms(expression.y, - sign)
+    return [(sign, expression)]
+
+
+def get_signed_factors(expression, sign=1):
+    """
+    Gets the factors of a multiplication and division with the sign of their exponent
+    :param expression: expression from which to extract the factors
+    :param sign: 1 or -1, the sign of the exponent of the expression itself
+    :return: list of (sign, factor)
+    example: x / (y * z) -> [(1, x), (-1, y), (-1, z)]
+    """
+    if isinstance(expression, Multiply):
+        return get_signed_factors(expression.x, sign) + get_signed_factors(expression.y, sign)
+    elif isinstance(expression, Divide):
+        return get_signed_factors(expression.x, sign) + get_signed_factors(expression.y, - sign)
+    return [(sign, expression)]
+
+
+def polynomial_parts(expression, symbols, factor_content=True):
+    """
+    Converts every polynomial subexpression to a Polynomial. Recursive function to actually do the conversion
+    :param expression: Expression of type Base, is not changed
+    :param symbols: dict in which the Symbols that are encountered are stored by name, in order of appearance
+    :param factor_content: whether the content of the polynomials is factored out, see Polynomial.to_expression
+    :return: (expression, polynomial), the polynomial is None if the expression is not a polynomial, otherwise the
+             expression is None
+    """
+    if isinstance(expression, Symbol) and not is_numerical(expression.value):
+        symbols.setdefault(expression.name, expression)
+        return None, Polynomial.variable(expression.name)
+    elif isinstance(expression, (Symbol, Constant)):
+        if is_numerical(expression.value):
+            return None, Polynomial.constant(expression.value)
+        return expression, None
+
+    elif isinstance(expression, (Add, Subtract)):
+        polynomial = Polynomial()
+        other_terms = []
+        for sign, term in get_signed_terms(expression):
+            new_term, term_polynomial = polynomial_parts(term, symbols, factor_content)
+            if term_polynomial is not None:
+                polynomial = polynomial + term_polynomial * sign
+            else:
+                other_terms.append((sign, new_term))
+        if len(other_terms) == 0:
+            return None, polynomial
+
+        output_expression = None if len(polynomial.terms) == 0 else polynomial.to_expression(symbols, factor_content)
+        for sign, term in other_terms:
+            if output_expression is None:
+                output_expression = term if sign == 1 else - term
+            elif sign == 1:
+                output_expression = output_expression + term
+            else:
+                output_expression = output_expression - term
+        return output_expression, None
+
+    elif isinstance(expression, (Multiply, Divide)):
+        polynomial = Polynomial.constant(1)
+        other_factors = []
+        for sign, factor in get_signed_factors(expression):
+            new_factor, factor_polynomial = polynomial_parts(factor, symbols, factor_content)
+            if factor_polynomial is not None and sign == 1:
+                polynomial = polynomial * factor_polynomial
+            elif factor_polynomial is not None and factor_polynomial.is_constant() and \
+                    factor_polynomial.constant_value() != 0:
+                polynomial = polynomial * (1 / factor_polynomial.constant_value())
+            else:
+                if factor_polynomial is not None:
+                    new_factor = factor_polynomial.to_expression(symbols, factor_content)
+                other_factors.append((sign, new_factor))
+        if len(other_factors) == 0:
+            return None, polynomial
+
+        output_expression = None
+        if polynomial != 1:
+            output_expression = polynomial.to_expression(symbols, factor_content)
+        for sign, factor in other_factors:
+            if output_expression is None:
+                output_expression = factor if sign == 1 else 1 / factor
+            elif sign == 1:
+                output_expression = output_expression * factor
+            else:
+                output_expression = output_expression / factor
+        return output_expression, None
+
+    elif isinstance(expression, Power):
+        new_x, polynomial_x = polynomial_parts(expression.x, symbols, factor_content)
+        new_y, polynomial_y = polynomial_parts(expression.y, symbols, factor_content)
+        if polynomial_x is not None and polynomial_y is not None and polynomial_y.is_constant():
+            exponent = polynomial_y.constant_value()
+            if isinstance(exponent, int) and not isinstance(exponent, bool) and exponent >= 0:
+                return None, polynomial_x ** exponent
+        if polynomial_x is not None:
+            new_x = polynomial_x.to_expression(symbols, factor_content)
+        if polynomial_y is not None:
+            new_y = polynomial_y.to_expression(symbols, factor_content)
+        return Power(new_x, new_y, expression.name), None
+
+    elif isinstance(expression, BaseOperator2):
+        new_x, polynomial_x = polynomial_parts(expression.x, symbols, factor_content)
+        new_y, polynomial_y = polynomial_parts(expression.y, symbols, factor_content)
+        if polynomial_x is not None:
+            new_x = polynomial_x.to_expression(symbols, factor_content)
+        if polynomial_y is not None:
+            new_y = polynomial_y.to_expression(symbols, factor_content)
+        return expression.__class__(new_x, new_y, name=expression.name), None
+
+    return expression, None
+
+
+def to_polynomial(expression, symbols=None):
+    """
+    Converts the given expression to a Polynomial
+    :param expression: Expression of type Base
+    :param symbols: dict in which the Symbols that are encountered are stored by name
+    :return: Polynomial, or None if the expression is not a polynomial in its Symbols
+    example: (x + 1) ** 2 -> x^2 + 2 * x + 1
+    """
+    if symbols is None:
+        symbols = dict()
+    _, polynomial = polynomial_parts(expression, symbols)
+    return polynomial
+
+
+def polynomial_simplification(expression):
+    """
+    Collects every polynomial part of the expression in a sparse Polynomial: sums, products and non-negative integer
+    powers of polynomials are expanded and collected, and the common monomial factor of every sum is factored out.
+    The expanded form is only kept if, without the content factored out, it has no more nodes than the expression, such
+    that powers and products of sums that don't cancel stay as they are.
+    :param expression: Base, expression
+    :return: simplified expression
+    example: (x + y) ** 2 - y ** 2 + Log(z) -> x * (x + 2 * y) + Log(z), (x + y) ** 5 is not expanded
+    """
+    symbols = dict()
+    output_expression, polynomial = polynomial_parts(expression, symbols)
+    if polynomial is not None:
+        output_expression = polynomial.to_expression(symbols)
+    size = node_count(expression)
+    if node_count(output_expression) > size:
+        expanded, polynomial = polynomial_parts(expression, dict(), False)
+        if polynomial is not None:
+            expanded = polynomial.sum_to_expression(symbols)
+        if node_count(expanded) > size:
+            return expression
+    return output_expression
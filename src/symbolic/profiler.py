@@ -0,0 +1,345 @@
+from .base import *
+from contextvars import ContextVar
+import threading
+import time
+import numpy as np
+
+# operations whose calculate is timed
+PROFILED_CLASSES = [Add, Subtract, Multiply, Divide, Power, Log]
+MAX_LABEL_LENGTH = 80
+# the number of levels of operations in a label, deeper operands are left out since the label is shortened anyway
+MAX_LABEL_DEPTH = 5
+# the profilers that are active in the current context, see Profiler.start
+ACTIVE_PROFILERS = ContextVar("active_profilers", default=())
+# the calculate methods of the operations while they are wrapped, see install_hook
+ORIGINAL_CALCULATE = dict()
+# the number of times a profiler was started in a context and not stopped yet, the hook is removed when it is zero
+HOOK_STATE = {"activations": 0}
+HOOK_LOCK = threading.Lock()
+
+
+class NodeStatistics:
+    """
+    The calls, time and output size of the nodes of the expressions that have the same structure, see Profiler
+    """
+
+    def __init__(self, key):
+        self.key = key
+        self.calls = 0
+        self.cumulative_time = 0.0
+        self.self_time = 0.0
+        self.size = 0
+
+
+def get_label(node):
+    """
+    Gets the label of a node
+    :param node: Expression of type Base
+    :return: str, the name of the class and the latex code of the node without the values of the symbols
+    """
+    # semicolons separate the frames in the folded format
+    return "%s: %s" % (node.__class__.__name__, node.latexify(use_value=False).replace(";", ","))
+
+
+def get_label_symbol(node):
+    """
+    Gets the symbol that stands for a symbol or constant in the expressions from which labels are made, it has no
+    value, such that labels are made without calculating anything
+    :param node: Symbol or Constant
+    :return: Symbol named after the name of the node, or its value if it has no name
+    """
+    return Symbol(str(node.value if isinstance(node, Constant) and node.name is None else node.name))
+
+
+def shorten_label(label):
+    """
+    Shortens a label for the report and the folded stacks
+    :param label: str, see get_label
+    :return: str
+    """
+    return label if len(label) <= MAX_LABEL_LENGTH else label[:MAX_LABEL_LENGTH - 3] + "..."
+
+
+def get_profiled_calculate(original):
+    """
+    Wraps the calculate method of an operation such that it is timed by the profilers that are active in the current
+    context
+    :param original: the original method
+    :return: the timed method
+    """
+
+    def calculate(node, parameters=None):
+        profilers = ACTIVE_PROFILERS.get()
+        if len(profilers) == 0:
+            return original(node, parameters)
+        for profiler in profilers:
+            profiler.enter(node)
+        start = time.perf_counter()
+        result, failed = None, True
+        try:
+            result = original(node, parameters)
+            failed = False
+            return result
+        finally:
+            elapsed = time.perf_counter() - start
+            for profiler in profilers:
+                profiler.leave(elapsed, result, failed)
+
+    return calculate
+
+
+def install_hook():
+    """
+    Wraps the calculate methods of the operations, if they aren't wrapped yet. Every call is undone by remove_hook.
+    """
+    with HOOK_LOCK:
+        HOOK_STATE["activations"] += 1
+        if len(ORIGINAL_CALCULATE) == 0:
+            for operation in PROFILED_CLASSES:
+                ORIGINAL_CALCULATE[operation] = operation.__dict__["calculate"]
+                operation.calculate = get_profiled_calculate(ORIGINAL_CALCULATE[operation])
+
+
+def remove_hook():
+    """
+    Restores the original calculate methods of the operations, after the last profiler stopped
+    """
+    with HOOK_LOCK:
+        HOOK_STATE["activations"] -= 1
+        if HOOK_STATE["activations"] == 0:
+            for operation, calculate in ORIGINAL_CALCULATE.items():
+                operation.calculate = calculate
+            ORIGINAL_CALCULATE.clear()
+
+
+class Profiler:
+    """
+    Records, for the nodes of the expressions that are calculated while the profiler is active, the number of calls,
+    the cumulative time including their operands, the time spent in the nodes themselves and the size of their
+    output. Nodes are recorded by their structure, so identical subexpressions are counted together and no node is
+    kept alive after the outermost calculation ends. Labels are only made for the nodes that are reported. Since
+    calculate_error goes through calculate, it is profiled as well. A profiler is only active in the context in which
+    it was started, profilers can be nested and stopped in any order. The calculate methods of the operations are
+    only wrapped while a profiler is active.
+    example: with Profiler() as profiler:
+                 expression.calculate_error(parameters, error_parameters)
+             print(profiler.report())
+    """
+
+    def __init__(self):
+        # the statistics by the number of the structure of the nodes, and the time by the path of numbers
+        self.statistics = dict()
+        self.stacks = dict()
+        # the number of every structure, and the structures by number from which the labels are made
+        self.numbers = dict()
+        self.structures = []
+        self.labels = dict()
+        # the nodes that are being calculated in every thread
+        self.local = threading.local()
+
+    def get_local(self):
+        """
+        Gets the state of the current thread
+        :return: threading.local with the list of [id, time of the operands] of the nodes that are being calculated,
+                 and the nodes, statistics and stacks by id since the outermost node started
+        """
+        if not hasattr(self.local, "frames"):
+            self.local.frames, self.local.nodes, self.local.statistics, self.local.stacks = [], dict(), dict(), dict()
+        return self.local
+
+    def enter(self, node):
+        """
+        Records that the calculation of a node starts
+        :param node: Expression of type Base
+        """
+        local = self.get_local()
+        # the outermost node keeps all nodes in between alive, so their ids are not reused until it is calculated
+        local.nodes[id(node)] = node
+        local.frames.append([id(node), 0.0])
+
+    def leave(self, elapsed, result, failed):
+        """
+        Records that the calculation of the current node ended
+        :param elapsed: the time of the calculation including the operands
+        :param result: the value of the node
+        :param failed: whether the calculation raised an exception, then only the stack is updated
+        """
+        local = self.get_local()
+        path = tuple(node for node, _ in local.frames)
+        node, children_time = local.frames.pop()
+        if len(local.frames) > 0:
+            local.frames[-1][1] += elapsed
+        if not failed:
+            statistics = local.statistics.get(node)
+            if statistics is None:
+                statistics = local.statistics[node] = NodeStatistics(None)
+            statistics.calls += 1
+            statistics.cumulative_time += elapsed
+            statistics.self_time += elapsed - children_time
+            statistics.size = max(statistics.size, int(np.size(result.value if isinstance(result, UncertainArray)
+                                                                else result)))
+            local.stacks[path] = local.stacks.get(path, 0.0) + elapsed - children_time
+        if len(local.frames) == 0:
+            self.add_statistics(local)
+
+    def get_number(self, expression, numbers=None):
+        """
+        Gets the number of the structure of a node, nodes with the same structure get the same number. The key of an
+        operation holds the numbers of its operands, so it is made and hashed in constant time.
+        :param expression: Expression of type Base
+        :param numbers: dict mapping the ids of the nodes that are numbered already to their numbers
+        :return: int
+        """
+        numbers = dict() if numbers is None else numbers
+        if id(expression) in numbers:
+            return numbers[id(expression)]
+        if isinstance(expression, BaseOperator2):
+            key = (expression.__class__, expression.name, self.get_number(expression.x, numbers),
+                   self.get_number(expression.y, numbers))
+        else:
+            key = get_structural_key(expression)
+        number = self.numbers.get(key)
+        if number is None:
+            number = self.numbers[key] = len(self.structures)
+            self.structures.append(key if isinstance(expression, BaseOperator2) else get_label_symbol(expression))
+        numbers[id(expression)] = number
+        return number
+
+    def add_statistics(self, local):
+        """
+        Adds the statistics of the outermost node that was calculated to those by structure, after which the nodes
+        are released
+        :param local: the state of the current thread, see get_local
+        """
+        numbers = dict()
+        for node, pending in local.statistics.items():
+            number = self.get_number(local.nodes[node], numbers)
+            statistics = self.statistics.get(number)
+            if statistics is None:
+                statistics = self.statistics[number] = NodeStatistics(number)
+            statistics.calls += pending.calls
+            statistics.cumulative_time += pending.cumulative_time
+            statistics.self_time += pending.self_time
+            statistics.size = max(statistics.size, pending.size)
+        for path, elapsed in local.stacks.items():
+            path = tuple(self.get_number(local.nodes[node], numbers) for node in path)
+            self.stacks[path] = self.stacks.get(path, 0.0) + elapsed
+        local.nodes, local.statistics, local.stacks = dict(), dict(), dict()
+
+    def get_expression(self, number, depth=MAX_LABEL_DEPTH):
+        """
+        Rebuilds the top of an expression of a structure, in which the symbols and constants have no value
+        :param number: the number of the structure, see get_number
+        :param depth: the number of levels of operations that are rebuilt, deeper operands are replaced by a symbol
+        :return: Expression of type Base
+        """
+        structure = self.structures[number]
+        if isinstance(structure, Base):
+            return structure
+        if depth == 0:
+            return Symbol("\\ldots")
+        operation, name, x, y = structure
+        return operation(self.get_expression(x, depth - 1), self.get_expression(y, depth - 1), name)
+
+    def get_label(self, number):
+        """
+        Gets the shortened label of the nodes with a structure, labels are only made for the nodes that are reported
+        :param number: the number of the structure, see get_number
+        :return: str, see get_label
+        """
+        if number not in self.labels:
+            # latexify calculates the operations, which is not profiled
+            token = ACTIVE_PROFILERS.set(())
+            try:
+                self.labels[number] = shorten_label(get_label(self.get_expression(number)))
+            finally:
+                ACTIVE_PROFILERS.reset(token)
+        return self.labels[number]
+
+    def get_node_statistics(self, expression):
+        """
+        Gets the statistics of the nodes with the same structure as an expression
+        :param expression: Expression of type Base
+        :return: NodeStatistics, None if no such node was calculated
+        """
+        return self.statistics.get(self.numbers.get(self.get_key(expression)))
+
+    def get_key(self, expression):
+        """
+        Gets the key of the structure of an expression without numbering it
+        :param expression: Expression of type Base
+        :return: tuple, None if an operand has a structure that was not numbered
+        """
+        if not isinstance(expression, BaseOperator2):
+            return get_structural_key(expression)
+        x, y = self.numbers.get(self.get_key(expression.x)), self.numbers.get(self.get_key(expression.y))
+        if x is None or y is None:
+            return None
+        return expression.__class__, expression.name, x, y
+
+    def start(self):
+        """
+        Starts profiling in the current context
+        """
+        profilers = ACTIVE_PROFILERS.get()
+        if self not in profilers:
+            install_hook()
+            ACTIVE_PROFILERS.set(profilers + (self,))
+
+    def stop(self):
+        """
+        Stops profiling in the current context, other profilers stay active
+        """
+        profilers = ACTIVE_PROFILERS.get()
+        if self in profilers:
+            ACTIVE_PROFILERS.set(tuple(profiler for profiler in profilers if profiler is not self))
+            remove_hook()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exception_type, exception, traceback):
+        self.stop()
+
+    def get_statistics(self):
+        """
+        Gets the statistics of the nodes
+        :return: list of NodeStatistics
+        """
+        return list(self.statistics.values())
+
+    def report(self, top=20, sort="cumulative"):
+        """
+        Renders a table of the nodes that take the most time
+        :param top: the number of nodes in the table
+        :param sort: "cumulative" to rank by the time including the operands, "self" by the time of the node itself
+        :return: str
+        """
+        if sort not in ("cumulative", "self"):
+            raise ValueError("Unknown sort %r, use 'cumulative' or 'self'" % sort)
+        statistics = sorted(self.get_statistics(), key=lambda node: getattr(node, sort + "_time"), reverse=True)[:top]
+        lines = ["%4s %8s %12s %12s %10s  %s" % ("rank", "calls", "cumulative", "self", "size", "node")]
+        for rank, node in enumerate(statistics):
+            lines.append("%4d %8d %10.3fms %10.3fms %10d  %s" % (rank + 1, node.calls, node.cumulative_time * 1e3,
+                                                                  node.self_time * 1e3, node.size,
+                                                                  self.get_label(node.key)))
+        return "\n".join(lines)
+
+    def folded(self, top=None):
+        """
+        Exports the time spent in every stack of nodes in the folded format of flamegraph.pl and speedscope
+        :param top: the number of stacks that take the most time which are exported, None for all of them
+        :return: list of lines "root;child;...;node microseconds"
+        """
+        stacks = sorted(self.stacks.items(), key=lambda stack: stack[1], reverse=True)[:top]
+        return ["%s %d" % (";".join(self.get_label(number) for number in path), round(elapsed * 1e6))
+                for path, elapsed in stacks]
+
+    def write_folded(self, path):
+        """
+        Writes the folded stacks to a file, see folded
+        :param path: path of the file
+        """
+        with open(path, "w") as file:
+            file.write("\n".join(self.folded()) + "\n")
@@ -0,0 +1,380 @@
+from .base import *
+import json
+import mmap
+import os
+import struct
+import numpy as np
+
+MAGIC = b"SYMB"
+# version 2 added integers that don't fit in 64 bits
+VERSION = 2
+# classes that can be serialized, the position in this list is their code in the files
+CLASSES = [Symbol, Constant, BaseOperator1, BaseOperator2, Add, Subtract, Multiply, Divide, Power, Log]
+CLASS_CODES = {node_class: code for code, node_class in enumerate(CLASSES)}
+CLASS_NAMES = {node_class.__name__: node_class for node_class in CLASSES}
+
+# header: magic, version, whether there is a single expression, number of strings, nodes and roots
+HEADER = struct.Struct("<4sHBIII")
+# node: class code, index of the name in the string table (-1 for no name), two tagged fields of 8 bytes. Leaves keep
+# their value and error in the fields, operators the indices of their operands, which come before the node itself.
+# Integers that don't fit in 64 bits are kept as decimal strings in the string table.
+NODE = struct.Struct("<BiB8sB8s")
+NONE, INT, FLOAT, NODE_INDEX, BIG_INT = range(5)
+INT64_RANGE = range(- 2 ** 63, 2 ** 63)
+LENGTH = struct.Struct("<I")
+INT64 = struct.Struct("<q")
+FLOAT64 = struct.Struct("<d")
+# JSON has no numbers for these floats, they are written as strings
+JSON_FLOATS = {"NaN": float("nan"), "Infinity": float("inf"), "-Infinity": float("-inf")}
+
+
+def get_node_table(expressions):
+    """
+    Turns expressions into a table of nodes in which identical subexpressions are a single node
+    :param expressions: list of expressions of type Base
+    :return: (list of (class, name, field, field) for every node, list with the node of every expression). The fields
+             are the value and error for leaves and the indices of the operands for operators (None if there is none).
+    """
+    nodes, keys, indices = [], dict(), dict()
+
+    def add(expression):
+        if id(expression) in indices:
+            return indices[id(expression)]
+        node_class = type(expression)
+        if node_class not in CLASS_CODES:
+            raise TypeError("%s can't be serialized" % node_class.__name__)
+        if isinstance(expression, BaseOperator2):
+            node = node_class, expression.name, add(expression.x), add(expression.y)
+            key = node
+        elif isinstance(expression, BaseOperator1):
+            node = node_class, expression.name, add(expression.x), None
+            key = node
+        else:
+            node = node_class, expression.name, expression.value, expression.error
+            key = node_class, expression.name, get_value_key(expression.value), get_value_key(expression.error)
+        if key not in keys:
+            keys[key] = len(nodes)
+            nodes.append(node)
+        indices[id(expression)] = keys[key]
+        return keys[key]
+
+    roots = [add(expression) for expression in expressions]
+    return nodes, roots
+
+
+def build_node(node_class, name, a, b, nodes):
+    """
+    Creates the expression of a node
+    :param node_class: the class of the node
+    :param name: the name of the node
+    :param a: the value of a leaf or the index of the first operand
+    :param b: the error of a leaf or the index of the second operand
+    :param nodes: list of the expressions of the nodes that were created before
+    :return: Expression of type Base
+    """
+    if node_class is Symbol:
+        return Symbol(name, a, b)
+    if node_class is Constant:
+        if name is None and b is None:
+            return intern_constant(a)
+        return Constant(a, b, name)
+    if node_class is BaseOperator1:
+        return node_class(nodes[a], name=name)
+    return node_class(nodes[a], nodes[b], name=name)
+
+
+def get_field_type(value):
+    """
+    Gets the type of the value of a field of a node
+    :param value: None, int or float
+    :return: NONE, INT, BIG_INT or FLOAT
+    """
+    if value is None:
+        return NONE
+    if isinstance(value, (int, np.integer)) and not isinstance(value, bool):
+        return INT if int(value) in INT64_RANGE else BIG_INT
+    if isinstance(value, (float, np.floating)):
+        return FLOAT
+    raise TypeError("Values of type %s can't be serialized" % type(value).__name__)
+
+
+def encode_field(value, add_string):
+    """
+    Encodes the value of a field of a node
+    :param value: None, int or float
+    :param add_string: function that adds a string to the string table and returns its index
+    :return: (tag, 8 bytes)
+    """
+    tag = get_field_type(value)
+    if tag == NONE:
+        return NONE, bytes(8)
+    if tag == INT:
+        return INT, INT64.pack(int(value))
+    if tag == BIG_INT:
+        return BIG_INT, INT64.pack(add_string(str(int(value))))
+    return FLOAT, FLOAT64.pack(value)
+
+
+def decode_field(tag, data, strings):
+    """
+    Decodes the value of a field of a node
+    :param tag: the type of the field
+    :param data: the 8 bytes of the field
+    :param strings: the string table
+    :return: the value
+    """
+    if tag == NONE:
+        return None
+    if tag == FLOAT:
+        return FLOAT64.unpack(data)[0]
+    if tag == BIG_INT:
+        return int(strings[INT64.unpack(data)[0]])
+    return INT64.unpack(data)[0]
+
+
+def get_json_field(value):
+    """
+    Converts the value of a field of a node to a type that JSON supports, nan and infinite floats become strings
+    :param value: None, int or float
+    :return: None, int, float or str
+    """
+    tag = get_field_type(value)
+    if tag in (INT, BIG_INT):
+        return int(value)
+    if tag == FLOAT:
+        value = float(value)
+        if value != value:
+            return "NaN"
+        if value in (float("inf"), float("-inf")):
+            return "Infinity" if value > 0 else "-Infinity"
+        return value
+    return None
+
+
+def read_json_field(value):
+    """
+    Converts a field of a node in JSON back to its value, see get_json_field
+    :param value: None, int, float or str
+    :return: None, int or float
+    """
+    if isinstance(value, str):
+        if value not in JSON_FLOATS:
+            raise ValueError("%r is not a number" % value)
+        return JSON_FLOATS[value]
+    return value
+
+
+def dumps(expressions):
+    """
+    Serializes expressions to the binary format
+    :param expressions: Expression of type Base, or a list of expressions
+    :return: bytes
+    """
+    single = isinstance(expressions, Base)
+    nodes, roots = get_node_table([expressions] if single else expressions)
+
+    strings, string_indices = [], dict()
+
+    def add_string(string):
+        if string not in string_indices:
+            string_indices[string] = len(strings)
+            strings.append(string)
+        return string_indices[string]
+
+    records = []
+    for node_class, name, a, b in nodes:
+        if issubclass(node_class, BaseOperator1):
+            fields = [(NODE_INDEX, INT64.pack(a)), (NONE, bytes(8)) if b is None else (NODE_INDEX, INT64.pack(b))]
+        else:
+            fields = [encode_field(a, add_string), encode_field(b, add_string)]
+        records.append(NODE.pack(CLASS_CODES[node_class], -1 if name is None else add_string(name),
+                                 *fields[0], *fields[1]))
+
+    data = [HEADER.pack(MAGIC, VERSION, single, len(strings), len(nodes), len(roots))]
+    for string in strings:
+        encoded = string.encode("utf-8")
+        data.append(LENGTH.pack(len(encoded)) + encoded)
+    data.extend(records)
+    data.extend(LENGTH.pack(root) for root in roots)
+    return b"".join(data)
+
+
+def check_operands(index, a, b):
+    """
+    Checks that the operands of an operator come before it, such that the nodes can't form a cycle
+    :param index: the index of the node of the operator
+    :param a: the index of the first operand
+    :param b: the index of the second operand, None if there is none
+    """
+    for operand in (a, b):
+        if operand is not None and not 0 <= operand < index:
+            raise ValueError("The data is corrupt, node %d refers to node %s" % (index, operand))
+
+
+class ExpressionReader:
+    """
+    Reads expressions from the binary format on demand: only the nodes of the expressions that are asked for are
+    decoded, and every node is decoded only once.
+    """
+
+    def __init__(self, data):
+        """
+        Reads the header and the string table
+        :param data: bytes in the binary format, or a path to a file in the binary format, which is memory-mapped
+        """
+        self.mapped = isinstance(data, (str, os.PathLike))
+        if self.mapped:
+            with open(data, "rb") as file:
+                data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.data = data
+
+        magic, version, single, n_strings, n_nodes, n_roots = HEADER.unpack_from(data, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError("The data is not a serialized expression")
+        if version > VERSION:
+            self.close()
+            raise ValueError("Version %d of the format is not supported, the latest supported version is %d"
+                             % (version, VERSION))
+        self.single = bool(single)
+
+        offset = HEADER.size
+        self.strings = []
+        for _ in range(n_strings):
+            length = LENGTH.unpack_from(data, offset)[0]
+            self.strings.append(bytes(data[offset + LENGTH.size:offset + LENGTH.size + length]).decode("utf-8"))
+            offset += LENGTH.size + length
+        self.nodes_offset = offset
+        self.nodes = [None] * n_nodes
+        offset += n_nodes * NODE.size
+        self.roots = [LENGTH.unpack_from(data, offset + index * LENGTH.size)[0] for index in range(n_roots)]
+
+    def __len__(self):
+        return len(self.roots)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+    def close(self):
+        """
+        Closes the memory-mapped file, expressions that were already created stay valid
+        """
+        if self.mapped:
+            self.data.close()
+
+    def get_node(self, index):
+        """
+        Decodes a node
+        :param index: the index of the node
+        :return: (class, name, field, field)
+        """
+        code, name, tag_a, a, tag_b, b = NODE.unpack_from(self.data, self.nodes_offset + index * NODE.size)
+        return (CLASSES[code], None if name < 0 else self.strings[name], decode_field(tag_a, a, self.strings),
+                decode_field(tag_b, b, self.strings))
+
+    def get_expression(self, index):
+        """
+        Creates the expression of a node and of all nodes it depends on, that were not created yet
+        :param index: the index of the node
+        :return: Expression of type Base
+        """
+        stack = [index]
+        while len(stack) > 0:
+            current = stack[-1]
+            if self.nodes[current] is not None:
+                stack.pop()
+                continue
+            node_class, name, a, b = self.get_node(current)
+            if issubclass(node_class, BaseOperator1):
+                check_operands(current, a, b)
+                missing = [operand for operand in (a, b) if operand is not None and self.nodes[operand] is None]
+                if len(missing) > 0:
+                    stack.extend(missing)
+                    continue
+            self.nodes[current] = build_node(node_class, name, a, b, self.nodes)
+            stack.pop()
+        return self.nodes[index]
+
+    def __getitem__(self, index):
+        return self.get_expression(self.roots[index])
+
+    def load(self):
+        """
+        Creates all expressions
+        :return: the expression, or a list of expressions if a list was serialized
+        """
+        expressions = [self[index] for index in range(len(self))]
+        return expressions[0] if self.single else expressions
+
+
+def loads(data):
+    """
+    Deserializes expressions from the binary format
+    :param data: bytes
+    :return: the expression, or a list of expressions if a list was serialized
+    """
+    return ExpressionReader(data).load()
+
+
+def dump(expressions, path):
+    """
+    Writes expressions to a file in the binary format
+    :param expressions: Expression of type Base, or a list of expressions
+    :param path: path of the file
+    """
+    with open(path, "wb") as file:
+        file.write(dumps(expressions))
+
+
+def load(path):
+    """
+    Reads expressions from a file in the binary format, the file is memory-mapped instead of read as a whole
+    :param path: path of the file
+    :return: the expression, or a list of expressions if a list was serialized
+    """
+    with ExpressionReader(path) as reader:
+        return reader.load()
+
+
+def dumps_json(expressions):
+    """
+    Serializes expressions to JSON, with the same node table as the binary format
+    :param expressions: Expression of type Base, or a list of expressions
+    :return: str
+    """
+    single = isinstance(expressions, Base)
+    nodes, roots = get_node_table([expressions] if single else expressions)
+    table = []
+    for node_class, name, a, b in nodes:
+        if not issubclass(node_class, BaseOperator1):
+            a, b = get_json_field(a), get_json_field(b)
+        table.append([node_class.__name__, name, a, b])
+    return json.dumps({"format": "symbolic", "version": VERSION, "single": single, "roots": roots, "nodes": table},
+                      separators=(",", ":"), allow_nan=False)
+
+
+def loads_json(text):
+    """
+    Deserializes expressions from JSON
+    :param text: str
+    :return: the expression, or a list of expressions if a list was serialized
+    """
+    data = json.loads(text)
+    if data.get("format") != "symbolic":
+        raise ValueError("The data is not a serialized expression")
+    if data["version"] > VERSION:
+        raise ValueError("Version %d of the format is not supported, the latest supported version is %d"
+                         % (data["version"], VERSION))
+    nodes = []
+    for class_name, name, a, b in data["nodes"]:
+        node_class = CLASS_NAMES[class_name]
+        if issubclass(node_class, BaseOperator1):
+            check_operands(len(nodes), a, b)
+        else:
+            a, b = read_json_field(a), read_json_field(b)
+        nodes.append(build_node(node_class, name, a, b, nodes))
+    expressions = [nodes[root] for root in data["roots"]]
+    return expressions[0] if data["single"] else expressions
@@ -0,0 +1,260 @@
+from .streaming import *
+from .parser import Parser
+import asyncio
+import json
+
+# time in seconds during which requests for the same expression are collected in one batch
+BATCH_WINDOW = 0.002
+HOST = "127.0.0.1"
+
+
+def get_request_parameters(parameters):
+    """
+    Checks the parameters of a request and converts them to floats, such that a bad request fails on its own instead
+    of failing the batch it would be calculated in
+    :param parameters: dict mapping the names of symbols to numbers
+    :return: dict mapping the names of symbols to floats
+    """
+    if not isinstance(parameters, dict):
+        raise TypeError("The parameters of a request should be a dict, not %s" % type(parameters).__name__)
+    return {name: float(value) for name, value in parameters.items()}
+
+
+def calculate_requests(tape, records):
+    """
+    Calculates the records of a batch at once, or every record on its own if the batch fails, such that one request
+    can't make the other requests fail
+    :param tape: Tape with a single expression
+    :param records: list of (parameters, error_parameters) of the requests
+    :return: (whether the batch was calculated at once, list of (result, exception) for every record)
+    """
+    try:
+        return True, [(result, None) for result in calculate_batch(tape, records, None)]
+    except Exception:
+        outcomes = []
+        for record in records:
+            try:
+                outcomes.append((next(calculate_batch(tape, [record], None)), None))
+            except Exception as exception:
+                outcomes.append((None, exception))
+        return False, outcomes
+
+
+class BatchEvaluator:
+    """
+    Evaluates registered expressions for concurrent requests. Requests that arrive within a short window are collected
+    per expression and calculated as a single batch of arrays with the tape of the expression, after which every
+    request gets its own value and error.
+    """
+
+    def __init__(self, window=BATCH_WINDOW, max_batch_size=BATCH_SIZE):
+        """
+        Initializes the evaluator
+        :param window: the time in seconds during which requests are collected
+        :param max_batch_size: the maximal number of requests in a batch, a full batch is calculated immediately
+        """
+        self.window = window
+        self.max_batch_size = max_batch_size
+        self.tapes = dict()
+        self.pending = dict()
+        # the timers that flush the pending requests at the end of their window
+        self.timers = dict()
+        self.parser = Parser()
+        self.batches = 0
+
+    def register(self, name, expression):
+        """
+        Registers an expression under a name
+        :param name: the name by which requests refer to the expression
+        :param expression: Expression of type Base, or a formula in plain text, see parse
+        """
+        if isinstance(expression, str):
+            expression = self.parser.parse(expression)
+        self.tapes[name] = Tape(expression)
+
+    async def evaluate(self, name, parameters, error_parameters=None):
+        """
+        Calculates the value and error of a registered expression, together with the other requests in the same window
+        :param name: the name of the expression
+        :param parameters: dict mapping the names of symbols to numbers
+        :param error_parameters: dict mapping the names of symbols to their errors, which replace their own errors
+        :return: (value, error), the error is None if no symbol has an error
+        """
+        if name not in self.tapes:
+            raise KeyError("No expression is registered under %r" % name)
+        parameters = get_request_parameters(parameters)
+        error_parameters = get_request_parameters(error_parameters or dict())
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        if name not in self.pending:
+            self.pending[name] = []
+            self.timers[name] = loop.call_later(self.window, self.flush, name)
+        self.pending[name].append((parameters, error_parameters, future))
+        if len(self.pending[name]) >= self.max_batch_size:
+            self.flush(name)
+        return await future
+
+    def flush(self, name):
+        """
+        Calculates the requests that are pending for an expression, in the executor of the event loop such that the
+        loop keeps accepting requests in the meantime
+        :param name: the name of the expression
+        """
+        requests = self.pending.pop(name, None)
+        timer = self.timers.pop(name, None)
+        if timer is not None:
+            # a full batch is flushed before its window ends, the timer would flush the next batch too early
+            timer.cancel()
+        if requests is None:
+            return
+        # the records of a batch need the same names
+        groups = dict()
+        for request in requests:
+            groups.setdefault((tuple(sorted(request[0])), tuple(sorted(request[1]))), []).append(request)
+        loop = asyncio.get_running_loop()
+        for group in groups.values():
+            futures = [future for _, _, future in group]
+            records = [(parameters, errors) for parameters, errors, _ in group]
+            calculation = loop.run_in_executor(None, calculate_requests, self.tapes[name], records)
+            calculation.add_done_callback(lambda calculation, futures=futures: self.resolve(futures, calculation))
+
+    def resolve(self, futures, calculation):
+        """
+        Gives the requests of a batch their results
+        :param futures: list with the future of every request in the batch
+        :param calculation: the future of calculate_requests for the batch
+        """
+        if calculation.cancelled():
+            outcomes = [(None, asyncio.CancelledError())] * len(futures)
+        elif calculation.exception() is not None:
+            outcomes = [(None, calculation.exception())] * len(futures)
+        else:
+            batched, outcomes = calculation.result()
+            if batched:
+                self.batches += 1
+        for future, (result, exception) in zip(futures, outcomes):
+            if future.done():
+                continue
+            if exception is None:
+                future.set_result(result)
+            else:
+                future.set_exception(exception)
+
+
+async def handle_connection(evaluator, reader, writer):
+    """
+    Answers the requests of a connection. Every line is a JSON request {"id", "expression", "parameters", "errors"}
+    and is answered, in the order in which it is calculated, by a line {"id", "value", "error"}, or {"id", "exception"}
+    if it failed. Lines that are not valid JSON are answered with {"id": null, "exception"}.
+    :param evaluator: BatchEvaluator
+    :param reader: asyncio.StreamReader
+    :param writer: asyncio.StreamWriter
+    """
+    async def respond(response):
+        writer.write(json.dumps(response).encode("utf-8") + b"\n")
+        # waits while the client doesn't read, such that the answers don't pile up in memory
+        await writer.drain()
+
+    async def answer(request):
+        try:
+            value, error = await evaluator.evaluate(request["expression"], request["parameters"], request.get("errors"))
+            response = {"id": request.get("id"), "value": value, "error": error}
+        except Exception as exception:
+            response = {"id": request.get("id"), "exception": "%s: %s" % (type(exception).__name__, exception)}
+        await respond(response)
+
+    tasks = set()
+    try:
+        async for line in reader:
+            if line.strip():
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError("A request has to be a JSON object")
+                except ValueError as exception:
+                    await respond({"id": None, "exception": "%s: %s" % (type(exception).__name__, exception)})
+                    continue
+                task = asyncio.ensure_future(answer(request))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        if len(tasks) > 0:
+            await asyncio.wait(tasks)
+        await writer.drain()
+    finally:
+        writer.close()
+
+
+async def start_server(evaluator, host=HOST, port=0):
+    """
+    Starts a server that answers evaluation requests with the evaluator, for local use
+    :param evaluator: BatchEvaluator
+    :param host: the host to listen on, localhost by default
+    :param port: the port to listen on, 0 for any free port
+    :return: asyncio.Server, its port is server.sockets[0].getsockname()[1]
+    """
+    return await asyncio.start_server(lambda reader, writer: handle_connection(evaluator, reader, writer), host, port)
+
+
+class EvaluationClient:
+    """
+    Client of the evaluation server. Requests can be sent concurrently over the same connection.
+    """
+
+    def __init__(self):
+        self.reader = None
+        self.writer = None
+        self.futures = dict()
+        self.next_id = 0
+        self.listener = None
+
+    async def connect(self, port, host=HOST):
+        """
+        Connects to a server
+        :param port: the port of the server
+        :param host: the host of the server
+        """
+        self.reader, self.writer = await asyncio.open_connection(host, port)
+        self.listener = asyncio.ensure_future(self.listen())
+
+    async def listen(self):
+        """
+        Resolves the requests with the responses of the server
+        """
+        async for line in self.reader:
+            response = json.loads(line)
+            future = self.futures.pop(response["id"], None)
+            if future is None or future.done():
+                continue
+            if "exception" in response:
+                future.set_exception(RuntimeError(response["exception"]))
+            else:
+                future.set_result((response["value"], response["error"]))
+        for future in self.futures.values():
+            if not future.done():
+                future.set_exception(ConnectionError("The connection to the server was closed"))
+        self.futures.clear()
+
+    async def evaluate(self, name, parameters, error_parameters=None):
+        """
+        Calculates the value and error of an expression that is registered on the server
+        :param name: the name of the expression
+        :param parameters: dict mapping the names of symbols to numbers
+        :param error_parameters: dict mapping the names of symbols to their errors
+        :return: (value, error)
+        """
+        request_id = self.next_id
+        self.next_id += 1
+        future = asyncio.get_running_loop().create_future()
+        self.futures[request_id] = future
+        request = {"id": request_id, "expression": name, "parameters": parameters, "errors": error_parameters}
+        self.writer.write(json.dumps(request).encode("utf-8") + b"\n")
+        await self.writer.drain()
+        return await future
+
+    async def close(self):
+        """
+        Closes the connection, after the server answered all requests
+        """
+        self.writer.write_eof()
+        await self.listener
+        self.writer.close()
@@ -1,5 +1,7 @@
 from .base import *
-from copy import deepcopy
+from .polynomial import polynomial_simplification
+from .cost import minimize_evaluation_cost
+from copy import copy, deepcopy
 
 
 def equality(expression1, expression2, not_use_algorithms=None):
@@ -24,31 +26,142 @@ def equality(expression1, expression2, not_use_algorithms=None):
     return simplified.calculate() == 0
 
 
-def simplify(expression, not_use_algorithms=None):
+def simplify(expression, not_use_algorithms=None, objective="readable"):
     """
-    Simplifies the given expression by using all algorithms below
+    Simplifies the given expression by using all algorithms below. Every subexpression is simplified only once, see
+    simplify_worklist, and factorize is applied to the expression as a whole.
     :param expression: Base,expression
     :param not_use_algorithms: Algorithms you shouldn't use for simplification
+    :param objective: "readable" for the shortest form, "eval_cost" for the form that is the cheapest to calculate
+                      according to evaluation_cost
     :return: simplified expression
     """
+    if objective not in OBJECTIVES:
+        raise ValueError("Unknown objective %r, the objective is one of %s" % (objective, ", ".join(OBJECTIVES)))
     expression = deepcopy(expression)
-    algorithms = [remove_redundant_operations, add_subtract_simplification, multiply_divide_simplification,
-                  separate_division_multiplication_constant, factorize]
+    if objective == "eval_cost":
+        return minimize_evaluation_cost(expression, simplify(expression, not_use_algorithms))
+    algorithms = [polynomial_simplification, remove_redundant_operations, add_subtract_simplification,
+                  multiply_divide_simplification, separate_division_multiplication_constant, factorize]
 
     if not_use_algorithms is not None:
         for algorithm in not_use_algorithms:
             if algorithm in algorithms:
                 algorithms.remove(algorithm)
 
+    node_algorithms = [algorithm for algorithm in algorithms if algorithm not in ROOT_ALGORITHMS]
+    root_algorithms = [algorithm for algorithm in algorithms if algorithm in ROOT_ALGORITHMS]
+    simplified = dict()
+    seen_keys = set()
     while True:
-        old_express_string = expression.latexify(use_value=False)
-        for algorithm in algorithms:
+        expression = simplify_worklist(expression, node_algorithms, simplified)
+        seen_keys.add(get_structural_key(expression))
+        for algorithm in root_algorithms:
             expression = algorithm(expression)
-        if old_express_string == expression.latexify(use_value=False):
+        # the root algorithms and the worklist can undo each other, so every form seen so far ends the loop
+        key = get_structural_key(expression)
+        if key in seen_keys:
             break
+        seen_keys.add(key)
 
+    if polynomial_simplification in algorithms:
+        # the other algorithms multiply the numbers back into the sums, the result keeps the content factored out
+        expression = polynomial_simplification(expression)
     return expression
 
+
+def simplify_operand(expression, operand, algorithms, simplified):
+    """
+    Simplifies an operand of an operation. Operands that continue a chain of additions and subtractions or a chain of
+    multiplications and divisions are not simplified on their own, since the algorithms already process the chain as a
+    whole from its top. Only their operands are simplified.
+    :param expression: Base, the operation
+    :param operand: Base, the operand of the operation
+    :param algorithms: list of simplification algorithms
+    :param simplified: dict mapping the structural key of every expression simplified so far to its simplified form
+    :return: simplified operand
+    """
+    for chain in [(Add, Subtract), (Multiply, Divide)]:
+        if isinstance(expression, chain) and isinstance(operand, chain):
+            return simplify_children(operand, algorithms, simplified)
+    return simplify_worklist(operand, algorithms, simplified)
+
+
+def simplify_children(expression, algorithms, simplified):
+    """
+    Simplifies the operands of an operation, the operation itself is only copied if one of its operands changed
+    :param expression: Base, expression
+    :param algorithms: list of simplification algorithms
+    :param simplified: dict mapping the structural key of every expression simplified so far to its simplified form
+    :return: expression with simplified operands
+    """
+    if not isinstance(expression, BaseOperator1):
+        return expression
+    new_x = simplify_operand(expression, expression.x, algorithms, simplified)
+    new_y = None
+    if isinstance(expression, BaseOperator2):
+        new_y = simplify_operand(expression, expression.y, algorithms, simplified)
+        if new_x is expression.x and new_y is expression.y:
+            return expression
+    elif new_x is expression.x:
+        return expression
+
+    expression = copy(expression)
+    expression.x = new_x
+    if new_y is not None:
+        expression.y = new_y
+    return expression
+
+
+def simplify_worklist(expression, algorithms, simplified):
+    """
+    Simplifies the given expression bottom-up: the operands are simplified first, after which the algorithms are
+    applied to the expression itself. The algorithms are only applied again if one of them changed the expression, in
+    which case only the new parts of the expression are processed, since subexpressions that were already simplified
+    are looked up in simplified. An expression is simplified when none of the algorithms changes its structural key.
+    :param expression: Base, expression
+    :param algorithms: list of simplification algorithms
+    :param simplified: dict mapping the structural key of every expression simplified so far to its simplified form
+    :return: simplified expression
+    """
+    if not isinstance(expression, BaseOperator1):
+        return expression
+    key = get_structural_key(expression)
+    if key in simplified:
+        return simplified[key]
+    # while in progress, occurrences of the expression within itself are left as they are
+    simplified[key] = expression
+    seen_keys = [key]
+
+    current = simplify_children(expression, algorithms, simplified)
+    current_key = get_structural_key(current)
+    while current_key in seen_keys or current_key not in simplified:
+        changed = False
+        for algorithm in algorithms:
+            if algorithm in LOCAL_ALGORITHMS:
+                # the operands are already simplified
+                new_expression = algorithm(current, recursive=False)
+            else:
+                new_expression = algorithm(current)
+            new_key = get_structural_key(new_expression)
+            if new_key != current_key:
+                current, current_key = new_expression, new_key
+                changed = True
+
+        if not changed or current_key in seen_keys:
+            # either a fixed point or the algorithms are cycling between equivalent forms
+            break
+        seen_keys.append(current_key)
+        simplified[current_key] = current
+        current = simplify_children(current, algorithms, simplified)
+        current_key = get_structural_key(current)
+    else:
+        current = simplified[current_key]
+
+    for seen_key in seen_keys + [current_key]:
+        simplified[seen_key] = current
+    return current
+
 def get_terms_add_subtract_operation(expression):
     """
     Gets terms within an add an subtract operation in list
@@ -112,6 +225,8 @@ def commutative_equality_check_part(factors1, factors2):
     :param factors2: list of factors or terms
     :return: Boolean indicating whether or not they are equal
     """
+    if len(factors1) != len(factors2):
+        return False
     for factor in factors1:
         index = None
         for i, factor2 in enumerate(factors2):
@@ -167,90 +282,89 @@ def commutative_equality_check(expression1, expression2):
     return False
 
 
-def remove_redundant_operations_recursive(expression):
+def remove_redundant_operation(expression):
     """
-    removes operations of the type a + 0, 1 * a, a / 1, ... in recursive manner
+    removes an operation of the type a + 0, 1 * a, a / 1, ... at the top of the expression, the operands should
+    already be simplified
     :param expression: Expression of type Base
     :return: Simplified expression
     """
-    expression = deepcopy(expression)
-    if expression.calculate() is not None:
+    if isinstance(expression, BaseOperator2):
+        calculable = expression.x.value is not None and expression.y.value is not None
+    elif isinstance(expression, BaseOperator1):
+        calculable = expression.x.value is not None
+    else:
+        calculable = expression.calculate() is not None
+    if calculable:
         return Constant(expression.calculate())
+
     if isinstance(expression, Add):
         if expression.x.value is not None and expression.x.value == 0:
-            return remove_redundant_operations_recursive(expression.y)
+            return expression.y
         elif expression.y.value is not None and expression.y.value == 0:
-            return remove_redundant_operations_recursive(expression.x)
-        else:
-            expression.x = remove_redundant_operations_recursive(expression.x)
-            expression.y = remove_redundant_operations_recursive(expression.y)
-            return expression
+            return expression.x
     elif isinstance(expression, Subtract):
         if expression.x.value is not None and expression.x.value == 0:
-            return remove_redundant_operations_recursive(- expression.y)
+            return remove_redundant_operation(- expression.y)
         elif expression.y.value is not None and expression.y.value == 0:
-            return remove_redundant_operations_recursive(expression.x)
-        else:
-            expression.x = remove_redundant_operations_recursive(expression.x)
-            expression.y = remove_redundant_operations_recursive(expression.y)
-            return expression
+            return expression.x
     elif isinstance(expression, Multiply):
         if expression.x.value is not None and expression.x.value == 1:
-            return remove_redundant_operations_recursive(expression.y)
+            return expression.y
         elif expression.x.value is not None and expression.x.value == 0:
             return Constant(0)
         elif expression.y.value is not None and expression.y.value == 1:
-            return remove_redundant_operations_recursive(expression.x)
+            return expression.x
         elif expression.y.value is not None and expression.y.value == 0:
             return Constant(0)
-        else:
-            expression.x = remove_redundant_operations_recursive(expression.x)
-            expression.y = remove_redundant_operations_recursive(expression.y)
-            return expression
     elif isinstance(expression, Divide):
         if expression.y.value is not None and expression.y.value == 1:
-            return remove_redundant_operations_recursive(expression.x)
+            return expression.x
         elif expression.x.value is not None and expression.x.value == 0:
             return Constant(0)
-        else:
-            expression.x = remove_redundant_operations_recursive(expression.x)
-            expression.y = remove_redundant_operations_recursive(expression.y)
-            return expression
     elif isinstance(expression, Power):
         if expression.y.value is not None and expression.y.value == 1:
-            return remove_redundant_operations_recursive(expression.x)
+            return expression.x
         if expression.y.value is not None and expression.y.value == 0:
             return Constant(1)
         elif expression.x.value is not None and expression.x.value == 0:
             return Constant(0)
         elif expression.x.value is not None and expression.x.value == 1:
             return Constant(1)
-        else:
-            expression.x = remove_redundant_operations_recursive(expression.x)
-            expression.y = remove_redundant_operations_recursive(expression.y)
-            return expression
-    elif isinstance(expression, (Symbol, Constant)):
-        return expression
-    else:
-        expression.x = remove_redundant_operations_recursive(expression.x)
-        expression.y = remove_redundant_operations_recursive(expression.y)
-        return expression
+    return expression
 
 
-def remove_redundant_operations(expression):
+def remove_redundant_operations_recursive(expression):
     """
-    removes operations of the type a + 0, 1 * a, a / 1, ...
+    removes operations of the type a + 0, 1 * a, a / 1, ... in recursive manner, the operands are simplified before
+    the operation itself
     :param expression: Expression of type Base
     :return: Simplified expression
     """
-    new_expression = deepcopy(expression)
-    while True:
-        old_express_string = new_expression.latexify(use_value=False)
-        new_expression = remove_redundant_operations_recursive(new_expression)
-        if new_expression.latexify(use_value=False) == old_express_string:
-            break
+    if isinstance(expression, BaseOperator1):
+        new_x = remove_redundant_operations_recursive(expression.x)
+        new_y = None
+        if isinstance(expression, BaseOperator2):
+            new_y = remove_redundant_operations_recursive(expression.y)
+        if new_x is not expression.x or (new_y is not None and new_y is not expression.y):
+            # only the operation itself is copied, the input expression is never changed
+            expression = copy(expression)
+            expression.x = new_x
+            if new_y is not None:
+                expression.y = new_y
+    return remove_redundant_operation(expression)
+
 
-    return new_expression
+def remove_redundant_operations(expression, recursive=True):
+    """
+    removes operations of the type a + 0, 1 * a, a / 1, ...
+    :param expression: Expression of type Base
+    :param recursive: if False, only the operation at the top of the expression is removed
+    :return: Simplified expression
+    """
+    if not recursive:
+        return remove_redundant_operation(expression)
+    return remove_redundant_operations_recursive(expression)
 
 
 def get_terms(expression):
@@ -260,7 +374,6 @@ def get_terms(expression):
     :return: simplified expression
     example: a dictionary grouping all the different elements with their factors
     """
-    expression = deepcopy(expression)
     if isinstance(expression, Add):
         extra_symbols = get_terms(expression.x)
         extra_symbols_y = get_terms(expression.y)
@@ -315,10 +428,11 @@ def get_terms(expression):
     return {expression: 1}
 
 
-def add_subtract_simplification(expression):
+def add_subtract_simplification(expression, recursive=True):
     """
     Groups two things if they add to the same symbol/expression
     :param expression: Expression of type base
+    :param recursive: if False, the operands of the resulting expression are not simplified
     :return: simplified expression
     example: 1 + 2 * x + 3 * x - z + y * 3 + x / 2 - x + y + x ** 2 + x ** 2 + z + 3 -> 4 + 4.5 * x + 4 * y + 2 * x^{2}
     """
@@ -338,7 +452,7 @@ def add_subtract_simplification(expression):
 
     output_expression = remove_redundant_operations(output_expression)
 
-    if isinstance(output_expression, BaseOperator1):
+    if recursive and isinstance(output_expression, BaseOperator1):
         output_expression.x = add_subtract_simplification(output_expression.x)
         if isinstance(output_expression, BaseOperator2):
             output_expression.y = add_subtract_simplification(output_expression.y)
@@ -353,7 +467,6 @@ def get_factors(expression):
     :return: a simplified expression
     Example: x ** 2 * 2 * x * y * z / (x ** 2 * z) -> {x: 1, z: 0, y: 1}
     """
-    expression = deepcopy(expression)
     if isinstance(expression, Multiply):
         extra_symbols = get_factors(expression.x)
         extra_symbols_y = get_factors(expression.y)
@@ -392,10 +505,11 @@ def get_factors(expression):
     return {expression: 1}
 
 
-def multiply_divide_simplification(expression):
+def multiply_divide_simplification(expression, recursive=True):
     """
     Simplifies the given expression by using some arithmetic with multiplication, division and powers
     :param expression: Base, expression
+    :param recursive: if False, the operands of the resulting expression are not simplified
     :return: a simplified expression
     Example: x * x ** 2 * (x + y) ** (z + 3) * (.x * y ** 2) ** 2 -> x ** 5 * (x + y) ** (z + 3) * y ** 4
     Example 2: 2 ** (x + 3) * 2 ** (3 + y) + x * x ** 2 -> 2 ** (x + 3 + 3 + y) + x ** 3
@@ -410,7 +524,7 @@ def multiply_divide_simplification(expression):
             output_expression = output_expression * element ** elements[element]
 
     output_expression = remove_redundant_operations(output_expression)
-    if isinstance(output_expression, BaseOperator1):
+    if recursive and isinstance(output_expression, BaseOperator1):
         output_expression.x = multiply_divide_simplification(output_expression.x)
         if isinstance(output_expression, BaseOperator2):
             output_expression.y = multiply_divide_simplification(output_expression.y)
@@ -418,10 +532,11 @@ def multiply_divide_simplification(expression):
     return output_expression
 
 
-def separate_division_multiplication_constant(expression):
+def separate_division_multiplication_constant(expression, recursive=True):
     """
     If a sum is divided by one constant, seperate it. If a sum is multiplied by a constant, seperate it
     :param expression: Base, expression
+    :param recursive: if False, the operands of the resulting expression are not simplified
     :return: simplified expression
     """
     expression = deepcopy(expression)
@@ -440,7 +555,7 @@ def separate_division_multiplication_constant(expression):
         elif isinstance(expression.y, Constant) and isinstance(expression.x, Subtract):
             expression = expression.x.x / expression.y - expression.x.y / expression.y
 
-    if isinstance(expression, BaseOperator1):
+    if recursive and isinstance(expression, BaseOperator1):
         expression.x = separate_division_multiplication_constant(expression.x)
         if isinstance(expression, BaseOperator2):
             expression.y = separate_division_multiplication_constant(expression.y)
@@ -454,7 +569,6 @@ def get_factors_addition(expression):
     :param expression: expression
     :return: lsit of dictionary, each dictionary containing all factors in a given
     """
-    expression = deepcopy(expression)
     if isinstance(expression, Add):
         factors_x = get_factors_addition(expression.x)
         factors_y = get_factors_addition(expression.y)
@@ -545,12 +659,13 @@ def get_highest_power_common_factors(factors):
                     new_factor += common_factors[common_factor][power]
             else:
                 if power is not None:
-                    new_factor = common_factors[common_factor][power]
+                    new_factor = power * common_factors[common_factor][power]
                 else:
                     new_factor = common_factors[common_factor][power]
         common_factors[common_factor] = new_factor
 
-    return common_factors
+    # a factor without a power that is common to all terms can't be factored out
+    return {common_factor: power for common_factor, power in common_factors.items() if power is not None}
 
 
 def factorize(expression):
@@ -571,6 +686,9 @@ def factorize(expression):
                 dictionary[element] = get_terms(dictionary[element])
 
     common_factors = get_highest_power_common_factors(common_factors)
+    if len(common_factors) == 0:
+        # dividing the terms by 1 would only turn their numbers into floats
+        return remove_redundant_operations(expression)
 
     output_expression = 1
     for common_factor in common_factors:
@@ -584,11 +702,22 @@ def factorize(expression):
             if term is not None:
                 output_expression_second_part = multiply_divide_simplification(terms[term] * term / output_expression)
             else:
-                output_expression_second_part = multiply_divide_simplification(terms[term] / output_expression)
+                output_expression_second_part = multiply_divide_simplification(Constant(terms[term]) /
+                                                                               output_expression)
         else:
             if term is not None:
                 output_expression_second_part += multiply_divide_simplification(terms[term] * term / output_expression)
             else:
-                output_expression_second_part += multiply_divide_simplification(terms[term] / output_expression)
+                output_expression_second_part += multiply_divide_simplification(Constant(terms[term]) /
+                                                                                output_expression)
 
     return remove_redundant_operations(output_expression * output_expression_second_part)
+
+
+# algorithms that can be applied to the top of an expression only, leaving its operands as they are
+LOCAL_ALGORITHMS = [remove_redundant_operations, add_subtract_simplification, multiply_divide_simplification,
+                    separate_division_multiplication_constant]
+# algorithms that are only applied to the expression as a whole
+ROOT_ALGORITHMS = [factorize]
+# objectives of simplify
+OBJECTIVES = ["readable", "eval_cost"]
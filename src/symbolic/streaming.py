@@ -0,0 +1,142 @@
+from .tape import *
+import os
+import numpy as np
+
+# number of records that are calculated at once by propagate_stream
+BATCH_SIZE = 1024
+
+
+def open_column(column):
+    """
+    Opens a column without loading it in memory
+    :param column: path to a .npy file, array or number
+    :return: memory-mapped array for a path, otherwise the column as it is
+    """
+    if isinstance(column, (str, os.PathLike)):
+        return np.load(column, mmap_mode="r")
+    return column
+
+
+def open_output(output, shape):
+    """
+    Opens the array in which results are written
+    :param output: path to a .npy file that is created, or an array
+    :param shape: the shape of the results
+    :return: memory-mapped array for a path, otherwise output
+    """
+    if isinstance(output, (str, os.PathLike)):
+        return np.lib.format.open_memmap(output, mode="w+", dtype=np.float64, shape=shape)
+    return output
+
+
+def calculate_files(expression, columns, output, error_columns=None, error_output=None, chunk_size=CHUNK_SIZE):
+    """
+    Calculates an expression over columns that are stored on disk, in chunks, such that the columns are never
+    loaded in memory as a whole. The results are written to memory-mapped files.
+    :param expression: Expression of type Base, or a Tape made from one
+    :param columns: dict mapping the names of symbols to paths of .npy files, (memory-mapped) arrays or numbers.
+                    Symbols that are not in here keep their own value.
+    :param output: path of the .npy file for the values, or a float array with the shape of the results
+    :param error_columns: dict mapping the names of symbols to their errors, in the same form as the columns. Symbols
+                          that are not in here keep their own error.
+    :param error_output: path of the .npy file for the errors, or a float array. If None, errors are not calculated.
+    :param chunk_size: the number of elements calculated at once
+    :return: the output array, or (output array, error output array) if error_output is given
+    """
+    parameters = {name: open_column(column) for name, column in columns.items()}
+    if error_output is None:
+        tape = expression if isinstance(expression, Tape) else Tape(expression)
+        outputs = [output]
+    else:
+        # the errors are calculated in the same chunks as the values, as a second output of the tape
+        if isinstance(expression, Tape):
+            expression = expression.to_expression()
+        error_columns = error_columns or dict()
+        check_errors({symbol.name: error_columns.get(symbol.name, symbol.error)
+                      for symbol in expression.get_dependent_symbols() or []})
+        error_expression, error_names = get_error_expression(expression)
+        for name, column in error_columns.items():
+            if name in error_names:
+                parameters[error_names[name]] = open_column(column)
+        tape = Tape(expression if error_expression is None else [expression, error_expression])
+        outputs = [output, error_output]
+
+    for name, default in zip(tape.names, tape.defaults):
+        if name not in parameters and default is None:
+            raise ValueError("There is no column and no value for %s" % name)
+    # symbols that keep their own value can be arrays as well
+    shape = np.broadcast_shapes(*[np.shape(parameters[name]) if name in parameters else np.shape(default)
+                                  for name, default in zip(tape.names, tape.defaults)])
+    outputs = [open_output(array, shape) for array in outputs]
+
+    if tape.single_output:
+        tape.calculate_blocked(parameters, outputs[0], chunk_size)
+        if len(outputs) > 1:
+            # the expression doesn't depend on any symbol, so it has no error
+            outputs[1][...] = np.nan
+    else:
+        tape.calculate_blocked(parameters, outputs, chunk_size)
+    for array in outputs:
+        if isinstance(array, np.memmap):
+            array.flush()
+    return outputs[0] if error_output is None else tuple(outputs)
+
+
+def get_batch_parameters(batch):
+    """
+    Stacks the parameters of a batch of records
+    :param batch: list of dicts mapping the names of symbols to their values
+    :return: dict mapping the names of symbols to arrays with their values in every record
+    """
+    if len(batch) == 0 or len(batch[0]) == 0:
+        return dict()
+    return {name: np.array([parameters[name] for parameters in batch], dtype=np.float64) for name in batch[0]}
+
+
+def calculate_batch(tape, batch, error_parameters):
+    """
+    Calculates the values and errors of a batch of records
+    :param tape: Tape with a single expression
+    :param batch: list of records, see propagate_stream
+    :param error_parameters: dict with the errors of the symbols that are the same for all records
+    :return: generator of (value, error) for every record
+    """
+    parameters = get_batch_parameters([record[0] if isinstance(record, tuple) else record for record in batch])
+    record_errors = get_batch_parameters([record[1] for record in batch]) if isinstance(batch[0], tuple) else dict()
+    errors = dict() if error_parameters is None else dict(error_parameters)
+    errors.update(record_errors)
+
+    if len(errors) == 0 and all(error is None for error in tape.errors):
+        # without any errors, only the values are calculated
+        values, errors = tape.calculate(parameters), None
+    else:
+        values, errors = tape.calculate_all(parameters, errors)
+    if values is None:
+        raise ValueError("A symbol has no value in the records")
+    values = np.broadcast_to(values, (len(batch),))
+    if errors is None:
+        return ((value, None) for value in values.tolist())
+    return zip(values.tolist(), np.broadcast_to(errors, (len(batch),)).tolist())
+
+
+def propagate_stream(expression, records, batch_size=BATCH_SIZE, error_parameters=None):
+    """
+    Calculates the value and error of an expression for a stream of records. The records are collected in batches,
+    which are calculated at once with a tape, such that the expression is differentiated only once and memory stays
+    bounded by the batch size.
+    :param expression: Expression of type Base, or a Tape made from one
+    :param records: iterable of dicts mapping the names of symbols to numbers, or of (parameters, error_parameters)
+                    tuples of such dicts. All records in a batch need the same names.
+    :param batch_size: the maximal number of records in a batch
+    :param error_parameters: dict with the errors of the symbols that are the same for all records
+    :return: generator of (value, error) for every record, in the same order as the records
+    """
+    tape = expression if isinstance(expression, Tape) else Tape(expression)
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) == batch_size:
+            yield from calculate_batch(tape, batch, error_parameters)
+            batch = []
+    if len(batch) > 0:
+        yield from calculate_batch(tape, batch, error_parameters)
@@ -0,0 +1,713 @@
+from .base import *
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+# operation codes of the instructions on a tape
+SYMBOL, CONSTANT, ADD, SUBTRACT, MULTIPLY, DIVIDE, POWER, LOG = range(8)
+OPERATION_CODES = {Add: ADD, Subtract: SUBTRACT, Multiply: MULTIPLY, Divide: DIVIDE, Power: POWER, Log: LOG}
+OPERATION_CLASSES = {code: operation_class for operation_class, code in OPERATION_CODES.items()}
+
+
+def log_operation(x, y):
+    """
+    Vectorized version of Log.apply
+    :param x: value or numpy array
+    :param y: value or numpy array, the base of the logarithm
+    :return: log_y(x)
+    """
+    return np.log(x) / np.log(y)
+
+
+OPERATION_FUNCTIONS = {ADD: np.add, SUBTRACT: np.subtract, MULTIPLY: np.multiply, DIVIDE: np.divide,
+                       POWER: np.power, LOG: log_operation}
+# number of elements that are calculated at once in blocked evaluation, such that the buffers stay in the cache
+CHUNK_SIZE = 2 ** 15
+# name of the symbol of the error of a symbol in error expressions, see get_error_expression
+ERROR_NAME = "\\sigma_{%s}"
+
+
+def get_rows(value, shape, start, stop):
+    """
+    Gets the rows of a value that belong to a slice of the results
+    :param value: array or number
+    :param shape: the shape of the results
+    :param start: first row of the slice
+    :param stop: end of the slice
+    :return: the rows of the value if it has them, otherwise the value itself, which broadcasts
+    """
+    if isinstance(value, np.ndarray) and len(shape) > 0 and value.ndim == len(shape) and value.shape[0] == shape[0] > 1:
+        return value[start:stop]
+    return value
+
+
+def split_rows(total_rows, workers):
+    """
+    Splits rows in contiguous slices of about the same size
+    :param total_rows: the number of rows
+    :param workers: the number of slices
+    :return: list of (start, stop)
+    """
+    bounds = np.linspace(0, total_rows, min(workers, total_rows) + 1).astype(int).tolist()
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def get_error_expression(expression):
+    """
+    Builds the expression of the linear error of an expression, in which the errors of the symbols are symbols as well,
+    such that the error can be calculated in chunks like any other expression
+    :param expression: Expression of type Base
+    :return: (the error expression, None if the expression doesn't depend on any symbol, dict mapping the names of
+             the symbols to the names of the symbols of their errors)
+    """
+    symbols = sorted(expression.get_dependent_symbols() or [], key=lambda symbol: symbol.name)
+    error_names = {symbol.name: ERROR_NAME % symbol.name for symbol in symbols}
+    squared_error = None
+    # constants are folded, such that terms like 0 * log(x) don't turn negative values into nan
+    with constant_folding():
+        for symbol in symbols:
+            term = expression.derivative(symbol) ** 2 * Symbol(error_names[symbol.name], symbol.error) ** 2
+            squared_error = term if squared_error is None else squared_error + term
+    return (None if squared_error is None else squared_error ** 0.5), error_names
+
+
+def run_in_threads(function, arguments, workers):
+    """
+    Calls a function for every set of arguments in a thread pool, numpy releases the GIL in its calculations
+    :param function: the function to call
+    :param arguments: list of tuples of arguments
+    :param workers: the number of threads
+    :return: list of the results of the calls
+    """
+    with ThreadPoolExecutor(workers) as executor:
+        futures = [executor.submit(function, *argument) for argument in arguments]
+        return [future.result() for future in futures]
+
+
+class Tape:
+    """
+    Linearized form of one or more expressions: a list of instructions in topological order, stored in numpy arrays.
+    Every instruction either loads a named parameter, loads a constant or applies an operation on the results of two
+    earlier instructions. Identical subexpressions become a single instruction. Tapes calculate in double precision
+    with numpy, and the values, derivatives and errors they calculate are the same as those of the expressions.
+    The calculate methods of expressions don't use a tape, since they keep the types of the values (ints, fractions,
+    ...) and lowering an expression costs more than a single calculation. A tape pays off when the same expressions
+    are calculated many times or over large arrays, which is also why only tapes calculate with several threads, see
+    the workers option of calculate. Parameters can't override named operations on a tape.
+    """
+
+    def __init__(self, expressions):
+        """
+        Lowers the given expressions to a tape
+        :param expressions: Expression of type Base, or a list of expressions
+        """
+        self.single_output = isinstance(expressions, Base)
+        if self.single_output:
+            expressions = [expressions]
+
+        codes, operands = [], []
+        constants, integers = [], []
+        names, defaults, errors, is_symbol = [], [], [], []
+        operation_names = set()
+        keys, indices = dict(), dict()
+
+        def add(expression):
+            if id(expression) in indices:
+                return indices[id(expression)]
+            code = OPERATION_CODES.get(type(expression))
+            if code is not None:
+                key = code, add(expression.x), add(expression.y)
+                if expression.name is not None:
+                    operation_names.add(expression.name)
+            elif isinstance(expression, Symbol) or (isinstance(expression, Constant) and expression.name is not None):
+                key = SYMBOL, expression.name
+            elif isinstance(expression, Constant):
+                if not is_numerical(expression.value):
+                    raise TypeError("Only constants with a numerical value can be put on a tape, not %r"
+                                    % (expression.value,))
+                key = CONSTANT, get_value_key(expression.value)
+            else:
+                raise TypeError("%s can't be put on a tape" % type(expression).__name__)
+
+            if key not in keys:
+                keys[key] = len(codes)
+                codes.append(key[0])
+                if key[0] == SYMBOL:
+                    operands.append((len(names), -1))
+                    names.append(expression.name)
+                    defaults.append(expression.value)
+                    errors.append(expression.error)
+                    is_symbol.append(isinstance(expression, Symbol))
+                elif key[0] == CONSTANT:
+                    operands.append((len(constants), -1))
+                    constants.append(float(expression.value))
+                    integers.append(isinstance(expression.value, int) and not isinstance(expression.value, bool))
+                else:
+                    operands.append(key[1:])
+            indices[id(expression)] = keys[key]
+            return keys[key]
+
+        outputs = [add(expression) for expression in expressions]
+
+        self.codes = np.array(codes, dtype=np.uint8)
+        self.operands = np.array(operands, dtype=np.int32).reshape(-1, 2)
+        self.constants = np.array(constants, dtype=np.float64)
+        self.integers = np.array(integers, dtype=bool)
+        self.names = names
+        self.defaults = defaults
+        self.errors = errors
+        self.is_symbol = np.array(is_symbol, dtype=bool)
+        self.outputs = np.array(outputs, dtype=np.int32)
+        # the tape of the values and errors of the expressions, see get_error_tape
+        self.error_tape = None
+        # names of the named operations, see check_overrides
+        self.operation_names = sorted(operation_names)
+
+        # the last instruction that uses the result of every instruction, results of outputs are never freed
+        self.last_use = np.arange(len(codes), dtype=np.int32)
+        operations = np.flatnonzero(self.codes >= ADD)
+        for column in range(2):
+            np.maximum.at(self.last_use, self.operands[operations, column], operations)
+        self.last_use[self.outputs] = len(codes)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def check_overrides(self, parameters):
+        """
+        Checks that the parameters don't override the value or error of a named operation. The calculate methods of
+        named operations return the parameter with their name, while a tape calculates them like any other operation.
+        :param parameters: dict of parameters or errors
+        """
+        if parameters is None or len(self.operation_names) == 0:
+            return
+        overridden = [name for name in self.operation_names if name in parameters]
+        if len(overridden) > 0:
+            raise ValueError("Parameters can't override the named operations %s on a tape, use the calculate methods "
+                             "of the expressions instead" % ", ".join(overridden))
+
+    def get_parameter_values(self, parameters):
+        """
+        Gets the value of every named parameter on the tape
+        :param parameters: dict, if the name of the symbol is in the dict, it will take the value of the key in the
+                            dict, otherwise its value from when the tape was made
+        :return: list of values as float arrays, None if a parameter has no value
+        """
+        self.check_overrides(parameters)
+        values = []
+        for name, default in zip(self.names, self.defaults):
+            value = parameters[name] if parameters is not None and name in parameters else default
+            values.append(None if value is None else np.asarray(value, dtype=np.float64))
+        return values
+
+    def get_results(self, parameters=None, keep=False):
+        """
+        Executes the tape
+        :param parameters: dict, if the name of the symbol is in the dict, it will take the value of the key in the
+                            dict
+        :param keep: If True, the results of all instructions are kept, otherwise the results that are not needed
+                     anymore are freed along the way
+        :return: list of the results of the instructions, None if a parameter without a value is needed
+        """
+        parameter_values = self.get_parameter_values(parameters)
+        if any(value is None for value in parameter_values):
+            return None
+
+        last_use = self.last_use.tolist()
+        results = [None] * len(self.codes)
+        for index, (code, (a, b)) in enumerate(zip(self.codes.tolist(), self.operands.tolist())):
+            if code == SYMBOL:
+                results[index] = parameter_values[a]
+            elif code == CONSTANT:
+                results[index] = self.constants[a]
+            else:
+                results[index] = OPERATION_FUNCTIONS[code](results[a], results[b])
+                if not keep:
+                    if last_use[a] == index:
+                        results[a] = None
+                    if last_use[b] == index:
+                        results[b] = None
+        return results
+
+    def get_blocked_plan(self, shapes, varying, targets):
+        """
+        Assigns a scratch buffer to every instruction that is calculated per chunk. Buffers are reused as soon as the
+        result in them is not needed anymore.
+        :param shapes: list with the shape of the result of every instruction for a full chunk
+        :param varying: list with for every instruction whether it is calculated per chunk
+        :param targets: dict mapping instructions to the outputs they are written to, these don't need a buffer
+        :return: (list with the index of the buffer of every instruction, -1 if it has none, list of buffer shapes)
+        """
+        last_use = self.last_use.tolist()
+        assignment = [-1] * len(self.codes)
+        buffers, free = [], dict()
+
+        def release(operands, index):
+            for operand in set(operands):
+                if last_use[operand] == index and assignment[operand] >= 0:
+                    free.setdefault(shapes[operand], []).append(assignment[operand])
+
+        def allocate(index):
+            if len(free.get(shapes[index], [])) > 0:
+                assignment[index] = free[shapes[index]].pop()
+            else:
+                assignment[index] = len(buffers)
+                buffers.append(shapes[index])
+
+        for index, (code, operands) in enumerate(zip(self.codes.tolist(), self.operands.tolist())):
+            if code < ADD:
+                continue
+            if not varying[index] or index in targets:
+                release(operands, index)
+            elif code == LOG:
+                # the logarithm of the base is calculated after the result is written, so it can't share its buffer
+                allocate(index)
+                release(operands, index)
+            else:
+                release(operands, index)
+                allocate(index)
+        return assignment, buffers
+
+    def calculate_blocked(self, parameters=None, out=None, chunk_size=CHUNK_SIZE, workers=1):
+        """
+        Calculates the value of the expressions on the tape for large arrays. The arrays are split in chunks along
+        their first axis and every chunk goes through the whole tape at once, using a small pool of scratch buffers.
+        Subexpressions that don't depend on the chunked arrays are calculated only once.
+        :param parameters: dict, if the name of the symbol is in the dict, it will take the value of the key in the
+                            dict
+        :param out: float array in which the result is written, or a list of arrays if the tape was made from a list
+                    of expressions. If None, the arrays are created.
+        :param chunk_size: the number of elements in one chunk
+        :param workers: the number of threads, every thread calculates a contiguous slice of the rows and writes it
+                        directly in out
+        :return: out, None if a parameter without a value is needed
+        """
+        self.check_overrides(parameters)
+        values = []
+        for name, default in zip(self.names, self.defaults):
+            value = parameters[name] if parameters is not None and name in parameters else default
+            if value is None:
+                return None
+            # arrays are not converted as a whole, since they might not fit in memory
+            values.append(value if isinstance(value, np.ndarray) else np.asarray(value, dtype=np.float64))
+
+        shape = np.broadcast_shapes(*[value.shape for value in values])
+        chunked = [len(shape) > 0 and shape[0] > 1 and value.ndim == len(shape) and value.shape[0] == shape[0]
+                   for value in values]
+        total_rows = shape[0] if len(shape) > 0 else 1
+        rows = max(1, chunk_size // max(1, int(np.prod(shape[1:]))))
+
+        if out is None:
+            out = [np.empty(shape) for _ in self.outputs]
+            if self.single_output:
+                out = out[0]
+        outs = [out] if self.single_output else list(out)
+        for array in outs:
+            if not isinstance(array, np.ndarray) or not np.issubdtype(array.dtype, np.floating):
+                raise TypeError("out should be a float array, the results are calculated in double precision")
+            if array.shape != shape:
+                raise ValueError("out has shape %s, but the results have shape %s" % (array.shape, shape))
+        if workers > 1 and total_rows > 1:
+            arguments = []
+            for start, stop in split_rows(total_rows, workers):
+                slice_parameters = {name: get_rows(value, shape, start, stop)
+                                    for name, value in zip(self.names, values)}
+                slice_outs = [array[start:stop] for array in outs]
+                arguments.append((slice_parameters, slice_outs[0] if self.single_output else slice_outs, chunk_size))
+            run_in_threads(self.calculate_blocked, arguments, workers)
+            return out
+
+        targets = dict()
+        for position, output in enumerate(self.outputs.tolist()):
+            targets.setdefault(output, []).append(position)
+
+        # results that don't depend on the chunked arrays are calculated before the chunks
+        codes, operands = self.codes.tolist(), self.operands.tolist()
+        results = [None] * len(codes)
+        shapes = [None] * len(codes)
+        varying = [False] * len(codes)
+        for index, (code, (a, b)) in enumerate(zip(codes, operands)):
+            if code == SYMBOL:
+                varying[index] = chunked[a]
+                if varying[index]:
+                    shapes[index] = (rows,) + values[a].shape[1:]
+                else:
+                    results[index] = np.asarray(values[a], dtype=np.float64)
+                    shapes[index] = results[index].shape
+            elif code == CONSTANT:
+                results[index] = self.constants[a]
+                shapes[index] = ()
+            else:
+                varying[index] = varying[a] or varying[b]
+                shapes[index] = np.broadcast_shapes(shapes[a], shapes[b])
+                if not varying[index]:
+                    results[index] = OPERATION_FUNCTIONS[code](results[a], results[b])
+        for output, positions in targets.items():
+            if not varying[output]:
+                for position in positions:
+                    outs[position][...] = results[output]
+
+        assignment, buffer_shapes = self.get_blocked_plan(shapes, varying, targets)
+        buffers = [np.empty(buffer_shape) for buffer_shape in buffer_shapes]
+        instructions = [(index, codes[index], operands[index][0], operands[index][1])
+                        for index in range(len(codes)) if varying[index]]
+        # the logarithms of bases that are the same for every chunk are calculated once
+        log_bases = {index: np.log(results[b], dtype=np.float64) for index, code, a, b in instructions
+                     if code == LOG and not varying[b]}
+
+        for start in range(0, total_rows, rows):
+            stop = min(start + rows, total_rows)
+            for index, code, a, b in instructions:
+                if code == SYMBOL:
+                    results[index] = values[a][start:stop]
+                    if index in targets:
+                        outs[targets[index][0]][start:stop] = results[index]
+                    continue
+                if index in targets:
+                    target = outs[targets[index][0]][start:stop]
+                else:
+                    target = buffers[assignment[index]][:stop - start]
+                if code == LOG:
+                    log_base = log_bases[index] if index in log_bases else np.log(results[b], dtype=np.float64)
+                    np.log(results[a], out=target, dtype=np.float64)
+                    np.divide(target, log_base, out=target)
+                else:
+                    OPERATION_FUNCTIONS[code](results[a], results[b], out=target, dtype=np.float64)
+                results[index] = target
+            for output, positions in targets.items():
+                for position in positions[1:]:
+                    if varying[output]:
+                        outs[position][start:stop] = results[output]
+        return out
+
+    def get_output(self, values):
+        """
+        Gets the output of the tape in the same form as the expressions it was made of
+        :param values: list with one value for every expression
+        :return: the value, or the list of values
+        """
+        if values is None:
+            return None
+        return values[0] if self.single_output else values
+
+    def calculate(self, parameters=None, workers=1):
+        """
+        Calculates the value of the expressions on the tape
+        :param parameters: dict, if the name of the symbol is in the dict, it will take the value of the key in the
+                            dict
+        :param workers: the number of threads, if larger than 1 the arrays are calculated in slices in parallel, see
+                        calculate_blocked
+        :return: the value of the expression, or a list of values if the tape was made from a list of expressions
+        """
+        if workers > 1:
+            return self.calculate_blocked(parameters, workers=workers)
+        results = self.get_results(parameters)
+        if results is None:
+            return None
+        return self.get_output([results[output] for output in self.outputs.tolist()])
+
+    def get_gradients(self, results, outputs):
+        """
+        Calculates the derivatives of the given outputs with respect to all symbols. Reverse mode needs a sweep over
+        the tape per output and forward mode a sweep per symbol, the mode with the fewest sweeps is used.
+        :param results: the results of all instructions, see get_results with keep=True
+        :param outputs: list of the indices of the instructions to differentiate
+        :return: list with for every output a dict mapping the names of the symbols to the derivatives
+        """
+        if np.count_nonzero(self.is_symbol) < len(set(outputs)):
+            return self.get_forward_gradients(results, outputs)
+
+        codes, operands = self.codes.tolist(), self.operands.tolist()
+        # only instructions that depend on a parameter need an adjoint
+        active = [False] * len(codes)
+        for index, (code, (a, b)) in enumerate(zip(codes, operands)):
+            active[index] = code == SYMBOL or (code >= ADD and (active[a] or active[b]))
+
+        gradients = []
+        for output in outputs:
+            adjoints = [None] * len(codes)
+            adjoints[output] = np.float64(1)
+            for index in range(output, -1, -1):
+                adjoint = adjoints[index]
+                code = codes[index]
+                if adjoint is None or code < ADD:
+                    continue
+                a, b = operands[index]
+                x, y, value = results[a], results[b], results[index]
+                if code == ADD:
+                    contributions = adjoint, adjoint
+                elif code == SUBTRACT:
+                    contributions = adjoint, - adjoint
+                elif code == MULTIPLY:
+                    contributions = adjoint * y, adjoint * x
+                elif code == DIVIDE:
+                    contributions = adjoint / y, - adjoint * value / y
+                elif code == POWER:
+                    contributions = (adjoint * y * x ** (y - 1) if active[a] else None,
+                                     adjoint * value * np.log(x) if active[b] else None)
+                else:
+                    log_y = np.log(y)
+                    contributions = (adjoint / (x * log_y) if active[a] else None,
+                                     - adjoint * value / (y * log_y) if active[b] else None)
+
+                for operand, contribution in zip((a, b), contributions):
+                    if active[operand] and contribution is not None:
+                        adjoints[operand] = contribution if adjoints[operand] is None \
+                            else adjoints[operand] + contribution
+
+            gradient = dict()
+            for index, (code, (a, _)) in enumerate(zip(codes, operands)):
+                if code == SYMBOL and self.is_symbol[a] and adjoints[index] is not None:
+                    gradient[self.names[a]] = adjoints[index]
+            gradients.append(gradient)
+        return gradients
+
+    def get_forward_gradients(self, results, outputs):
+        """
+        Calculates the derivatives of the given outputs with respect to all symbols in forward mode
+        :param results: the results of all instructions, see get_results with keep=True
+        :param outputs: list of the indices of the instructions to differentiate
+        :return: list with for every output a dict mapping the names of the symbols to the derivatives
+        """
+        codes, operands = self.codes.tolist(), self.operands.tolist()
+        gradients = [dict() for _ in outputs]
+        for symbol in np.flatnonzero(self.is_symbol).tolist():
+            tangents = [None] * len(codes)
+            for index, (code, (a, b)) in enumerate(zip(codes, operands)):
+                if code == SYMBOL:
+                    tangents[index] = np.float64(1) if a == symbol else None
+                    continue
+                if code == CONSTANT or (tangents[a] is None and tangents[b] is None):
+                    continue
+                x, y, value = results[a], results[b], results[index]
+                if code == ADD:
+                    contributions = tangents[a], tangents[b]
+                elif code == SUBTRACT:
+                    contributions = tangents[a], None if tangents[b] is None else - tangents[b]
+                elif code == MULTIPLY:
+                    contributions = (None if tangents[a] is None else tangents[a] * y,
+                                     None if tangents[b] is None else tangents[b] * x)
+                elif code == DIVIDE:
+                    contributions = (None if tangents[a] is None else tangents[a] / y,
+                                     None if tangents[b] is None else - tangents[b] * value / y)
+                elif code == POWER:
+                    contributions = (None if tangents[a] is None else tangents[a] * y * x ** (y - 1),
+                                     None if tangents[b] is None else tangents[b] * value * np.log(x))
+                else:
+                    log_y = np.log(y)
+                    contributions = (None if tangents[a] is None else tangents[a] / (x * log_y),
+                                     None if tangents[b] is None else - tangents[b] * value / (y * log_y))
+                contributions = [contribution for contribution in contributions if contribution is not None]
+                tangents[index] = contributions[0] if len(contributions) == 1 else contributions[0] + contributions[1]
+
+            for gradient, output in zip(gradients, outputs):
+                if tangents[output] is not None:
+                    gradient[self.names[symbol]] = tangents[output]
+        return gradients
+
+    def gradient(self, parameters=None):
+        """
+        Calculates the derivatives of the expressions with respect to every symbol they depend on
+        :param parameters: dict, if the name of the symbol is in the dict, it will take the value of the key in the
+                            dict
+        :return: dict mapping the names of the symbols to the derivatives, or a list of such dicts if the tape was
+                 made from a list of expressions
+        """
+        results = self.get_results(parameters, keep=True)
+        if results is None:
+            return None
+        return self.get_output(self.get_gradients(results, self.outputs.tolist()))
+
+    def get_errors(self, gradients, parameters=None, error_parameters=None):
+        """
+        Propagates the errors of the symbols using the derivatives of the outputs
+        :param gradients: list with for every output a dict mapping the names of the symbols to the derivatives
+        :param parameters: dict with the values of the symbols
+        :param error_parameters: dict, if the name of the symbol is in the dict, it will take the value of the key in
+                                        the dict, otherwise its error from when the tape was made
+        :return: list of errors, None for outputs that don't depend on any symbol
+        """
+        self.check_overrides(error_parameters)
+        symbol_errors = dict()
+        for name, error in zip(self.names, self.errors):
+            if error_parameters is not None and name in error_parameters:
+                error = error_parameters[name]
+            symbol_errors[name] = error
+
+        errors = []
+        for gradient in gradients:
+            # as in calculate_error of the expressions, every symbol needs an error
+            check_errors({name: symbol_errors[name] for name in gradient})
+            terms = [derivative ** 2 * np.asarray(symbol_errors[name], dtype=np.float64) ** 2
+                     for name, derivative in gradient.items()]
+            errors.append(np.sqrt(sum(terms)) if len(terms) > 0 else None)
+        return errors
+
+    def calculate_error(self, parameters=None, error_parameters=None, workers=1):
+        """
+        Calculates the error of the expressions on the tape given the errors of the symbols
+        :param parameters: dict, if the name of the symbol is in the dict, it will take the value of the key in the
+                            dict
+        :param error_parameters: dict, if the name of the symbol is in the dict, it will take the value of the key in
+                                        the dict
+        :param workers: the number of threads, see calculate_all
+        :return: the error of the expression, or a list of errors if the tape was made from a list of expressions
+        """
+        return self.calculate_all(parameters, error_parameters, workers)[1]
+
+    def get_error_tape(self):
+        """
+        Gets the tape on which the errors of the expressions are calculated like values, see get_error_expression. It
+        is made once and kept.
+        :return: (Tape with the expressions followed by the error expressions, list with for every expression whether
+                 it has an error expression, dict mapping the names of the symbols to the names of their errors)
+        """
+        if self.error_tape is None:
+            expressions = self.to_expression()
+            if self.single_output:
+                expressions = [expressions]
+            error_expressions, error_names = [], dict()
+            for expression in expressions:
+                error_expression, names = get_error_expression(expression)
+                error_expressions.append(error_expression)
+                error_names.update(names)
+            self.error_tape = (Tape(expressions + [error for error in error_expressions if error is not None]),
+                               [error is not None for error in error_expressions], error_names)
+        return self.error_tape
+
+    def calculate_all_parallel(self, parameters, error_parameters, workers):
+        """
+        Calculates the value and the error of the expressions on the tape, in slices of the rows of the arrays that
+        are calculated in parallel. The errors are outputs of the error tape, such that calculate_blocked writes the
+        values and the errors of every slice directly in the results.
+        :param parameters: dict with the values of the symbols
+        :param error_parameters: dict with the errors of the symbols
+        :param workers: the number of threads
+        :return: (value, error), or (list of values, list of errors) if the tape was made from a list of expressions
+        """
+        values = self.get_parameter_values(parameters)
+        if any(value is None for value in values):
+            return None, None
+        self.check_overrides(error_parameters)
+        error_parameters = dict() if error_parameters is None else error_parameters
+        shape = np.broadcast_shapes(*[value.shape for value in values],
+                                    *[np.shape(error) for error in error_parameters.values()])
+        if len(shape) == 0 or shape[0] <= 1:
+            return self.calculate_all(parameters, error_parameters)
+
+        error_tape, has_error, error_names = self.get_error_tape()
+        # as in calculate_error of the expressions, every symbol needs an error
+        check_errors({name: error_parameters.get(name, error) for name, error in zip(self.names, self.errors)
+                      if name in error_names})
+        tape_parameters = dict() if parameters is None else dict(parameters)
+        tape_parameters.update({error_names[name]: error for name, error in error_parameters.items()
+                                if name in error_names})
+        results = error_tape.calculate_blocked(tape_parameters, workers=workers)
+        outputs, error_results = results[:len(self.outputs)], iter(results[len(self.outputs):])
+        errors = [next(error_results) if error else None for error in has_error]
+        return self.get_output(outputs), self.get_output(errors)
+
+    def calculate_all(self, parameters=None, error_parameters=None, workers=1):
+        """
+        Calculates the value and the error of the expressions on the tape in one pass
+        :param parameters: dict, if the name of the symbol is in the dict, it will take the value of the key in the
+                            dict
+        :param error_parameters: dict, if the name of the symbol is in the dict, it will take the value of the key in
+                                        the dict
+        :param workers: the number of threads, if larger than 1 the arrays are calculated in slices of their rows in
+                        parallel
+        :return: (value, error), or (list of values, list of errors) if the tape was made from a list of expressions
+        """
+        if workers > 1:
+            return self.calculate_all_parallel(parameters, error_parameters, workers)
+        results = self.get_results(parameters, keep=True)
+        if results is None:
+            return None, None
+        outputs = self.outputs.tolist()
+        errors = self.get_errors(self.get_gradients(results, outputs), parameters, error_parameters)
+        return self.get_output([results[output] for output in outputs]), self.get_output(errors)
+
+    def to_expression(self):
+        """
+        Turns the tape back into expressions, identical subexpressions are the same object in the result
+        :return: the expression, or a list of expressions if the tape was made from a list of expressions
+        """
+        nodes = []
+        for code, (a, b) in zip(self.codes.tolist(), self.operands.tolist()):
+            if code == SYMBOL:
+                if self.is_symbol[a]:
+                    nodes.append(Symbol(self.names[a], self.defaults[a], self.errors[a]))
+                else:
+                    nodes.append(Constant(self.defaults[a], self.errors[a], self.names[a]))
+            elif code == CONSTANT:
+                value = self.constants[a].item()
+                nodes.append(intern_constant(int(value) if self.integers[a] else value))
+            else:
+                nodes.append(OPERATION_CLASSES[code](nodes[a], nodes[b]))
+        return self.get_output([nodes[output] for output in self.outputs.tolist()])
+
+
+def calculate_blocked(expression, parameters=None, out=None, chunk_size=CHUNK_SIZE, workers=1):
+    """
+    Calculates the value of an expression for large arrays in chunks, see Tape.calculate_blocked
+    :param expression: Expression of type Base, or a list of expressions
+    :param parameters: dict, if the name of the symbol is in the dict, it will take the value of the key in the dict
+    :param out: array in which the result is written, or a list of arrays for a list of expressions
+    :param chunk_size: the number of elements in one chunk
+    :param workers: the number of threads
+    :return: out
+    """
+    return Tape(expression).calculate_blocked(parameters, out, chunk_size, workers)
+
+
+def get_sweep_parameters(axes, parameters=None):
+    """
+    Reshapes the axes of a sweep such that every axis has its own dimension, the other parameters are kept as they are
+    :param axes: dict mapping the names of symbols to 1-D arrays, the order of the dict is the order of the dimensions
+    :param parameters: dict with the values of the other symbols
+    :return: (dict of parameters, shape of the grid)
+    """
+    output = dict() if parameters is None else dict(parameters)
+    shape = tuple(len(axis) for axis in axes.values())
+    for dimension, (name, axis) in enumerate(axes.items()):
+        axis_shape = [1] * len(shape)
+        axis_shape[dimension] = shape[dimension]
+        output[name] = np.reshape(np.asarray(axis, dtype=np.float64), axis_shape)
+    return output, shape
+
+
+def expand_to_grid(results, shape):
+    """
+    Expands results to the full grid of a sweep
+    :param results: array or number, or a list of them for a list of expressions
+    :param shape: the shape of the grid
+    :return: array of the shape of the grid, or a list of them
+    """
+    if isinstance(results, list):
+        return [expand_to_grid(result, shape) for result in results]
+    return None if results is None else np.array(np.broadcast_to(results, shape))
+
+
+def sweep(expression, axes, parameters=None, error_parameters=None):
+    """
+    Calculates an expression over the grid spanned by axes of some symbols, without creating a meshgrid. Every axis
+    gets its own dimension, such that every subexpression is only calculated over the axes of the symbols it depends
+    on, and only the result is expanded to the full grid.
+    :param expression: Expression of type Base, a list of expressions, or a Tape
+    :param axes: dict mapping the names of symbols to 1-D arrays of their values, the order of the dict is the order
+                 of the dimensions of the grid
+    :param parameters: dict with the values of the other symbols
+    :param error_parameters: dict with the errors of the symbols, errors of symbols with an axis can be numbers or 1-D
+                             arrays along their axis. If None, only the values are calculated.
+    :return: array with a dimension for every axis, or (values, errors) if error_parameters are given. For a list of
+             expressions, the values and errors are lists.
+    example: sweep(x * y, {"x": np.arange(1000), "y": np.arange(1000)}) only creates one array of 1000 x 1000
+    """
+    tape = expression if isinstance(expression, Tape) else Tape(expression)
+    sweep_parameters, shape = get_sweep_parameters(axes, parameters)
+    if error_parameters is None:
+        return expand_to_grid(tape.calculate(sweep_parameters), shape)
+    # errors along an axis get the dimension of their axis
+    errors = {name: np.reshape(error, sweep_parameters[name].shape) if name in axes and np.ndim(error) > 0 else error
+              for name, error in error_parameters.items()}
+    values, errors = tape.calculate_all(sweep_parameters, errors)
+    return expand_to_grid(values, shape), expand_to_grid(errors, shape)
@@ -0,0 +1,129 @@
+import numpy as np
+
+__all__ = ["UncertainArray"]
+
+
+class UncertainArray:
+    """
+    A value together with its derivatives with respect to the symbols it depends on. The arithmetic operations
+    propagate both at once, such that the value and the linear error of an expression are calculated in a single pass
+    through it, without creating any derivative expressions. Only the derivatives that are not zero are kept.
+    """
+    __slots__ = ('value', 'sensitivities')
+    # numpy arrays defer to the operators of this class instead of treating it as an object
+    __array_ufunc__ = None
+
+    def __init__(self, value, sensitivities=None):
+        """
+        Initializes the uncertain value
+        :param value: number or numpy array
+        :param sensitivities: dict mapping the names of symbols to the derivative of the value with respect to them
+        """
+        self.value = value
+        self.sensitivities = dict() if sensitivities is None else sensitivities
+
+    @staticmethod
+    def from_symbol(name, value):
+        """
+        Creates the uncertain value of a symbol, whose derivative with respect to itself is 1
+        :param name: the name of the symbol
+        :param value: the value of the symbol
+        :return: UncertainArray
+        """
+        return UncertainArray(value, {name: 1.0})
+
+    @staticmethod
+    def get_parts(x):
+        """
+        Splits a value in its value and its derivatives
+        :param x: UncertainArray, number or numpy array
+        :return: (value, dict of derivatives)
+        """
+        if isinstance(x, UncertainArray):
+            return x.value, x.sensitivities
+        return x, dict()
+
+    @staticmethod
+    def log(x):
+        """
+        Takes the natural logarithm of a value
+        :param x: UncertainArray, number or numpy array
+        :return: log(x), an UncertainArray if x is one
+        """
+        if isinstance(x, UncertainArray):
+            return UncertainArray(np.log(x.value), combine(x.sensitivities, 1 / x.value, dict(), 0))
+        return np.log(x)
+
+    def error(self, errors):
+        """
+        Calculates the linear error of the value
+        :param errors: dict mapping the names of symbols to their errors, it needs the errors of all symbols on which
+                       the value depends
+        :return: the error
+        """
+        return sum([(sensitivity * errors[name]) ** 2 for name, sensitivity in self.sensitivities.items()]) ** 0.5
+
+    def __add__(self, other):
+        x, dx = UncertainArray.get_parts(self)
+        y, dy = UncertainArray.get_parts(other)
+        return UncertainArray(x + y, combine(dx, 1, dy, 1))
+
+    def __radd__(self, other):
+        return self.__add__(other)
+
+    def __sub__(self, other):
+        x, dx = UncertainArray.get_parts(self)
+        y, dy = UncertainArray.get_parts(other)
+        return UncertainArray(x - y, combine(dx, 1, dy, -1))
+
+    def __rsub__(self, other):
+        return UncertainArray(other) - self
+
+    def __mul__(self, other):
+        x, dx = UncertainArray.get_parts(self)
+        y, dy = UncertainArray.get_parts(other)
+        return UncertainArray(x * y, combine(dx, y, dy, x))
+
+    def __rmul__(self, other):
+        return self.__mul__(other)
+
+    def __truediv__(self, other):
+        x, dx = UncertainArray.get_parts(self)
+        y, dy = UncertainArray.get_parts(other)
+        value = x / y
+        return UncertainArray(value, combine(dx, 1 / y, dy, - value / y))
+
+    def __rtruediv__(self, other):
+        return UncertainArray(other) / self
+
+    def __pow__(self, power, modulo=None):
+        x, dx = UncertainArray.get_parts(self)
+        y, dy = UncertainArray.get_parts(power)
+        value = x ** y
+        # the logarithm of the base is only needed if the exponent is uncertain, which keeps negative bases working
+        return UncertainArray(value, combine(dx, y * x ** (y - 1) if len(dx) > 0 else 0, dy,
+                                             value * UncertainArray.log(x) if len(dy) > 0 else 0))
+
+    def __rpow__(self, other):
+        return UncertainArray(other) ** self
+
+    def __neg__(self):
+        return UncertainArray(- self.value, {name: - sensitivity for name, sensitivity in self.sensitivities.items()})
+
+
+def combine(dx, factor_x, dy, factor_y):
+    """
+    Combines the derivatives of two operands with the chain rule
+    :param dx: dict with the derivatives of x
+    :param factor_x: the derivative of the operation with respect to x
+    :param dy: dict with the derivatives of y
+    :param factor_y: the derivative of the operation with respect to y
+    :return: dict with the derivatives of the result
+    """
+    sensitivities = {name: sensitivity * factor_x for name, sensitivity in dx.items()}
+    for name, sensitivity in dy.items():
+        if name in sensitivities:
+            sensitivities[name] = sensitivities[name] + sensitivity * factor_y
+        else:
+            sensitivities[name] = sensitivity * factor_y
+    return sensitivities
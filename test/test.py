@@ -1,5 +1,32 @@
 from symbolic.base import *
+from symbolic.uncertain import *
 from symbolic.simplifier import *
+from symbolic.polynomial import *
+from symbolic.evaluator import *
+from symbolic.tape import *
+from symbolic.streaming import *
+from symbolic.formulas import *
+from symbolic.serialization import *
+from symbolic.cache import *
+from symbolic.codegen import *
+from symbolic.cost import *
+from symbolic.differentiation import *
+from symbolic.parser import *
+from symbolic.service import *
+from symbolic.corpus import *
+from symbolic.memory import *
+from symbolic.parallel import *
+from symbolic.profiler import *
+from symbolic.budget import *
+import asyncio
+from copy import deepcopy
+import json
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+import threading
 import unittest
 import numpy as np
 
@@ -14,6 +41,13 @@ class TestOperations(unittest.TestCase):
         self.y = Symbol("y")
         self.z = Symbol("z")
 
+    @staticmethod
+    def propagate_error(computation, parameters=None, error_parameters=None):
+        # the error from the symbolic derivatives, as it was calculated before calculate_error used UncertainArray
+        symbols = {symbol.name: symbol for symbol in computation.get_dependent_symbols()}
+        return sum([computation.derivative(symbol).calculate(parameters) ** 2 *
+                    symbol.calculate_error(parameters, error_parameters) ** 2 for symbol in symbols.values()]) ** 0.5
+
     def test_add(self):
         computation = self.x + self.y
         self.assertEqual(str(computation), "x + y")
@@ -64,6 +98,25 @@ class TestOperations(unittest.TestCase):
         calculation = computation.calculate({"x": np.arange(2, 4), "y": np.arange(1, 3)})
         self.assertArrayAlmostEqual(calculation, np.array([2, 9]))
 
+    def test_node_layout(self):
+        computation = (self.x * 2 + Log(self.y)) ** 2
+        for node in [self.x, computation, computation.x, computation.x.x.y, computation.x.y]:
+            self.assertFalse(hasattr(node, "__dict__"))
+        self.assertIsNone(computation.value)
+        self.assertIs(computation.y, (self.z ** 2).y)
+        self.assertIs(deepcopy(computation).y, computation.y)
+        self.assertIsNot(Constant(2), Constant(2))
+        copied = pickle.loads(pickle.dumps(computation))
+        self.assertEqual(str(copied), str(computation))
+        self.assertIs(copied.y, computation.y)
+        with self.assertRaises(AttributeError):
+            computation.y.value = 3
+        self.assertEqual((self.z ** 2).calculate({"z": 3}), 9)
+        constant = Constant(2)
+        constant.value = 3
+        self.assertEqual(constant.calculate(), 3)
+        self.assertRaises(TypeError, Base, "x", 2)
+
     def test_complicated_function1(self):
         computation = (self.x + self.y) / (self.x * self.y) - self.y
         self.assertEqual(str(computation), r"\frac{x + y}{x \cdot y} - y")
@@ -121,6 +174,23 @@ class TestOperations(unittest.TestCase):
         expression = simplify(computation)
         self.assertEqual(str(expression), r"1.0")
 
+    def test_simplifier_worklist(self):
+        computation = Log(self.x * 1 + 0) * self.y + Log(self.x + 0) * 2 * self.y
+        expression = simplify(computation)
+        self.assertEqual(str(expression), r"3 \cdot y \cdot \log_{2.718281828459045}x")
+        computation = (self.x ** self.z * Log(self.y) + self.x / (self.y * self.z)).derivative(self.y)
+        simplified = dict()
+        expression = simplify_worklist(computation, [remove_redundant_operations, multiply_divide_simplification],
+                                       simplified)
+        self.assertIs(simplified[get_structural_key(computation)], expression)
+        parameters = {"x": 1.3, "y": 0.7, "z": 2.1}
+        self.assertAlmostEqual(expression.calculate(parameters), computation.calculate(parameters))
+        expression = remove_redundant_operations(1 * self.x + 0, recursive=False)
+        self.assertEqual(str(expression), r"1 \cdot x")
+        # the worklist and factorize turn this expression into each other's form, simplify has to stop anyway
+        computation = (self.x + self.y) * (self.x - self.y) ** self.z
+        self.assertAlmostEqual(simplify(computation).calculate({"x": 9, "y": 3, "z": 2}), (9 + 3) * (9 - 3) ** 2)
+
     def test_factorize(self):
         computation = self.x + self.x * self.y
         expression = factorize(computation)
@@ -129,6 +199,31 @@ class TestOperations(unittest.TestCase):
         expression = factorize(computation)
         self.assertEqual(str(expression), r"x \cdot \left( z + 2 \right) \cdot \left( y + x \right)")
 
+    def test_polynomial(self):
+        polynomial = to_polynomial((self.x + 1) ** 2 - self.x * (self.y - 2))
+        self.assertEqual(polynomial.terms, {(("x", 2),): 1, (("x", 1),): 4, (): 1, (("x", 1), ("y", 1)): -1})
+        self.assertEqual(polynomial.degree(), 2)
+        self.assertIsNone(to_polynomial(self.x ** self.y + 1))
+        self.assertEqual(to_polynomial(4 * self.x ** 2 * self.y + 6 * self.x * self.y ** 3).content(),
+                         ((("x", 1), ("y", 1)), 2))
+
+    def test_polynomial_simplifier(self):
+        computation = (self.x + self.y) ** 2 - self.y ** 2 + Log(self.z)
+        expression = polynomial_simplification(computation)
+        self.assertEqual(str(expression), r"x \cdot \left( x + 2 \cdot y \right) + \log_{2.718281828459045}z")
+        computation = (self.x + 2 * self.y - self.z + 1) ** 6 - (self.x + 2 * self.y - self.z + 1) ** 5 * self.x
+        expression = simplify(computation)
+        # the expanded form has 83 terms, powers of sums that don't cancel are not expanded
+        self.assertEqual(len(to_polynomial(computation).terms), 83)
+        self.assertLessEqual(node_count(expression), node_count(computation) + 2)
+        self.assertIs(polynomial_simplification((self.x + 2 * self.y) ** 5).__class__, Power)
+        parameters = {"x": 0.3, "y": -1.2, "z": 0.7}
+        self.assertAlmostEqual(expression.calculate(parameters), computation.calculate(parameters))
+        self.assertEqual(str(simplify(6 * self.x + 9)), r"3 \cdot \left( 2 \cdot x + 3 \right)")
+        self.assertEqual(str(simplify(6 * self.x + 9, not_use_algorithms=[polynomial_simplification])),
+                         r"6 \cdot x + 9")
+        self.assertEqual(str(simplify(self.x / self.y * self.y + 6 * self.x)), r"7 \cdot x")
+
     def test_derivative(self):
         computation = self.x + self.y
         new_expression = computation.derivative(self.x)
@@ -169,6 +264,745 @@ class TestOperations(unittest.TestCase):
         calculation = computation.calculate_error({"x": 1, "y": 2}, {"x": 0.5, "y": 0.5})
         self.assertAlmostEqual(calculation, (1 / 4 * 0.5 ** 2 + 1 / 16 * 0.5 ** 2) ** 0.5)
 
+    def test_incremental_evaluator(self):
+        computation = Log(self.x * self.y + 2) / (self.z + self.x) ** 2 + self.z * self.y
+        parameters = {"x": 1.5, "y": 2.0, "z": 0.5}
+        error_parameters = {"x": 0.1, "y": 0.2, "z": 0.3}
+        evaluator = IncrementalEvaluator(computation, parameters, error_parameters)
+        self.assertAlmostEqual(evaluator.calculate(), computation.calculate(parameters))
+        self.assertAlmostEqual(evaluator.calculate_error(),
+                               self.propagate_error(computation, parameters, error_parameters))
+        self.assertNotIn(evaluator.names["x"][0], evaluator.get_affected_nodes(["z"]))
+
+        parameters["z"] = 1.5
+        self.assertAlmostEqual(evaluator.update({"z": 1.5}), computation.calculate(parameters))
+        self.assertAlmostEqual(evaluator.gradient()["z"], computation.derivative(self.z).calculate(parameters))
+        error_parameters["y"] = 0.5
+        evaluator.update(error_parameters={"y": 0.5})
+        self.assertAlmostEqual(evaluator.calculate_error(),
+                               self.propagate_error(computation, parameters, error_parameters))
+
+        # different Symbol objects with the same name are the same symbol
+        computation = self.x * self.y + Symbol("x") ** 2
+        evaluator = IncrementalEvaluator(computation, {"x": 2.0, "y": 3.0}, {"x": 0.1, "y": 0.2})
+        self.assertAlmostEqual(evaluator.calculate_error(), ((3.0 + 4.0) ** 2 * 0.01 + 2.0 ** 2 * 0.04) ** 0.5)
+        self.assertAlmostEqual(evaluator.calculate_error(),
+                               computation.calculate_error({"x": 2.0, "y": 3.0}, {"x": 0.1, "y": 0.2}))
+
+    def test_tape(self):
+        computation = Log(self.x * self.y + 2) / (self.z + self.x) ** 2 + self.z * self.y + self.x ** self.y
+        parameters = {"x": 1.5, "y": 2.0, "z": 0.5}
+        error_parameters = {"x": 0.1, "y": 0.2, "z": 0.3}
+        tape = Tape(computation)
+        self.assertAlmostEqual(tape.calculate(parameters), computation.calculate(parameters))
+        self.assertAlmostEqual(tape.calculate_error(parameters, error_parameters),
+                               self.propagate_error(computation, parameters, error_parameters))
+        gradient = tape.gradient(parameters)
+        for symbol in [self.x, self.y, self.z]:
+            self.assertAlmostEqual(gradient[symbol.name], computation.derivative(symbol).calculate(parameters))
+
+        values = np.linspace(1, 2, 5)
+        self.assertTrue(np.allclose(tape.calculate({"x": values, "y": 2.0, "z": 0.5}),
+                                    [computation.calculate({"x": value, "y": 2.0, "z": 0.5}) for value in values]))
+        self.assertIsNone(tape.calculate({"x": 1.5}))
+
+        self.assertEqual(str(tape.to_expression()), str(computation))
+        self.assertEqual(len(Tape(self.x * self.y + self.x * self.y)), 4)
+        self.assertAlmostEqual(pickle.loads(pickle.dumps(tape)).calculate(parameters), tape.calculate(parameters))
+        self.assertRaises(TypeError, Tape, Log(self.x) + Constant("a"))
+        named = Tape(Add(self.x, self.y, name="s") * self.z)
+        self.assertAlmostEqual(named.calculate(parameters), 1.75)
+        self.assertRaises(ValueError, named.calculate, dict(parameters, s=4.0))
+        self.assertRaises(ValueError, named.calculate_error, parameters, {"s": 0.1})
+
+    def test_tape_blocked(self):
+        computation = Log(self.x * self.y + 2) / (self.z + self.x) ** 2 + self.z * self.y + Log(self.x, self.y + 3)
+        parameters = {"x": np.linspace(1, 2, 1001), "y": np.linspace(0, 1, 1001), "z": 0.5}
+        tape = Tape(computation)
+        out = np.empty(1001)
+        self.assertIs(tape.calculate_blocked(parameters, out, chunk_size=64), out)
+        self.assertArrayAlmostEqual(out, computation.calculate(parameters))
+        # a single chunk, and chunks of a single row
+        for chunk_size in [5000, 1]:
+            self.assertArrayAlmostEqual(tape.calculate_blocked(parameters, chunk_size=chunk_size),
+                                        computation.calculate(parameters))
+
+        parameters = {"x": np.linspace(1, 2, 30).reshape(10, 3), "y": np.linspace(0, 1, 3), "z": np.ones((10, 1))}
+        values = calculate_blocked([computation, self.x, self.z * 2], parameters, chunk_size=7)
+        self.assertArrayAlmostEqual(values[0], computation.calculate(parameters))
+        self.assertArrayAlmostEqual(values[1], parameters["x"])
+        self.assertArrayAlmostEqual(values[2], np.full((10, 3), 2.0))
+        # the base of the first logarithm is the same for every chunk, the base of the second one is not
+        computation = Log(self.x, self.z + 1) + Log(self.z, self.x + 1)
+        parameters = {"x": np.linspace(1, 2, 100), "z": 3.0}
+        self.assertArrayAlmostEqual(calculate_blocked(computation, parameters, chunk_size=16),
+                                    computation.calculate(parameters))
+        self.assertRaises(TypeError, calculate_blocked, computation, parameters, np.empty(100, dtype=int))
+        self.assertRaises(ValueError, calculate_blocked, computation, parameters, np.empty(99))
+
+    def test_calculate_files(self):
+        computation = (self.z + self.x) ** 2 + self.z * self.y + self.x ** self.y
+        x_values, y_values = np.linspace(1, 2, 1001), np.linspace(0, 1, 1001)
+        parameters = {"x": x_values, "y": y_values, "z": 0.5}
+        error_parameters = {"x": 0.1, "y": y_values, "z": 0.05}
+        with tempfile.TemporaryDirectory() as directory:
+            np.save(os.path.join(directory, "x.npy"), x_values)
+            np.save(os.path.join(directory, "y.npy"), y_values)
+            columns = {"x": os.path.join(directory, "x.npy"), "y": os.path.join(directory, "y.npy"), "z": 0.5}
+            values, errors = calculate_files(computation, columns, os.path.join(directory, "values.npy"),
+                                             {"x": 0.1, "y": columns["y"], "z": 0.05},
+                                             os.path.join(directory, "errors.npy"), chunk_size=100)
+            self.assertArrayAlmostEqual(np.load(os.path.join(directory, "values.npy")),
+                                        computation.calculate(parameters))
+            self.assertArrayAlmostEqual(np.load(os.path.join(directory, "errors.npy")),
+                                        self.propagate_error(computation, parameters, error_parameters))
+            del values, errors
+            self.assertRaises(ValueError, calculate_files, computation, {"x": columns["x"]},
+                              os.path.join(directory, "values.npy"))
+            self.assertRaises(TypeError, calculate_files, computation, columns, os.path.join(directory, "values.npy"),
+                              {"x": 0.1, "y": 0.2}, os.path.join(directory, "errors.npy"))
+
+        # symbols that keep their own value and error can be arrays as well
+        z = Symbol("z", np.linspace(0, 1, 1001), np.full(1001, 0.05))
+        computation = (z + self.x) ** 2 + z * self.y
+        values, errors = calculate_files(computation, {"x": 1.5, "y": 2.0}, np.empty(1001), {"x": 0.1, "y": 0.2},
+                                         np.empty(1001), chunk_size=100)
+        parameters, error_parameters = {"x": 1.5, "y": 2.0}, {"x": 0.1, "y": 0.2}
+        self.assertArrayAlmostEqual(values, computation.calculate(parameters))
+        self.assertArrayAlmostEqual(errors, self.propagate_error(computation, parameters, error_parameters))
+
+    def test_propagate_stream(self):
+        computation = (self.z + self.x) ** 2 + self.z * self.y
+        records = [{"x": 0.1 * index, "y": 2.0, "z": 1.5} for index in range(10)]
+        error_parameters = {"x": 0.1, "y": 0, "z": 0}
+        results = list(propagate_stream(computation, iter(records), batch_size=4, error_parameters=error_parameters))
+        self.assertEqual(len(results), 10)
+        for record, (value, error) in zip(records, results):
+            self.assertAlmostEqual(value, computation.calculate(record))
+            self.assertAlmostEqual(error, self.propagate_error(computation, record, error_parameters))
+
+        records = [(record, {"x": 0, "y": 0.2, "z": 0}) for record in records]
+        results = list(propagate_stream(computation, records, batch_size=3))
+        self.assertAlmostEqual(results[0][1], self.propagate_error(computation, *records[0]))
+        # the error of an expression needs the errors of all its symbols
+        self.assertRaises(TypeError, list, propagate_stream(computation, records[0][:1], error_parameters={"x": 0.1}))
+        self.assertRaises(TypeError, Tape(computation).calculate_error, records[0][0], {"x": 0.1})
+
+    def test_formula_set(self):
+        # the formulas share subexpressions that are equal but not the same object
+        formulas = FormulaSet({"a": Log(self.x / self.y) * self.z + self.x, "b": Log(self.x / self.y) * self.z * self.y,
+                               "c": (Log(self.x / self.y) * self.z) ** 2, "d": self.x / self.y})
+        parameters = {"x": 3.0, "y": 2.0, "z": 0.5}
+        error_parameters = {"x": 0.1, "y": 0.2, "z": 0.3}
+        codes = formulas.tape.codes.tolist()
+        self.assertEqual(codes.count(LOG), 1)
+        self.assertEqual(codes.count(DIVIDE), 1)
+        # Log(x / y) * z and (Log(x / y) * z) * y
+        self.assertEqual(codes.count(MULTIPLY), 2)
+        # every symbol, and the named constant e of the logarithm, is loaded once
+        self.assertEqual(codes.count(SYMBOL), len(set(formulas.tape.names)))
+
+        values, errors = formulas.calculate_all(parameters, error_parameters)
+        for name in formulas:
+            self.assertAlmostEqual(values[name], formulas[name].calculate(parameters))
+            self.assertAlmostEqual(errors[name], self.propagate_error(formulas[name], parameters, error_parameters))
+        # with more formulas than symbols the gradient is calculated in forward mode, a single formula in reverse mode
+        gradient = formulas.gradient(parameters)
+        self.assertNotIn("z", gradient["d"])
+        for name in formulas:
+            reverse = Tape(formulas[name]).gradient(parameters)
+            self.assertEqual(set(gradient[name]), set(reverse))
+            for symbol in [self.x, self.y, self.z]:
+                if symbol.name in reverse:
+                    self.assertAlmostEqual(gradient[name][symbol.name], reverse[symbol.name])
+                    self.assertAlmostEqual(gradient[name][symbol.name],
+                                           formulas[name].derivative(symbol).calculate(parameters))
+
+    def test_serialization(self):
+        computation = Log(self.x * self.y + 2) / (self.z + self.x) ** 2 + Log(self.x, 10) + Constant(3.5, 0.2, "k")
+        derivative = computation.derivative(self.x)
+        parameters = {"x": 1.3, "y": 0.7, "z": 0.2}
+        data = dumps([computation, derivative])
+        self.assertLess(len(data), len(pickle.dumps([computation, derivative])))
+
+        for loaded in [loads(data), loads_json(dumps_json([computation, derivative]))]:
+            self.assertEqual(str(loaded[0]), str(computation))
+            self.assertEqual(str(loaded[1]), str(derivative))
+            self.assertAlmostEqual(loaded[1].calculate(parameters), derivative.calculate(parameters))
+        self.assertEqual(loads(dumps(Constant(3.5, 0.2, "k"))).error, 0.2)
+        self.assertEqual(loads_json(dumps_json(Add(self.x, 2, name="a"))).name, "a")
+
+        reader = ExpressionReader(data)
+        self.assertEqual(str(reader[0]), str(computation))
+        self.assertLess(sum([node is not None for node in reader.nodes]), len(reader.nodes))
+        self.assertRaises(ValueError, loads, b"PICKLE" + data)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "expressions.symb")
+            dump([computation, derivative], path)
+            self.assertEqual(str(load(path)[1]), str(derivative))
+            with ExpressionReader(path) as reader:
+                loaded = reader[0]
+            self.assertTrue(reader.data.closed)
+            self.assertAlmostEqual(loaded.calculate(parameters), computation.calculate(parameters))
+
+        # JSON has no nan and infinity, they are written as strings that strict parsers accept
+        computation = Constant(float("nan"), float("inf"), "n") + Symbol("s", float("-inf"))
+        text = dumps_json(computation)
+        json.loads(text, parse_constant=self.fail)
+        loaded = loads_json(text)
+        self.assertTrue(np.isnan(loaded.x.value))
+        self.assertEqual((loaded.x.error, loaded.y.value), (float("inf"), float("-inf")))
+
+        # integers that don't fit in 64 bits
+        with constant_folding():
+            computation = self.x * Constant(3) ** Constant(50) - Constant(-2 ** 70, 2 ** 64)
+        for loaded in [loads(dumps(computation)), loads_json(dumps_json(computation))]:
+            self.assertEqual((loaded.x.x.value, loaded.y.value, loaded.y.error), (3 ** 50, -2 ** 70, 2 ** 64))
+        # operands have to come before their operator, a node that refers to itself is corrupt
+        data = bytearray(dumps(self.x + 1))
+        reader = ExpressionReader(bytes(data))
+        root = reader.roots[0]
+        NODE.pack_into(data, reader.nodes_offset + root * NODE.size, CLASS_CODES[Add], -1, NODE_INDEX,
+                       INT64.pack(root), NODE_INDEX, INT64.pack(0))
+        self.assertRaises(ValueError, loads, bytes(data))
+        self.assertRaises(ValueError, loads_json, '{"format": "symbolic", "version": 1, "single": true, "roots": [0], '
+                                                  '"nodes": [["Add", null, 0, 0]]}')
+
+    def test_disk_cache(self):
+        computation = self.x * self.y + self.x * self.y + Log(self.x)
+        with tempfile.TemporaryDirectory() as directory:
+            cache = DiskCache(directory)
+            simplified = cache.simplify(computation)
+            self.assertEqual(str(simplified), str(simplify(computation)))
+            self.assertEqual(len(cache.get_entries()), 1)
+            self.assertEqual(str(DiskCache(directory).simplify(deepcopy(computation))), str(simplified))
+            self.assertEqual(len(cache.get_entries()), 1)
+            cache.simplify(computation, [factorize])
+            self.assertEqual(len(cache.get_entries()), 2)
+            optimized = cache.simplify(self.x ** 2 + 2 * self.x + 1, objective="eval_cost")
+            self.assertEqual(str(optimized), str(simplify(self.x ** 2 + 2 * self.x + 1, objective="eval_cost")))
+            self.assertNotEqual(str(cache.simplify(self.x ** 2 + 2 * self.x + 1)), str(optimized))
+            self.assertEqual(len(cache.get_entries()), 4)
+            self.assertRaises(ValueError, cache.simplify, computation, objective="fastest")
+
+            derivatives = cache.derivatives(computation)
+            self.assertEqual(set(derivatives), {"x", "y"})
+            self.assertEqual(str(cache.derivative(computation, self.x)), str(computation.derivative(self.x)))
+
+            size = cache.size()
+            self.assertEqual(cache.known_size, size)
+            cache.max_size = size // 2
+            cache.evict()
+            self.assertLessEqual(cache.size(), size // 2)
+            self.assertEqual(cache.known_size, cache.size())
+            cache.max_size = cache.size() + 1
+            cache.simplify(self.x * self.z + self.x * self.z)
+            self.assertLessEqual(cache.size(), cache.max_size)
+            self.assertEqual(cache.known_size, cache.size())
+            cache.clear()
+            self.assertEqual(cache.size(), 0)
+
+    def test_compiled_expression(self):
+        # every operation of the kernels, and logarithms with the natural, a constant and a calculated base
+        computation = (Log(self.x * self.y + 2) / (self.z + self.x) ** 2 - self.z * self.y + self.x ** self.y
+                       + Log(self.x, 10) - Log(self.x + 1, self.y + 2) + (self.x + 1) ** -1.5)
+        # the inputs are broadcast, and x is not contiguous
+        parameters = {"x": np.linspace(1, 2, 202)[::2], "y": np.linspace(0, 1, 303).reshape(3, 101), "z": 0.5}
+        error_parameters = {"x": 0.1, "y": np.full((3, 1), 0.2), "z": np.linspace(0.1, 0.3, 101)}
+        with tempfile.TemporaryDirectory() as directory:
+            kernels = os.path.join(directory, "kernels")
+            for compiler in [None, "no-such-compiler"]:
+                compiled = CompiledExpression([computation, Constant(2) * 3], kernels, compiler)
+                self.assertEqual(compiled.compiled, compiler is None and shutil.which("cc") is not None)
+                values = compiled.calculate(parameters)
+                self.assertArrayAlmostEqual(values[0], computation.calculate(parameters))
+                values, errors = compiled.calculate_all(parameters, error_parameters)
+                self.assertArrayAlmostEqual(values[0], computation.calculate(parameters))
+                self.assertArrayAlmostEqual(errors[0], self.propagate_error(computation, parameters, error_parameters))
+                self.assertTrue(np.all(values[1] == 6))
+                self.assertIsNone(errors[1])
+                compiled = CompiledExpression(computation, kernels, compiler)
+                self.assertAlmostEqual(compiled.calculate({"x": 1.5, "y": 2.0, "z": 0.5}),
+                                       computation.calculate({"x": 1.5, "y": 2.0, "z": 0.5}))
+                self.assertRaises(TypeError, compiled.calculate_error, parameters, {"x": 0.1})
+
+            if shutil.which("cc") is not None:
+                self.assertEqual(os.stat(kernels).st_mode & 0o777, 0o700)
+                libraries = [os.path.join(kernels, name) for name in os.listdir(kernels)]
+                # libraries that others can change are not loaded but compiled again
+                for library in libraries:
+                    os.chmod(library, 0o666)
+                self.assertTrue(CompiledExpression(computation, kernels).compiled)
+                self.assertTrue(CompiledExpression([computation, Constant(2) * 3], kernels).compiled)
+                self.assertEqual([os.stat(library).st_mode & 0o777 for library in libraries], [0o700] * 2)
+                os.chmod(kernels, 0o777)
+                self.assertRaises(PermissionError, CompiledExpression, computation, kernels)
+
+    def test_evaluation_cost(self):
+        self.assertEqual(evaluation_cost(self.x * self.y + self.x * self.y), 2)
+        self.assertGreater(evaluation_cost(self.x ** 2), evaluation_cost(self.x * self.x))
+        self.assertEqual(str(power_to_multiplications(self.x, 4)), r"x \cdot x \cdot x \cdot x")
+
+        parameters = {"x": 1.3, "y": 0.7, "z": 2.2}
+        for computation in [self.x ** 3 + 2 * self.x ** 2 * self.y + self.x + 5, (self.x + 1) ** 5,
+                            Log(self.z) * self.x ** 7 + self.x / self.z - self.y / self.z,
+                            self.x / self.y * (self.x / self.z)]:
+            optimized = simplify(computation, objective="eval_cost")
+            self.assertLess(evaluation_cost(optimized), evaluation_cost(computation))
+            self.assertLessEqual(evaluation_cost(optimized), evaluation_cost(simplify(computation)))
+            self.assertAlmostEqual(optimized.calculate(parameters), computation.calculate(parameters))
+        self.assertEqual(str(simplify(self.x ** 2 + 2 * self.x + 1, objective="eval_cost")),
+                         r"1 + x \cdot \left( 2 + x \right)")
+        self.assertRaises(ValueError, simplify, self.x, None, "fastest")
+
+    def test_higher_order_derivatives(self):
+        computation = Log(self.x * self.y + 2) / (self.z + self.x) ** 2 + self.z * self.y + self.x ** self.y
+        parameters = {"x": 1.3, "y": 0.7, "z": 0.2}
+        naive = computation.derivative(self.x).derivative(self.x).derivative(self.x)
+        third = derivative(computation, self.x, 3)
+        self.assertAlmostEqual(third.calculate(parameters), naive.calculate(parameters))
+        self.assertLess(node_count(third), node_count(deepcopy(naive)))
+        self.assertLessEqual(node_count(derivative(computation, self.x, 2, simplify_orders=True)),
+                             node_count(derivative(computation, self.x, 2)))
+
+        values = taylor_derivatives(computation, self.x, 3, parameters)
+        self.assertAlmostEqual(values[0], computation.calculate(parameters))
+        self.assertAlmostEqual(values[3], naive.calculate(parameters))
+        self.assertAlmostEqual(taylor_derivatives(self.x ** 3, "x", 2, {"x": -2.0})[2], -12.0)
+        # integer powers of a base that is zero
+        self.assertEqual(taylor_derivatives(self.x ** 3, "x", 4, {"x": 0.0}), [0, 0, 0, 6, 0])
+        values = taylor_derivatives((self.x * self.y) ** 2 + self.x, "x", 2, {"x": np.array([0.0, 1.0]), "y": 3.0})
+        self.assertArrayAlmostEqual(values[1], [1.0, 19.0])
+        self.assertArrayAlmostEqual(values[2], [18.0, 18.0])
+
+        mixed = mixed_derivative(computation, [self.x, self.y]).calculate(parameters)
+        self.assertAlmostEqual(mixed, mixed_derivative(computation, [self.y, self.x]).calculate(parameters))
+        self.assertAlmostEqual(hessian(computation)["y", "x"].calculate(parameters), mixed)
+
+    def test_tape_workers(self):
+        expression = self.x * self.y + Log(self.x + 2, 3) / self.y
+        tape = Tape(expression)
+        # rows of different lengths, and a column that is broadcast over the rows
+        x_values = np.linspace(1, 5, 1001 * 3).reshape(1001, 3)
+        y_values = np.linspace(2, 3, 1001).reshape(1001, 1)
+        parameters = {"x": x_values, "y": y_values}
+        expected = expression.calculate(parameters)
+        self.assertArrayAlmostEqual(tape.calculate(parameters, workers=4), expected)
+        out = np.empty((1001, 3))
+        self.assertIs(tape.calculate_blocked(parameters, out, chunk_size=64, workers=3), out)
+        self.assertArrayAlmostEqual(out, expected)
+
+        error_parameters = {"x": np.linspace(0.1, 0.2, 3), "y": np.linspace(0.2, 0.4, 1001).reshape(1001, 1)}
+        expected_error = self.propagate_error(expression, parameters, error_parameters)
+        value, error = tape.calculate_all(parameters, error_parameters, workers=4)
+        self.assertArrayAlmostEqual(value, expected)
+        self.assertArrayAlmostEqual(error, expected_error)
+        self.assertArrayAlmostEqual(tape.calculate_error(parameters, error_parameters, workers=7), expected_error)
+
+        values = Tape([expression, self.x * 2]).calculate({"x": x_values, "y": 2}, workers=4)
+        self.assertArrayAlmostEqual(values[1], x_values * 2)
+        # outputs without symbols have no error, and every symbol needs one
+        values, errors = Tape([expression, Constant(2)]).calculate_all(parameters, error_parameters, workers=4)
+        self.assertArrayAlmostEqual(errors[0], expected_error)
+        self.assertIsNone(errors[1])
+        with self.assertRaises(TypeError):
+            tape.calculate_all(parameters, {"x": 0.1}, workers=4)
+
+    def test_uncertain_array(self):
+        computation = Log(self.x * self.y + 2) / (self.z + self.x) ** 2 + self.z * self.y + self.x ** self.y
+        parameters = {"x": 1.5, "y": 2.0, "z": 0.5}
+        error_parameters = {"x": 0.1, "y": 0.2, "z": 0.3}
+        value, error = computation.calculate_all(parameters, error_parameters)
+        self.assertAlmostEqual(value, computation.calculate(parameters))
+        expected = sum([computation.derivative(symbol).calculate(parameters) ** 2 * error_parameters[symbol.name] ** 2
+                        for symbol in [self.x, self.y, self.z]]) ** 0.5
+        self.assertAlmostEqual(error, expected)
+
+        values = {"x": np.linspace(1, 2, 5), "y": 2.0, "z": 0.5}
+        value, error = computation.calculate_all(values, error_parameters)
+        expected = sum([computation.derivative(symbol).calculate(values) ** 2 * error_parameters[symbol.name] ** 2
+                        for symbol in [self.x, self.y, self.z]]) ** 0.5
+        self.assertArrayAlmostEqual(value, computation.calculate(values))
+        self.assertArrayAlmostEqual(error, expected)
+
+        # as before, every symbol needs an error, and expressions without symbols have no error
+        self.assertAlmostEqual((self.x ** 2 * self.y).calculate_error({"x": -2, "y": 3}, {"x": 0.1, "y": 0}), 1.2)
+        self.assertRaises(TypeError, (self.x ** 2 * self.y).calculate_error, {"x": -2, "y": 3}, {"x": 0.1})
+        self.assertRaises(TypeError, (self.x + 1).calculate_all, {"x": 1})
+        self.assertIsNone((Constant(2) + 1).calculate_error())
+        self.assertEqual(self.x.calculate_all({"x": 2}, {"x": 0.5}), (2, 0.5))
+        self.assertEqual(Symbol("w", 3, 0.2).calculate_all(), (3, 0.2))
+        # logarithms of arrays are calculated with numpy, those of numbers with math as before
+        self.assertArrayAlmostEqual(Log(self.x, 2).calculate({"x": np.array([1, 2, 8])}), [0, 1, 3])
+        self.assertIsInstance(Log(self.x, 2).calculate({"x": 8}), float)
+
+        uncertain = UncertainArray.from_symbol("x", 2.0) * 3 + 1
+        self.assertEqual(uncertain.value, 7.0)
+        self.assertEqual(uncertain.error({"x": 0.5}), 1.5)
+
+    def test_parser(self):
+        symbols = {"x": self.x, "y": self.y, "z": self.z}
+        parameters = {"x": 1.3, "y": 0.7, "z": 2.1}
+        expression = parse("x * (y + 2) ** 2 / log(x, 10) - -z ^ 2", symbols)
+        self.assertAlmostEqual(expression.calculate(parameters), 1.3 * 2.7 ** 2 / np.log10(1.3) + 2.1 ** 2)
+        self.assertEqual(str(parse("2 ** -1 + 1e3")), "1000.5")
+
+        for computation in [self.x - (self.y - self.x), - self.x * (self.y + 2), (self.x + 1) / (self.y * 2),
+                            (self.x + self.y) ** (self.x * 2), Log(self.x * self.y) ** 2 + Log(self.x + self.y, 2),
+                            self.x ** self.y ** 2, (self.x ** self.y) ** 2, self.x / (self.y / self.z) - 2.5e-7,
+                            Log(self.x ** 2), Log(self.x) ** 2, Log(Log(self.x + 2), 3) ** self.y]:
+            parsed = parse_latex(str(computation), symbols)
+            self.assertEqual(str(parsed), str(computation))
+            self.assertEqual(parsed.latexify(False), computation.latexify(False))
+            self.assertAlmostEqual(parsed.calculate(parameters), computation.calculate(parameters))
+        self.assertIsInstance(parse_latex(str(Log(self.x ** 2)), symbols), Log)
+        self.assertIsInstance(parse_latex(str(Log(self.x) ** 2), symbols), Power)
+        # e is the named constant, the default base of Log, also when it is written as a number
+        for text, latex in [("log(x)", False), ("log(x, e)", False), (r"\log_{e}x", True), (r"\ln x", True),
+                            (str(Log(self.x)), True)]:
+            self.assertIs(parse(text, symbols, latex).y, Log(self.x).y)
+        self.assertEqual(Log(self.x).latexify(False), r"\log_{e}x")
+        first, second = parse_many(["log(x)", "log(x) + 1"], symbols)
+        self.assertIs(second.x, first)
+
+        first, second = parse_many(["x * y + 1", "(x * y) ** 2"], symbols)
+        self.assertIs(first.x, second.x)
+        self.assertIs(first.x.x, self.x)
+        self.assertIsInstance(parse("w", symbols), Symbol)
+        self.assertIn("w", symbols)
+        self.assertRaises(ValueError, parse, "x + * y")
+        self.assertRaises(ValueError, parse, "x + (y")
+        self.assertRaises(ValueError, parse_latex, r"\frac{x}")
+
+    def test_batch_evaluator(self):
+        computation = Log(self.x * self.y + 2) / (self.z + self.x) ** 2 + self.z * self.y
+        records = [{"x": 1 + index / 10, "y": 2.0, "z": 0.5 + index / 20} for index in range(40)]
+        error_parameters = {"x": 0.1, "y": 0.2, "z": 0.05}
+
+        async def evaluate_all():
+            evaluator = BatchEvaluator()
+            evaluator.register("f", computation)
+            evaluator.register("g", "x * y")
+            requests = [evaluator.evaluate("f", record, error_parameters) for record in records]
+            requests.append(evaluator.evaluate("g", {"x": 2, "y": 3}))
+            results = await asyncio.gather(*requests)
+            with self.assertRaises(KeyError):
+                await evaluator.evaluate("h", {"x": 2})
+            # a bad request fails on its own, not the batch it arrives with
+            mixed = await asyncio.gather(evaluator.evaluate("g", {"x": "abc", "y": 3}),
+                                         evaluator.evaluate("g", {"x": 2, "y": 3}), return_exceptions=True)
+            self.assertIsInstance(mixed[0], ValueError)
+            self.assertEqual(mixed[1], (6.0, None))
+            # if a batch fails anyway, its requests are calculated one by one
+            batch = [({"x": 2, "y": 3}, {}), ({"x": "abc", "y": 3}, {})]
+            batched, outcomes = calculate_requests(Tape(self.x * self.y), batch)
+            self.assertFalse(batched)
+            self.assertEqual(outcomes[0], ((6.0, None), None))
+            self.assertIsInstance(outcomes[1][1], ValueError)
+            # a full batch is calculated at once and its timer is cancelled
+            full = BatchEvaluator(window=60, max_batch_size=4)
+            full.register("f", computation)
+            await asyncio.gather(*[full.evaluate("f", record, error_parameters) for record in records[:4]])
+            self.assertEqual(full.timers, dict())
+
+            server = await start_server(evaluator)
+            port = server.sockets[0].getsockname()[1]
+            client = EvaluationClient()
+            await client.connect(port)
+            remote = await asyncio.gather(*[client.evaluate("f", record, error_parameters) for record in records[:5]])
+            with self.assertRaises(RuntimeError):
+                await client.evaluate("f", {"x": 1})
+            await client.close()
+
+            # lines that are not JSON get an answer and the connection stays open
+            reader, writer = await asyncio.open_connection(HOST, port)
+            request = {"id": 3, "expression": "g", "parameters": {"x": 2, "y": 3}}
+            writer.write(b"{not json\n[1, 2]\n" + json.dumps(request).encode("utf-8") + b"\n")
+            writer.write_eof()
+            responses = [json.loads(line) async for line in reader]
+            writer.close()
+            server.close()
+            await server.wait_closed()
+            return evaluator, results, remote, responses
+
+        evaluator, results, remote, responses = asyncio.run(evaluate_all())
+        self.assertEqual([response["id"] for response in responses], [None, None, 3])
+        self.assertTrue(all("exception" in response for response in responses[:2]))
+        self.assertEqual(responses[2]["value"], 6)
+        self.assertEqual(results[-1], (6.0, None))
+        for record, (value, error) in zip(records, results):
+            self.assertAlmostEqual(value, computation.calculate(record))
+            self.assertAlmostEqual(error, self.propagate_error(computation, record, error_parameters))
+        for (value, error), expected in zip(remote, results):
+            self.assertAlmostEqual(value, expected[0])
+            self.assertAlmostEqual(error, expected[1])
+        self.assertLess(evaluator.batches, 10)
+
+    def test_corpus(self):
+        corpus = generate_corpus(20, seed=3, size=6, max_depth=4)
+        self.assertEqual([str(expression) for expression in corpus],
+                         [str(expression) for expression in generate_corpus(20, seed=3, size=6, max_depth=4)])
+        classes = set()
+        for expression in corpus:
+            stack = [expression]
+            while len(stack) > 0:
+                node = stack.pop()
+                classes.add(node.__class__)
+                if isinstance(node, BaseOperator1):
+                    stack.extend([node.x, node.y])
+        self.assertTrue(set(OPERATORS).issubset(classes))
+
+        records = replay(corpus[:5], ["simplify", "derivative"])
+        self.assertEqual(len(records), 10)
+        self.assertEqual(set(records[0]), {"case", "operation", "expression", "passed", "error", "time", "nodes",
+                                           "result_nodes"})
+        self.assertTrue(all(record["passed"] for record in records if record["operation"] == "simplify"))
+
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, "baseline.json")
+            save_baseline(records, path)
+            baseline = load_baseline(path)
+        finally:
+            shutil.rmtree(directory)
+        self.assertEqual(compare_baseline(records, baseline), [])
+        slow = dict(records[0], time=baseline[0]["time"] * 10 + 1)
+        wrong = dict(records[1], passed=False)
+        self.assertEqual([reason for _, _, reason in compare_baseline([slow, wrong], baseline)], ["slower", "failed"])
+        # a different expression under the same case number is not the same case
+        self.assertEqual(compare_baseline([dict(wrong, expression=records[2]["expression"])], baseline), [])
+
+    def test_memory_suite(self):
+        # every algorithm of simplify is an entry point
+        self.assertIn("polynomial_simplification", ENTRY_POINTS)
+        records = run_memory_suite([3, 5], cases=2, entry_points=["simplify", "derivative", "calculate_error"])
+        self.assertEqual(len(records), 12)
+        for record in records:
+            if record["passed"]:
+                self.assertIsNone(record["error"])
+                self.assertGreater(record["peak"], 0)
+                if record["entry_point"] == "calculate_error":
+                    self.assertEqual(record["live_nodes"], 0)
+        self.assertEqual(compare_memory(records, records), [])
+        passed = [record for record in records if record["passed"]]
+        grown = [dict(passed[0], peak=passed[0]["peak"] * 2 + 4096)] + passed[1:]
+        self.assertEqual([metric for _, _, metric in compare_memory(grown, passed)], ["peak"])
+        # cases that fail or are not measured anymore are regressions
+        failed = [dict(passed[0], passed=False, error="ValueError: math domain error")] + passed[2:]
+        regressions = compare_memory(failed, passed)
+        self.assertEqual([metric for _, _, metric in regressions], ["failed", "missing"])
+        self.assertIsNone(regressions[1][0])
+        self.assertEqual(describe_regression(*regressions[0]), "failed with ValueError: math domain error")
+
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, "memory.json")
+            check_memory_baseline(path, [3], cases=1)
+            self.assertTrue(os.path.exists(path))
+            baseline = load_baseline(path)
+            save_baseline([dict(record, nodes=0, live_nodes=0) for record in baseline], path)
+            self.assertRaises(AssertionError, check_memory_baseline, path, [3], 1)
+        finally:
+            shutil.rmtree(directory)
+
+    def test_calculate_processes(self):
+        computation = Log(self.x * self.y + 2) / (self.z + self.x) ** 2 + self.z * self.y
+        parameters = {"x": np.linspace(1, 2, 1001), "y": 2.0, "z": np.linspace(0.5, 1, 1001)}
+        error_parameters = {"x": 0.1, "y": np.full(1001, 0.2), "z": 0.05}
+        self.assertArrayAlmostEqual(calculate_processes(computation, parameters, processes=2),
+                                    computation.calculate(parameters))
+        values, errors = calculate_processes(computation, parameters, error_parameters, processes=2)
+        self.assertArrayAlmostEqual(values, computation.calculate(parameters))
+        self.assertArrayAlmostEqual(errors, self.propagate_error(computation, parameters, error_parameters))
+
+        # shared arrays are not copied, neither the inputs nor the outputs the caller passes, and shared arrays that
+        # don't have a row for every row of the results broadcast
+        x_values = np.linspace(1, 2, 3003).reshape(1001, 3)
+        z_values = np.linspace(0.5, 1, 3)
+        shared = [SharedArray.from_array(x_values), SharedArray.from_array(z_values)]
+        shared.extend(SharedArray((1001, 3)) for _ in range(6))
+        try:
+            values, errors = calculate_processes([computation, self.x * 2, Constant(3)],
+                                                 {"x": shared[0], "y": 2.0, "z": shared[1]},
+                                                 {"x": 0.1, "y": 0.2, "z": 0}, processes=2, out=shared[2:5],
+                                                 error_out=shared[5:])
+            self.assertIs(values[0], shared[2])
+            self.assertIsNone(errors[2])
+            parameters = {"x": x_values, "y": 2.0, "z": z_values}
+            self.assertArrayAlmostEqual(values[1].array, x_values * 2)
+            self.assertArrayAlmostEqual(errors[0].array, self.propagate_error(computation, parameters,
+                                                                              {"x": 0.1, "y": 0.2, "z": 0}))
+            self.assertRaises(ValueError, calculate_processes, computation, parameters, processes=2, out=shared[1])
+            self.assertRaises(TypeError, calculate_processes, computation, parameters, processes=2, out=x_values)
+        finally:
+            for array in shared:
+                array.unlink()
+        self.assertIsNone(calculate_processes(computation, {"x": 1.5}))
+
+        for index in range(MAX_WORKER_TAPES + 2):
+            get_tape(dumps(self.x + index))
+        self.assertEqual(len(WORKER_TAPES), MAX_WORKER_TAPES)
+        self.assertTrue(dumps(self.x + (MAX_WORKER_TAPES + 1)) in WORKER_TAPES)
+        self.assertFalse(dumps(self.x + 0) in WORKER_TAPES)
+
+    def test_profiler(self):
+        shared = Log(self.x * self.y + 2)
+        computation = shared / (self.z + self.x) ** self.y + Log(self.x * self.y + 2)
+        parameters = {"x": np.linspace(1, 2, 100), "y": 2.0, "z": 0.5}
+        references = sys.getrefcount(computation)
+        with Profiler() as profiler:
+            value = computation.calculate(parameters)
+            computation.calculate_error(parameters, {"x": 0.1, "y": 0.2, "z": 0.05})
+        self.assertArrayAlmostEqual(value, computation.calculate(parameters))
+        self.assertEqual(sys.getrefcount(computation), references)
+
+        statistics = profiler.get_node_statistics(computation)
+        self.assertEqual(statistics.calls, 2)
+        self.assertEqual(statistics.size, 100)
+        self.assertGreaterEqual(statistics.cumulative_time, statistics.self_time)
+        logs = [node for node in profiler.get_statistics() if profiler.get_label(node.key).startswith("Log: ")]
+        self.assertEqual(len(logs), 1)
+        self.assertEqual(logs[0].calls, 4)
+
+        report = profiler.report(top=3, sort="self").splitlines()
+        self.assertEqual(len(report), 4)
+        self.assertRaises(ValueError, profiler.report, sort="calls")
+        folded = profiler.folded()
+        self.assertTrue(all(line.startswith("Add: ") for line in folded))
+        self.assertTrue(any(line.count(";") == 4 for line in folded))
+        self.assertEqual(len(profiler.folded(top=2)), 2)
+        self.assertEqual(profiler.get_label(logs[0].key), r"Log: \log_{e}\left( x \cdot y + 2 \right)")
+
+        # profilers that are stopped in another order than they were started only stop themselves
+        outer, inner = Profiler(), Profiler()
+        outer.start()
+        inner.start()
+        outer.stop()
+        (self.x + self.y).calculate({"x": 1.0, "y": 2.0})
+        inner.stop()
+        (self.x * self.y).calculate({"x": 1.0, "y": 2.0})
+        self.assertEqual(len(outer.statistics), 0)
+        self.assertEqual([node.key for node in inner.get_statistics()],
+                         [inner.get_node_statistics(self.x + self.y).key])
+        # the calculate methods are only wrapped while a profiler is active
+        self.assertEqual(Add.calculate.__qualname__, "Add.calculate")
+        self.assertEqual(ORIGINAL_CALCULATE, dict())
+
+        # a profiler is not active in other threads
+        with Profiler() as profiler:
+            thread = threading.Thread(target=computation.calculate, args=(parameters,))
+            thread.start()
+            thread.join()
+        self.assertEqual(len(profiler.statistics), 0)
+
+    def test_error_budget(self):
+        computation = self.x * self.y + Log(self.z + 2) * 0.001
+        parameters = {"x": 2.0, "y": 3.0, "z": 1.0}
+        error_parameters = {"x": 0.5, "y": 0.2, "z": 0.1}
+        contributions = error_contributions(computation, parameters, error_parameters)
+        self.assertAlmostEqual(contributions["x"], (3.0 * 0.5) ** 2)
+        self.assertAlmostEqual(contributions["y"], (2.0 * 0.2) ** 2)
+        self.assertAlmostEqual(sum(contributions.values()) ** 0.5,
+                               self.propagate_error(computation, parameters, error_parameters))
+
+        budget = ErrorBudget(computation, parameters, error_parameters)
+        self.assertAlmostEqual(sum(budget.get_fractions().values()), 1)
+        self.assertEqual(budget.prune(1e-4), ["z"])
+        self.assertEqual([symbol.name for symbol in budget.kept], ["x", "y"])
+        self.assertAlmostEqual(budget.calculate_error(parameters, error_parameters) ** 2 +
+                               budget.get_pruned_error() ** 2, budget.error ** 2)
+        parameters["x"] = 4.0
+        self.assertAlmostEqual(budget.calculate_error(parameters, error_parameters),
+                               ((3 * 0.5) ** 2 + 0.8 ** 2) ** 0.5)
+        self.assertIn("(pruned)", budget.report().splitlines()[3])
+
+        budget = ErrorBudget(computation, {"x": 1.0, "y": np.array([1.0, 3.0]), "z": 1.0}, {"x": 0.1, "y": 0, "z": 0},
+                             threshold=0.5)
+        self.assertArrayAlmostEqual(budget.error, np.array([0.1, 0.3]))
+        self.assertEqual([symbol.name for symbol in budget.kept], ["x"])
+        # a symbol without an error can't be left out of the budget
+        self.assertRaises(TypeError, ErrorBudget, computation, parameters, {"x": 0.1})
+        self.assertRaises(TypeError, budget.calculate_error, parameters, {"x": None})
+
+        # symbols and constants have a budget as well
+        self.assertEqual(error_contributions(self.x, {"x": 2.0}, {"x": 0.5}), {"x": 0.25})
+        self.assertEqual(error_contributions(Constant(2.0), error_parameters={"x": 0.5}), dict())
+        self.assertIsNone(ErrorBudget(Constant(2.0)).error)
+        self.assertRaises(TypeError, error_contributions, 2.0)
+
+    def test_constant_folding(self):
+        self.assertIsInstance(self.x * 1, Multiply)
+        with constant_folding():
+            self.assertEqual(str(self.x * 1 + intern_constant(2) * 3), "x + 6")
+            self.assertIs(self.x + 0, self.x)
+            self.assertIs(- (- self.x), self.x)
+            self.assertIs(self.x ** 1, self.x)
+            self.assertIs(self.x / 1, self.x)
+            # a symbol can be an array or nan, so multiplying it with 0 is not 0
+            self.assertIsInstance(0 * self.x, Multiply)
+            self.assertIsInstance(0 / self.x, Divide)
+            self.assertEqual((0 * Log(intern_constant(3), 2)).value, 0)
+            # without the logarithm of the base, the derivative is defined for negative bases
+            self.assertAlmostEqual((self.x ** 2).derivative(self.x).calculate({"x": -2.0}), -4)
+            self.assertEqual(str(2 * (3 * self.x)), r"6 \cdot x")
+            self.assertIsInstance(intern_constant(1) / 3, Divide)
+            self.assertIsInstance(intern_constant(0) ** -1, Power)
+            self.assertIsInstance(intern_constant(3) ** -1, Power)
+            self.assertEqual((intern_constant(2) ** 10).value, 1024)
+            self.assertIsInstance(intern_constant(10 ** 300) ** 1000, Power)
+            self.assertEqual((intern_constant(4.0) ** -0.5).value, 0.5)
+            self.assertEqual(fold(Log(intern_constant(1000), intern_constant(10))).value, 3)
+            self.assertIsInstance(fold(Log(intern_constant(3), intern_constant(2))), Log)
+            # other threads don't fold
+            built = []
+            thread = threading.Thread(target=lambda: built.append(self.x * 1))
+            thread.start()
+            thread.join()
+            self.assertIsInstance(built[0], Multiply)
+            with constant_folding(False):
+                self.assertIsInstance(self.x + 0, Add)
+            computation = Log(self.x * self.y + 2) / (self.x + 1) ** 2 + self.x ** 3 * self.y
+            folded_derivative = computation.derivative(self.x)
+        self.assertFalse(FOLD_CONSTANTS.get())
+
+        derivative = computation.derivative(self.x)
+        parameters = {"x": 1.3, "y": 0.7}
+        self.assertLess(node_count(folded_derivative), node_count(derivative))
+        self.assertAlmostEqual(folded_derivative.calculate(parameters), derivative.calculate(parameters))
+        # folding afterwards keeps terms like 0 * log(x + 1), which the derivative leaves out while folding
+        self.assertLess(node_count(fold(derivative)), node_count(derivative))
+        self.assertGreaterEqual(node_count(fold(derivative)), node_count(folded_derivative))
+        self.assertAlmostEqual(fold(derivative).calculate(parameters), derivative.calculate(parameters))
+
+    def test_sweep(self):
+        c = Log(self.x * 2 + 3) * self.z + self.x ** 2 / (self.z + 1) + self.y
+        axes = {"x": np.linspace(1, 2, 4), "y": np.linspace(0, 1, 3), "z": np.linspace(1, 3, 5)}
+        x, y, z = np.meshgrid(axes["x"], axes["y"], axes["z"], indexing="ij")
+        values = sweep(c, axes)
+        self.assertEqual(values.shape, (4, 3, 5))
+        self.assertArrayAlmostEqual(values, c.calculate({"x": x, "y": y, "z": z}))
+
+        values, errors = sweep(c, axes, error_parameters={"x": 0.1, "y": np.full(3, 0.3), "z": np.full(5, 0.2)})
+        self.assertArrayAlmostEqual(values, c.calculate({"x": x, "y": y, "z": z}))
+        self.assertArrayAlmostEqual(errors, self.propagate_error(c, {"x": x, "y": y, "z": z},
+                                                                 {"x": 0.1, "y": 0.3, "z": 0.2}))
+
+        # errors that vary along axes that are not the first one stay on their own axis
+        error_axes = {"x": np.linspace(0.05, 0.2, 4), "y": np.linspace(0.1, 0.5, 3), "z": np.linspace(0.01, 0.3, 5)}
+        error_x, error_y, error_z = np.meshgrid(error_axes["x"], error_axes["y"], error_axes["z"], indexing="ij")
+        values, errors = sweep(c, axes, error_parameters=error_axes)
+        self.assertArrayAlmostEqual(errors, self.propagate_error(c, {"x": x, "y": y, "z": z},
+                                                                 {"x": error_x, "y": error_y, "z": error_z}))
+        errors = sweep(c, axes, error_parameters={"x": 0.1, "y": 0.2, "z": error_axes["z"]})[1]
+        self.assertArrayAlmostEqual(errors, self.propagate_error(c, {"x": x, "y": y, "z": z},
+                                                                 {"x": 0.1, "y": 0.2, "z": error_z}))
+
+        values = sweep([self.x * 2, self.x + self.y], {"x": np.arange(3), "y": np.arange(2)})
+        self.assertEqual(values[0].shape, (3, 2))
+        self.assertArrayAlmostEqual(values[0][:, 1], np.arange(3) * 2.0)
+        self.assertArrayAlmostEqual(sweep(self.x * self.y, {"x": np.arange(3)}, {"y": 2}), np.arange(3) * 2.0)
+
 
 if __name__ == '__main__':
     unittest.main()